@@ -0,0 +1,84 @@
+"""Compare /predict's per-image JSON float lists with one /predict/batch tensor_codec message.
+
+    python benchmark_payload.py --images 256 --repeat 5
+
+For each path this measures the task message size as Celery's JSON serializer
+writes it, the time to build, serialize and deserialize the messages, and the
+end-to-end throughput of serializing, deserializing and running the tasks
+in-process with an untrained copy of the model. Broker round trips are not
+included, so the end-to-end gap is a lower bound: the list path also sends
+one broker message per image.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from kombu.utils.json import dumps, loads
+from tensorflow import keras
+
+import modelML
+import tensor_codec
+from model_cache import ModelCache
+
+
+def body(*args):
+    # Celery's protocol 2 message body: (args, kwargs, embed)
+    return dumps([list(args), {}, {}])
+
+
+def list_messages(pixels):
+    return [body((image / 255.0).astype(np.float32).tolist()) for image in pixels]
+
+
+def batch_message(pixels):
+    return [body(tensor_codec.to_message(pixels))]
+
+
+def run_list(messages):
+    return [modelML.predict_async(loads(message)[0][0])['class'] for message in messages]
+
+
+def run_batch(messages):
+    return modelML.predict_batch_async(loads(messages[0])[0][0])['classes']
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    keras.utils.disable_interactive_logging()
+    pixels = np.random.default_rng(0).integers(0, 256, size=(args.images, 28, 28), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'model.h5')
+        modelML.build_model().save(path)
+        modelML.model_cache = ModelCache(path, keras.models.load_model)
+        modelML.model_cache.get()
+
+        print(f'{args.images} images of 28x28')
+        print(f'{"path":>8}{"messages":>10}{"bytes":>12}{"serialize ms":>14}{"images/s":>10}')
+        results = {}
+        for name, build, run in (('list', list_messages, run_list), ('batch', batch_message, run_batch)):
+            messages = build(pixels)
+            size = sum(len(message) for message in messages)
+            serialize, _ = best_of(args.repeat, lambda: [loads(message) for message in build(pixels)])
+            elapsed, results[name] = best_of(args.repeat, lambda: run(build(pixels)))
+            print(f'{name:>8}{len(messages):>10}{size:>12}{serialize * 1000:>14.1f}{args.images / elapsed:>10.0f}')
+        if results['list'] != results['batch']:
+            raise SystemExit('The two paths predicted different classes')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 from celery import Celery
 
 def make_celery(app_name=__name__):
-    celery = Celery(app_name, broker='redis://localhost:6379/0')
+    celery = Celery(app_name)
     celery.config_from_object('celeryconfig')
     return celery
 
@@ -1,3 +1,61 @@
 # celeryconfig.py
-broker_url = 'redis://localhost:6379/0'
-result_backend = 'redis://localhost:6379/0'
+import os
+from kombu import Queue
+
+# BROKER_MODE picks the transport: 'redis' (the default), 'local' to keep messages
+# and results in files under BROKER_LOCAL_DIR, so workers and the web app
+# can run on one machine without Redis (loadtest.py uses it), or 'memory' for a
+# single process
+broker_mode = os.environ.get('BROKER_MODE', 'redis')
+redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+local_dir = os.environ.get('BROKER_LOCAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'celery_local'))
+
+# A training run gets SoftTimeLimitExceeded after train_time_limit - 60 seconds and is killed at train_time_limit
+train_time_limit = int(os.environ.get('TRAIN_TIME_LIMIT_S', 3600))
+predict_time_limit = int(os.environ.get('PREDICT_TIME_LIMIT_S', 60))
+
+if broker_mode == 'local':
+    messages = os.path.join(local_dir, 'messages')
+    os.makedirs(messages, exist_ok=True)
+    # A message is a file in messages/ (local_transport.py); consumed in arrival order, ignoring priorities
+    broker_url = 'filesystem://'
+    broker_transport = 'local_transport:Transport'
+    broker_transport_options = {'data_folder_in': messages, 'data_folder_out': messages, 'polling_interval': 0.05,
+                                'control_folder': os.path.join(local_dir, 'control')}
+    result_backend = 'db+sqlite:///' + os.path.join(local_dir, 'results.db')
+elif broker_mode == 'memory':
+    broker_url = 'memory://'
+    result_backend = 'cache+memory://'
+else:
+    broker_url = redis_url
+    result_backend = redis_url
+    broker_transport_options = {
+        # Redis has no message priorities; kombu keeps a list per step and empties lower steps first
+        'priority_steps': [0, 3, 6, 9],
+        'sep': ':',
+        # Unacknowledged tasks are redelivered after this long, so it must outlast a training run
+        'visibility_timeout': train_time_limit + 600,
+    }
+
+# Training and prediction never share a queue, so workers can be sized per queue
+# (workers.py) and a long training run never holds up predictions
+task_queues = (
+    Queue('predict', routing_key='predict', queue_arguments={'x-max-priority': 9}),
+    Queue('train', routing_key='train'),
+)
+task_default_queue = 'predict'
+task_routes = {
+    'modelML.train_model_async': {'queue': 'train'},
+    'modelML.predict_*': {'queue': 'predict'},
+}
+task_annotations = {
+    'modelML.train_model_async': {'time_limit': train_time_limit, 'soft_time_limit': train_time_limit - 60},
+    'modelML.predict_async': {'time_limit': predict_time_limit},
+    'modelML.predict_batch_async': {'time_limit': predict_time_limit},
+}
+# Between high (0) and low (9); a task sent without a priority would otherwise jump the queue
+task_default_priority = 3
+# Acknowledge after the task runs and reserve one task per pool process at a time, so a
+# busy worker leaves queued tasks, highest priority first, for the next free process
+task_acks_late = True
+worker_prefetch_multiplier = 1
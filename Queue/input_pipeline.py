@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import tensorflow as tf
+from tensorflow import keras
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# The pro2final database whose images_table lists the uploads, and the directory its
+# relative FilePath values start from (pro2final stores them under its own working directory)
+IMAGES_DATABASE = os.environ.get('IMAGES_DATABASE', os.path.join(HERE, '..', 'pro2final', 'EC530pro2.db'))
+UPLOADS_ROOT = os.environ.get('UPLOADS_ROOT', os.path.join(HERE, '..', 'pro2final'))
+# Preprocessed uint8 images are cached here after the first epoch; empty disables the cache
+TRAIN_CACHE_DIR = os.environ.get('TRAIN_CACHE_DIR', os.path.join(HERE, 'train_cache'))
+
+# Memory bounds. The shuffle buffer holds TRAIN_SHUFFLE_BUFFER 28x28 uint8 images
+# (784 bytes each), prefetch holds TRAIN_PREFETCH_BATCHES float32 batches, and
+# tf.data's autotuner keeps its buffers within TRAIN_RAM_BUDGET_MB
+TRAIN_BATCH_SIZE = int(os.environ.get('TRAIN_BATCH_SIZE', 64))
+TRAIN_SHUFFLE_BUFFER = int(os.environ.get('TRAIN_SHUFFLE_BUFFER', 10000))
+TRAIN_PREFETCH_BATCHES = int(os.environ.get('TRAIN_PREFETCH_BATCHES', 2))
+# Images decoded at once; -1 lets tf.data pick from the available cores
+TRAIN_DECODE_CALLS = int(os.environ.get('TRAIN_DECODE_CALLS', -1))
+TRAIN_RAM_BUDGET_MB = int(os.environ.get('TRAIN_RAM_BUDGET_MB', 512))
+
+IMAGE_SIZE = 28
+
+
+class TrainingSet:
+    """The images_table rows of one split, read from SQLite a row at a time.
+
+    classes are the split's distinct labels in sorted order; a row's class
+    index is its label's position in that list. fingerprint is a hash of every
+    row's ImageID, Label and FilePath, so it changes when a row is added,
+    removed, relabelled or pointed at another file; it names the tf.data cache.
+    """
+
+    def __init__(self, database, split='train', dataset_id=None, uploads_root=UPLOADS_ROOT):
+        self.database = database
+        self.uploads_root = uploads_root
+        self.where = 'Split = ?' + ('' if dataset_id is None else ' AND DatasetID = ?')
+        self.params = (split,) if dataset_id is None else (split, dataset_id)
+        with self._connect() as connection:
+            self.classes = [row[0] for row in connection.execute(
+                f'SELECT DISTINCT Label FROM images_table WHERE {self.where} AND Label IS NOT NULL ORDER BY Label', self.params)]
+            digest = hashlib.sha256(repr((os.path.abspath(database), self.params)).encode())
+            self.size = 0
+            for row in connection.execute(
+                    f'SELECT ImageID, Label, FilePath FROM images_table WHERE {self.where} AND Label IS NOT NULL ORDER BY ImageID', self.params):
+                digest.update(repr(row).encode())
+                self.size += 1
+        self.fingerprint = digest.hexdigest()[:12]
+
+    def _connect(self):
+        return sqlite3.connect(f'file:{self.database}?mode=ro', uri=True)
+
+    def rows(self):
+        """(file path, class index) for every row, streamed from the cursor in ImageID order."""
+        index = {label: position for position, label in enumerate(self.classes)}
+        connection = self._connect()
+        try:
+            for path, label in connection.execute(
+                    f'SELECT FilePath, Label FROM images_table WHERE {self.where} AND Label IS NOT NULL ORDER BY ImageID', self.params):
+                yield os.path.join(self.uploads_root, path), index[label]
+        finally:
+            connection.close()
+
+
+def decode_image(path, label):
+    """An image file as the 28x28 uint8 array modelML.load_pixels makes of the same upload."""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=1, expand_animations=False)
+    # np.resize semantics, as serving uses: the pixels in row-major order, repeated or cut to 784
+    pixels = tf.reshape(image, [-1])
+    repeats = -(-IMAGE_SIZE * IMAGE_SIZE // tf.maximum(tf.size(pixels), 1))
+    pixels = tf.tile(pixels, [repeats])[:IMAGE_SIZE * IMAGE_SIZE]
+    return tf.reshape(pixels, (IMAGE_SIZE, IMAGE_SIZE)), label
+
+
+def scale(images, labels):
+    return tf.cast(images, tf.float32) / 255.0, labels
+
+
+def cache_path(training_set, cache_dir):
+    path = os.path.join(cache_dir, f'images-{training_set.fingerprint}')
+    if not os.path.exists(path + '.index'):
+        # A run that stopped mid-epoch leaves a lock file behind, and tf.data refuses to write past it
+        for stale in glob.glob(path + '*'):
+            os.remove(stale)
+    return path
+
+
+def make_dataset(training_set, batch_size=TRAIN_BATCH_SIZE, shuffle_buffer=TRAIN_SHUFFLE_BUFFER,
+                 prefetch_batches=TRAIN_PREFETCH_BATCHES, decode_calls=TRAIN_DECODE_CALLS,
+                 ram_budget_mb=TRAIN_RAM_BUDGET_MB, cache_dir=TRAIN_CACHE_DIR):
+    """A tf.data pipeline of (float32 images, class index) batches that never holds the whole split in memory.
+
+    File paths stream from the database, files are read and decoded in
+    parallel, and the decoded uint8 images are written to a cache file in
+    cache_dir during the first epoch, so later epochs (and later training
+    runs over the same rows) read the cache instead of decoding again.
+    Unreadable files are skipped.
+    """
+    dataset = tf.data.Dataset.from_generator(training_set.rows, output_signature=(
+        tf.TensorSpec((), tf.string), tf.TensorSpec((), tf.int32)))
+    decode_calls = tf.data.AUTOTUNE if decode_calls < 0 else decode_calls
+    # Decoded images may finish out of order; the shuffle below randomizes order anyway
+    dataset = dataset.map(decode_image, num_parallel_calls=decode_calls, deterministic=False)
+    dataset = dataset.ignore_errors(log_warning=True)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        dataset = dataset.cache(cache_path(training_set, cache_dir))
+    # After the cache, so every epoch is reshuffled
+    dataset = dataset.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+    # Scale whole batches: one vectorized op per batch, and the cache keeps a quarter of float32's bytes
+    dataset = dataset.batch(batch_size).map(scale, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.prefetch(prefetch_batches)
+    options = tf.data.Options()
+    options.autotune.ram_budget = ram_budget_mb * 1024 * 1024
+    return dataset.with_options(options)
+
+
+class EpochThroughput(keras.callbacks.Callback):
+    """Records each epoch's duration and images per second, including time spent waiting on the pipeline."""
+
+    def __init__(self, images):
+        super().__init__()
+        self.images = images
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._started
+        record = {'epoch': epoch + 1, 'seconds': round(seconds, 3), 'images_per_s': round(self.images / seconds, 1)}
+        record.update({name: float(value) for name, value in (logs or {}).items()})
+        self.epochs.append(record)
+        logger.info('Epoch %d: %d images in %.2fs (%.0f images/s)', epoch + 1, self.images, seconds, record['images_per_s'])
@@ -0,0 +1,141 @@
+"""Prediction latency while training runs, with split train/predict queues and with one shared queue.
+
+    python loadtest.py --train-jobs 3 --rate 2 --duration 20
+
+Runs on one machine without Redis (BROKER_MODE=local, see celeryconfig.py):
+tasks travel as message files in a shared folder (local_transport.py) and
+results are stored in an SQLite file.
+For each layout it starts real Celery workers, queues --train-jobs training
+runs over a synthetic images_table, then sends predictions at --rate per
+second and times each from send to result. 'split' runs workers.py's
+layout, a predict worker and a train worker; 'shared' gives the same total
+number of pool processes to one worker that consumes both queues, which is
+how a single default queue behaves. Latencies include the local broker's
+50 ms polling. Celery's worker loop for polling brokers only acknowledges
+tasks every 2 s once a worker has reserved its prefetch limit, so workers
+here reserve --prefetch tasks per process, not the single task of a Redis
+deployment; the local broker also ignores priorities.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float('nan')
+
+
+def write_images(directory, count):
+    """An images_table of count random 28x28 PNGs under directory/uploads, labelled 0-9."""
+    import numpy as np
+    from PIL import Image
+    os.makedirs(os.path.join(directory, 'uploads'))
+    rng = np.random.default_rng(0)
+    rows = []
+    for index in range(count):
+        path = f'uploads/{index}.png'
+        Image.fromarray(rng.integers(0, 256, size=(28, 28), dtype=np.uint8)).save(os.path.join(directory, path))
+        rows.append((path, str(index % 10)))
+    database = os.path.join(directory, 'images.db')
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE images_table (ImageID INTEGER PRIMARY KEY, DatasetID INTEGER, FilePath TEXT, Label TEXT, Split TEXT)')
+        connection.executemany("INSERT INTO images_table (DatasetID, FilePath, Label, Split) VALUES (1, ?, ?, 'train')", rows)
+    return database
+
+
+def collect(results, done, stop):
+    """Record when each sent task's result appears, until stop is set and nothing is outstanding."""
+    while not stop.is_set() or len(done) < len(results):
+        for task_id, (result, _) in list(results.items()):
+            try:
+                if task_id not in done and result.ready():
+                    done[task_id] = time.perf_counter()
+            except Exception:
+                # e.g. SQLite busy while a worker writes a result; check again next round
+                pass
+        time.sleep(0.01)
+
+
+def run(layout, workers, args, directory, log):
+    from modelML import predict_async, train_model_async
+    import workers as worker_pool
+    from celery_worker import celery
+    celery.control.purge()
+
+    processes = worker_pool.start_workers(workers, cwd=directory, output=log)
+    try:
+        # Wait until a prediction comes back, so worker start-up is not counted
+        warmup = predict_async.apply_async(([[0.0] * 28] * 28,))
+        while not warmup.ready():
+            if any(process.poll() is not None for process in processes):
+                raise SystemExit(f'A worker exited; see {log.name}')
+            time.sleep(0.1)
+        trains = [train_model_async.apply_async(kwargs={'epochs': args.train_epochs}) for _ in range(args.train_jobs)]
+        time.sleep(1)
+
+        results, done, stop = {}, {}, threading.Event()
+        collector = threading.Thread(target=collect, args=(results, done, stop))
+        collector.start()
+        image = [[0.5] * 28] * 28
+        started = time.perf_counter()
+        for index in range(int(args.rate * args.duration)):
+            time.sleep(max(0.0, started + index / args.rate - time.perf_counter()))
+            result = predict_async.apply_async((image,), priority=0)
+            results[result.id] = (result, time.perf_counter())
+        stop.set()
+        collector.join(timeout=args.duration + 600)
+        latencies = [(done[task_id] - sent) * 1000.0 for task_id, (_, sent) in results.items() if task_id in done]
+        trained = sum(result.ready() for result in trains)
+        print(f'{layout:>8}{len(latencies):>9}{percentile(latencies, 0.5):>9.0f}{percentile(latencies, 0.95):>9.0f}'
+              f'{max(latencies):>9.0f}{trained:>10}/{args.train_jobs}')
+    finally:
+        worker_pool.stop_workers(processes, timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--predict-concurrency', type=int, default=1)
+    parser.add_argument('--train-concurrency', type=int, default=1)
+    parser.add_argument('--train-jobs', type=int, default=3, help='training runs queued before predictions start')
+    parser.add_argument('--train-epochs', type=int, default=100)
+    parser.add_argument('--images', type=int, default=2000, help='rows in the synthetic images_table')
+    parser.add_argument('--prefetch', type=int, default=4, help='tasks each pool process reserves')
+    parser.add_argument('--rate', type=float, default=2, help='predictions sent per second')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of predictions')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.update({'BROKER_MODE': 'local', 'BROKER_LOCAL_DIR': os.path.join(directory, 'celery'),
+                       'IMAGES_DATABASE': write_images(directory, args.images), 'UPLOADS_ROOT': directory,
+                       'TRAIN_CACHE_DIR': os.path.join(directory, 'train_cache')})
+    from tensorflow import keras
+    import modelML
+    keras.utils.disable_interactive_logging()
+    modelML.build_model().save(os.path.join(directory, modelML.MODEL_PATH))
+
+    total = args.predict_concurrency + args.train_concurrency
+    layouts = {
+        'split': {'predict': (args.predict_concurrency, args.prefetch), 'train': (args.train_concurrency, 1)},
+        'shared': {'predict,train': (total, args.prefetch)},
+    }
+    print(f'{args.train_jobs} training runs queued, {args.rate:g} predictions/s for {args.duration:g}s, '
+          f'{total} pool processes (KEEP_LOADTEST_DIR=1 keeps {directory}/workers.log)')
+    print(f'{"layout":>8}{"predicts":>9}{"p50 ms":>9}{"p95 ms":>9}{"max ms":>9}{"trained":>11}')
+    try:
+        with open(os.path.join(directory, 'workers.log'), 'ab') as log:
+            for layout, workers in layouts.items():
+                run(layout, workers, args, directory, log)
+    finally:
+        if not os.environ.get('KEEP_LOADTEST_DIR'):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
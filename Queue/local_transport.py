@@ -0,0 +1,30 @@
+import os
+import uuid
+from time import monotonic
+from kombu.exceptions import ChannelError
+from kombu.transport import filesystem
+from kombu.utils.json import dumps
+
+
+class Channel(filesystem.Channel):
+    """kombu's filesystem channel, with each message written to a temporary name and renamed into place.
+
+    kombu writes a message file under its final name, so a worker listing the
+    folder at that moment can take it before the body is written and fail to
+    decode it. The temporary name does not end in .<queue>.msg, so no
+    consumer picks it up until the rename, which is atomic.
+    """
+
+    def _put(self, queue, payload, **kwargs):
+        filename = os.path.join(self.data_folder_out, f'{int(round(monotonic() * 1000))}_{uuid.uuid4()}.{queue}.msg')
+        temp_path = os.path.join(self.data_folder_out, f'writing-{uuid.uuid4()}')
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(dumps(payload).encode())
+            os.replace(temp_path, filename)
+        except OSError:
+            raise ChannelError(f'Cannot add file {filename!r} to directory')
+
+
+class Transport(filesystem.Transport):
+    Channel = Channel
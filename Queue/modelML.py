@@ -1,50 +1,287 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from celery_worker import celery
+from celery.exceptions import TimeoutError as ResultTimeout
+from celery.result import ResultSet
+from celery.signals import worker_process_init
+from model_cache import ModelCache
+from model_registry import ModelRegistry
+import input_pipeline
+import tensor_codec
 import numpy as np
 from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import Dense, Flatten
 from PIL import Image
+import functools
 import io
+import json
+import os
+import time
 
 app = Flask(__name__)
 
-@celery.task()
-def train_model_async():
+# A symlink to the promoted version in MODEL_DIR; promotion swaps it atomically
+MODEL_PATH = 'mnist_model.h5'
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+# models_table and training_sessions_table live in the pro2final database by default
+registry = ModelRegistry(os.environ.get('REGISTRY_DATABASE', input_pipeline.IMAGES_DATABASE), MODEL_DIR, MODEL_PATH)
+# How often each worker checks for a newly promoted version
+MODEL_REFRESH_S = float(os.environ.get('MODEL_REFRESH_S', 2.0))
+ARCHITECTURE = 'Flatten-Dense128-Dense'
+
+def load_serving_model(path):
+    model = load_model(path)
+    # Keras builds its predict function on the first call; do that here rather than in a task
+    model.predict(np.zeros((1, 28, 28), dtype=np.float32), verbose=0)
+    return model
+
+# One model per worker process, shared by its tasks; a background thread loads a newly
+# promoted version while tasks keep using the current one, and swaps it in when ready
+model_cache = ModelCache(MODEL_PATH, load_serving_model)
+
+@worker_process_init.connect
+def load_model_at_startup(**kwargs):
+    # A worker started before the first promotion loads the model on its first task instead
+    if os.path.exists(MODEL_PATH):
+        model_cache.get()
+    model_cache.start_refresh(MODEL_REFRESH_S)
+
+def build_model(num_classes=10):
     model = Sequential([
         Flatten(input_shape=(28, 28)),
         Dense(128, activation='relu'),
-        Dense(10, activation='softmax')
+        Dense(num_classes, activation='softmax')
     ])
     model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-    train_images = np.random.rand(100, 28, 28)
-    train_labels = np.random.randint(10, size=(100,))
-    model.fit(train_images, train_labels, epochs=1)
-    model.save('mnist_model.h5')
-    return 'Model trained successfully'
+    return model
+
+@celery.task()
+def train_model_async(split='train', dataset_id=None, epochs=1, promote=True):
+    """Train on the uploaded images of one images_table split, streamed through input_pipeline.
+
+    The model is registered as a new version with its final accuracy and
+    loss, and promoted unless promote is False.
+    """
+    training_set = input_pipeline.TrainingSet(input_pipeline.IMAGES_DATABASE, split, dataset_id)
+    if not training_set.size:
+        raise ValueError(f'No labelled images in split {split!r}')
+    session_id = registry.start_session()
+    try:
+        model = build_model(len(training_set.classes))
+        throughput = input_pipeline.EpochThroughput(training_set.size)
+        model.fit(input_pipeline.make_dataset(training_set), epochs=epochs, callbacks=[throughput], verbose=0)
+        saved_path = registry.temp_path()
+        model.save(saved_path)
+        last_epoch = throughput.epochs[-1]
+        version = registry.register(session_id, saved_path, ARCHITECTURE, dataset_id,
+                                    last_epoch.get('accuracy'), last_epoch.get('loss'), training_set.classes)
+    except BaseException:
+        # Including the soft time limit, so the session does not stay 'running'
+        registry.fail_session(session_id)
+        raise
+    if promote:
+        registry.promote(version)
+    # A predicted class is an index into classes; predictions also report its label
+    return {'message': 'Model trained successfully', 'version': version, 'promoted': promote,
+            'images': training_set.size, 'classes': training_set.classes, 'epochs': throughput.epochs}
 
 @app.route('/train', methods=['POST'])
 def train():
-    train_model_async.delay()
+    options = request.get_json(silent=True) or {}
+    promote = options.get('promote', True)
+    # bool('false') is True, so only a JSON boolean is accepted
+    if not isinstance(promote, bool):
+        return jsonify({'error': 'promote must be true or false'}), 400
+    epochs = options.get('epochs', 1)
+    # True is an int too; a string, a list or zero epochs would only fail inside the task
+    if not isinstance(epochs, int) or isinstance(epochs, bool) or epochs < 1:
+        return jsonify({'error': 'epochs must be a positive integer'}), 400
+    train_model_async.delay(split=options.get('split', 'train'), dataset_id=options.get('dataset_id'),
+                            epochs=epochs, promote=promote)
     return jsonify({'message': 'Training started'})
 
+@app.route('/models', methods=['GET'])
+def list_models():
+    return jsonify({'current': registry.current(), 'models': registry.versions()}), 200
+
+@app.route('/models/<version>/promote', methods=['POST'])
+def promote_model(version):
+    try:
+        registry.promote(version)
+    except KeyError:
+        return jsonify({'error': 'Model version not found'}), 404
+    # Workers switch within MODEL_REFRESH_S, after loading the version in the background
+    return jsonify({'current': version}), 200
+
+@app.route('/models/rollback', methods=['POST'])
+def rollback_model():
+    version = registry.rollback()
+    if version is None:
+        return jsonify({'error': 'No earlier version to roll back to'}), 409
+    return jsonify({'current': version}), 200
+
+@functools.lru_cache(maxsize=16)
+def version_classes(version):
+    # A version's file and labels never change, so each worker reads them once
+    return registry.classes(version)
+
+def class_labels(version, indices):
+    """The label each predicted class index stands for; the index itself for a model registered without labels."""
+    classes = version_classes(version)
+    return [classes[index] if classes is not None else str(index) for index in indices]
+
 @celery.task()
 def predict_async(data):
-    model = load_model('mnist_model.h5')
+    version, model = model_cache.get()
     prediction = model.predict(np.array([data]))[0]
-    predicted_class = np.argmax(prediction)
-    return predicted_class
+    predicted_class = int(np.argmax(prediction))
+    return {'class': predicted_class, 'label': class_labels(version, [predicted_class])[0], 'model_version': version}
+
+# ?priority= of the predict endpoints. On Redis lower numbers are served first, in steps of
+# celeryconfig's priority_steps; BROKER_MODE=local's broker (kombu's filesystem transport,
+# local_transport.py) serves messages in arrival order and ignores priorities
+PREDICT_PRIORITIES = {'high': 0, 'normal': 3, 'low': 6}
+
+def predict_priority(default):
+    return PREDICT_PRIORITIES.get(request.args.get('priority', default))
 
 @app.route('/predict', methods=['POST'])
 def predict():
     if 'image' not in request.files:
         return jsonify({'error': 'No image provided'}), 400
+    # Single images are usually someone waiting on an answer, so they go ahead of batches
+    priority = predict_priority('high')
+    if priority is None:
+        return jsonify({'error': f'priority must be one of {", ".join(PREDICT_PRIORITIES)}'}), 400
     file = request.files['image'].read()
     image = Image.open(io.BytesIO(file)).convert('L')
     image = np.resize(image, (28, 28)) / 255.0
     image = np.array(image, dtype=np.float32)
-    task = predict_async.delay(image.tolist())
+    task = predict_async.apply_async((image.tolist(),), priority=priority)
     return jsonify({'task_id': task.id}), 202
 
+# Largest number of images /predict/batch sends in one task message
+MAX_BATCH_IMAGES = 1024
+
+def load_pixels(data):
+    """Uploaded image bytes as the 28x28 uint8 array that /predict scales by 1/255."""
+    image = Image.open(io.BytesIO(data)).convert('L')
+    return np.resize(image, (28, 28)).astype(np.uint8)
+
+@celery.task()
+def predict_batch_async(payload):
+    """Classify a batch sent as tensor_codec text: uint8 pixels, scaled here, or float32 model inputs."""
+    images = tensor_codec.from_message(payload)
+    if images.dtype == np.uint8:
+        images = images.astype(np.float32) / 255.0
+    version, model = model_cache.get()
+    predictions = model.predict(images)
+    classes = np.argmax(predictions, axis=1).tolist()
+    return {'classes': classes, 'labels': class_labels(version, classes), 'model_version': version}
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(files) > MAX_BATCH_IMAGES:
+        return jsonify({'error': f'At most {MAX_BATCH_IMAGES} images per batch'}), 413
+    priority = predict_priority('low')
+    if priority is None:
+        return jsonify({'error': f'priority must be one of {", ".join(PREDICT_PRIORITIES)}'}), 400
+    try:
+        batch = np.stack([load_pixels(file.read()) for file in files])
+    except OSError:
+        return jsonify({'error': 'Not a readable image'}), 400
+    # One message for the whole batch: raw uint8 pixels, a quarter of float32 and far smaller than JSON lists
+    task = predict_batch_async.apply_async((tensor_codec.to_message(batch),), priority=priority)
+    return jsonify({'task_id': task.id, 'images': len(files)}), 202
+
+# Longest a /result request may wait for its task, in seconds
+MAX_RESULT_WAIT_S = 60
+# Longest a /results/stream connection stays open, and the most tasks it may wait on
+MAX_STREAM_S = 300
+MAX_STREAM_TASKS = 1000
+# How often waiting requests check the result backend: /results/stream reads every unfinished
+# task each round (one MGET on Redis, one query per task on the database backend), and /result
+# polls backends that cannot push results over pub/sub
+RESULT_POLL_S = 0.1
+
+def result_body(task_id, status, value):
+    body = {'task_id': task_id, 'status': status}
+    if status == 'SUCCESS':
+        body['result'] = value
+    elif value is not None:
+        # A failure's value is the exception the task raised
+        body['error'] = str(value)
+    return body
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/result/<task_id>', methods=['GET'])
+def result(task_id):
+    """A task's status and result; ?wait=<seconds> long-polls until the task finishes or the wait runs out."""
+    wait = min(request.args.get('wait', 0, type=float), MAX_RESULT_WAIT_S)
+    task = celery.AsyncResult(task_id)
+    if wait > 0 and not task.ready():
+        try:
+            # With the Redis backend this is woken by the task's pub/sub message, not by polling
+            task.get(timeout=wait, interval=RESULT_POLL_S, propagate=False)
+        except ResultTimeout:
+            pass
+    # Celery cannot tell an unknown id from a queued task; both are PENDING
+    return jsonify(result_body(task_id, task.state, task.result)), 200
+
+@app.route('/results/stream', methods=['GET', 'POST'])
+def stream_results():
+    """Server-Sent Events: a 'result' event for each task as soon as it finishes, then one 'done' event.
+
+    Task ids come from ?ids=a,b,c or, for long lists, a POST body {"task_ids": [...]}.
+    'done' lists the ids still unfinished when ?timeout=<seconds> ran out.
+    """
+    if request.method == 'POST':
+        task_ids = (request.get_json(silent=True) or {}).get('task_ids') or []
+    else:
+        task_ids = request.args.get('ids', '').split(',')
+    task_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids if task_id))
+    if not task_ids:
+        return jsonify({'error': 'No task ids provided'}), 400
+    if len(task_ids) > MAX_STREAM_TASKS:
+        return jsonify({'error': f'At most {MAX_STREAM_TASKS} tasks per stream'}), 413
+    timeout = min(request.args.get('timeout', MAX_STREAM_S, type=float), MAX_STREAM_S)
+
+    def finished():
+        """(task_id, status, value) for each task once, in the order they finish, until timeout runs out."""
+        if hasattr(celery.backend, 'get_many'):
+            results = ResultSet([celery.AsyncResult(task_id) for task_id in task_ids])
+            try:
+                for task_id, meta in results.iter_native(timeout=timeout, interval=RESULT_POLL_S):
+                    yield task_id, meta['status'], meta['result']
+            except ResultTimeout:
+                pass
+            return
+        # The database backend (BROKER_MODE=local) cannot fetch many results at once, so check each one
+        unfinished = {task_id: celery.AsyncResult(task_id) for task_id in task_ids}
+        deadline = time.monotonic() + timeout
+        while unfinished:
+            for task_id, task in list(unfinished.items()):
+                if task.ready():
+                    del unfinished[task_id]
+                    yield task_id, task.state, task.result
+            if not unfinished or time.monotonic() >= deadline:
+                return
+            time.sleep(RESULT_POLL_S)
+
+    def events():
+        pending = set(task_ids)
+        for task_id, status, value in finished():
+            pending.discard(task_id)
+            yield sse_event('result', result_body(task_id, status, value))
+        yield sse_event('done', {'pending': [task_id for task_id in task_ids if task_id in pending]})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    """The model saved at path, loaded once per worker process and reloaded when the file is replaced.
+
+    get() returns (version, model), where version is the first 12 hex digits
+    of the file's sha256. Each call costs one os.stat; when the file has
+    changed, the new model is fully loaded before it is swapped in with a single
+    assignment, so a task that already holds the previous pair keeps using the
+    previous model until it finishes.
+
+    After start_refresh(), a background thread does the checking and loading
+    instead, and get() only returns the loaded pair, so no task ever waits
+    for a load once the first model is in.
+    """
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._current = None  # (file signature, version, model)
+        self._refresher = None
+
+    def get(self):
+        current = self._current
+        if current is not None and self._refresher is not None:
+            return current[1], current[2]
+        try:
+            signature = self._signature()
+        except FileNotFoundError:
+            if current is None:
+                raise
+            # The file is being replaced; keep serving the loaded model
+            return current[1], current[2]
+        if current is None or current[0] != signature:
+            current = self._reload()
+        return current[1], current[2]
+
+    def start_refresh(self, interval):
+        """Check the file every interval seconds from a daemon thread, loading a new model there."""
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,), name='model-refresh', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                current = self._current
+                if current is None or current[0] != self._signature():
+                    self._reload()
+            except FileNotFoundError:
+                pass
+            except Exception:
+                # A model that fails to load is retried on the next check; the loaded one keeps serving
+                logger.exception('Could not load %s', self.path)
+
+    def _reload(self):
+        with self._lock:
+            current = self._current
+            if current is None or current[0] != self._signature():
+                current = self._load()
+                self._current = current
+            return current
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        while True:
+            signature = self._signature()
+            with open(self.path, 'rb') as f:
+                version = hashlib.sha256(f.read()).hexdigest()[:12]
+            model = self.loader(self.path)
+            # Load again if a newer file landed while this one was loading
+            if self._signature() == signature:
+                return signature, version, model
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS models_table (ModelID INTEGER PRIMARY KEY, Name VARCHAR(255) UNIQUE, '
+    'Architecture VARCHAR(100), CreationDate DATE, TrainingDatasetID INTEGER)',
+    'CREATE TABLE IF NOT EXISTS training_sessions_table (SessionID INTEGER PRIMARY KEY, ModelID INTEGER, '
+    'StartDate DATETIME, EndDate DATETIME, Status VARCHAR(50), Accuracy FLOAT, Loss FLOAT)',
+)
+
+
+def timestamp():
+    # The format SQLAlchemy uses for DateTime columns on SQLite, so pro2final reads these rows back
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class ModelRegistry:
+    """Trained models as immutable files, recorded in pro2final's models_table and training_sessions_table.
+
+    A model is stored once under root/<version>.h5, where version is the
+    first 12 hex digits of the file's sha256, and gets a models_table row
+    named after its version, and root/<version>.json keeps the labels its
+    output indices stand for. Each training run is a training_sessions_table
+    row: 'running' while it trains, then 'trained' with its accuracy and loss,
+    or 'failed'. pointer (modelML.MODEL_PATH) is a symlink to the promoted
+    version; promote() replaces it with a single rename, so a reader sees the
+    old model or the new one, never a mix. root/previous remembers the version
+    it replaced, for rollback().
+    """
+
+    def __init__(self, database, root, pointer):
+        self.database = database
+        self.root = root
+        self.pointer = pointer
+        self._schema_ready = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database, timeout=30)
+        if not self._schema_ready:
+            with connection:
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._schema_ready = True
+        return connection
+
+    def path(self, version):
+        return os.path.join(self.root, f'{version}.h5')
+
+    def start_session(self):
+        connection = self._connect()
+        try:
+            with connection:
+                return connection.execute("INSERT INTO training_sessions_table (StartDate, Status) VALUES (?, 'running')",
+                                          (timestamp(),)).lastrowid
+        finally:
+            connection.close()
+
+    def fail_session(self, session_id):
+        self._finish(session_id, None, 'failed', None, None)
+
+    def classes_path(self, version):
+        return os.path.join(self.root, f'{version}.json')
+
+    def register(self, session_id, saved_path, architecture, dataset_id=None, accuracy=None, loss=None, classes=None):
+        """Move a saved model into the registry and record it, with the label of each class index; returns its version."""
+        with open(saved_path, 'rb') as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        if classes is not None:
+            # Written before the model is moved in, so a registered version always has its labels
+            temp_path = self.classes_path(version) + f'.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(list(classes), f)
+            os.replace(temp_path, self.classes_path(version))
+        path = self.path(version)
+        if os.path.exists(path):
+            os.remove(saved_path)
+        else:
+            os.chmod(saved_path, 0o444)
+            os.replace(saved_path, path)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR IGNORE INTO models_table (Name, Architecture, CreationDate, TrainingDatasetID) '
+                                   'VALUES (?, ?, ?, ?)', (version, architecture, datetime.now().date().isoformat(), dataset_id))
+                model_id = connection.execute('SELECT ModelID FROM models_table WHERE Name = ?', (version,)).fetchone()[0]
+        finally:
+            connection.close()
+        self._finish(session_id, model_id, 'trained', accuracy, loss)
+        return version
+
+    def _finish(self, session_id, model_id, status, accuracy, loss):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('UPDATE training_sessions_table SET ModelID = ?, EndDate = ?, Status = ?, Accuracy = ?, Loss = ? '
+                                   'WHERE SessionID = ?', (model_id, timestamp(), status, accuracy, loss, session_id))
+        finally:
+            connection.close()
+
+    def classes(self, version):
+        """The labels version was trained on, in class index order, or None if they were not recorded."""
+        try:
+            with open(self.classes_path(version)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def temp_path(self):
+        """A path in root to save a model to before register() moves it into place."""
+        os.makedirs(self.root, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.root, prefix='training-', suffix='.h5')
+        os.close(fd)
+        return path
+
+    def current(self):
+        """The promoted version, or None."""
+        try:
+            target = os.readlink(self.pointer)
+        except OSError:
+            return None
+        return os.path.splitext(os.path.basename(target))[0]
+
+    def promote(self, version):
+        """Point pointer at version; KeyError if it was never registered."""
+        if not os.path.exists(self.path(version)):
+            raise KeyError(version)
+        previous = self.current()
+        if previous == version:
+            return
+        if previous is not None:
+            self._swap_link(os.path.join(self.root, 'previous'), self.path(previous))
+        self._swap_link(self.pointer, self.path(version))
+
+    def rollback(self):
+        """Promote the version the last promotion replaced; returns it, or None if there is none."""
+        try:
+            target = os.readlink(os.path.join(self.root, 'previous'))
+        except OSError:
+            return None
+        version = os.path.splitext(os.path.basename(target))[0]
+        self.promote(version)
+        return version
+
+    def _swap_link(self, link, target):
+        # Relative, so the directory can be moved; built beside the old link and renamed over it atomically
+        directory = os.path.dirname(os.path.abspath(link))
+        temp_link = os.path.join(directory, f'.{os.path.basename(link)}.{os.getpid()}.tmp')
+        if os.path.lexists(temp_link):
+            os.remove(temp_link)
+        os.symlink(os.path.relpath(os.path.abspath(target), directory), temp_link)
+        os.replace(temp_link, link)
+
+    def versions(self):
+        """Every registered version, newest first, with its training metrics."""
+        current = self.current()
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT m.Name, m.Architecture, m.CreationDate, m.TrainingDatasetID, s.EndDate, s.Accuracy, s.Loss '
+                "FROM models_table m JOIN training_sessions_table s ON s.ModelID = m.ModelID AND s.Status = 'trained' "
+                'ORDER BY s.EndDate DESC').fetchall()
+        finally:
+            connection.close()
+        versions = {}
+        for name, architecture, created, dataset_id, trained, accuracy, loss in rows:
+            # A version retrained to identical bytes is listed once, with its latest run
+            if name not in versions and os.path.exists(self.path(name)):
+                versions[name] = {'version': name, 'architecture': architecture, 'created': created, 'dataset_id': dataset_id,
+                                  'trained': trained, 'accuracy': accuracy, 'loss': loss, 'classes': self.classes(name),
+                                  'promoted': name == current}
+        return list(versions.values())
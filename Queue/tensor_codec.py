@@ -0,0 +1,46 @@
+import base64
+import struct
+import numpy as np
+
+# A 6-byte header (magic, dtype code, number of dimensions), one little-endian
+# uint32 per dimension, then the array's bytes in C order
+MAGIC = b'TNS1'
+HEADER = struct.Struct('<4sBB')
+DTYPES = {0: np.dtype('|u1'), 1: np.dtype('<f4')}
+CODES = {dtype.str: code for code, dtype in DTYPES.items()}
+
+
+def encode(array):
+    """Pack a uint8 or float32 array into bytes: a shape header followed by the raw values."""
+    array = np.asarray(array)
+    code = CODES.get(array.dtype.newbyteorder('<').str)
+    if code is None:
+        raise ValueError(f'Cannot encode {array.dtype} arrays; use uint8 or float32')
+    array = np.ascontiguousarray(array, dtype=DTYPES[code])
+    return HEADER.pack(MAGIC, code, array.ndim) + struct.pack(f'<{array.ndim}I', *array.shape) + array.tobytes()
+
+
+def decode(data):
+    """Unpack bytes made by encode() into a read-only array that shares their memory."""
+    if len(data) < HEADER.size:
+        raise ValueError('Payload is too short for a tensor header')
+    magic, code, ndim = HEADER.unpack_from(data)
+    if magic != MAGIC or code not in DTYPES:
+        raise ValueError('Payload is not an encoded tensor')
+    offset = HEADER.size + 4 * ndim
+    if len(data) < offset:
+        raise ValueError('Payload is too short for its shape')
+    shape = struct.unpack_from(f'<{ndim}I', data, HEADER.size)
+    dtype = DTYPES[code]
+    if len(data) - offset != int(np.prod(shape)) * dtype.itemsize:
+        raise ValueError('Payload size does not match its shape')
+    return np.frombuffer(data, dtype=dtype, offset=offset).reshape(shape)
+
+
+def to_message(array):
+    """encode() as base64 text, which Celery's JSON serializer carries as a plain string."""
+    return base64.b64encode(encode(array)).decode('ascii')
+
+
+def from_message(text):
+    return decode(base64.b64decode(text))
@@ -0,0 +1,103 @@
+import pytest
+import input_pipeline
+import modelML
+from model_registry import ModelRegistry
+import numpy as np
+from PIL import Image
+from unittest.mock import patch
+import io
+import os
+import sqlite3
+
+def png(array):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def images(tmp_path):
+    """An images_table with six train images of two labels, one validation image and one unreadable file."""
+    database = str(tmp_path / 'images.db')
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    rows = []
+    for index in range(6):
+        name = f'{index}.png'
+        (uploads / name).write_bytes(png(np.full((28, 28), index * 40, dtype=np.uint8)))
+        rows.append((f'uploads/{name}', str(index % 2), 'train'))
+    (uploads / 'val.png').write_bytes(png(np.zeros((28, 28), dtype=np.uint8)))
+    rows.append(('uploads/val.png', '0', 'val'))
+    (uploads / 'broken.png').write_bytes(b'not an image')
+    rows.append(('uploads/broken.png', '1', 'train'))
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE images_table (ImageID INTEGER PRIMARY KEY, DatasetID INTEGER, FilePath TEXT, Label TEXT, Split TEXT)')
+        connection.executemany('INSERT INTO images_table (DatasetID, FilePath, Label, Split) VALUES (1, ?, ?, ?)', rows)
+    return database, str(tmp_path)
+
+def test_training_set_lists_one_split(images):
+    database, root = images
+    training_set = input_pipeline.TrainingSet(database, 'train', uploads_root=root)
+    assert training_set.classes == ['0', '1']
+    assert training_set.size == 7
+    rows = list(training_set.rows())
+    assert rows[0] == (os.path.join(root, 'uploads/0.png'), 0)
+    assert [label for _, label in rows] == [0, 1, 0, 1, 0, 1, 1]
+    assert input_pipeline.TrainingSet(database, 'val', uploads_root=root).fingerprint != training_set.fingerprint
+
+def test_fingerprint_changes_when_a_row_is_relabelled(images):
+    database, root = images
+    before = input_pipeline.TrainingSet(database, 'train', uploads_root=root)
+    with sqlite3.connect(database) as connection:
+        connection.execute("UPDATE images_table SET Label = '0' WHERE ImageID = 2")
+    after = input_pipeline.TrainingSet(database, 'train', uploads_root=root)
+    assert (after.size, after.classes) == (before.size, before.classes)
+    assert after.fingerprint != before.fingerprint
+
+def test_decode_matches_serving_preprocessing(tmp_path):
+    # Not 28x28, so both sides have to repeat pixels the same way
+    data = png(np.arange(20 * 10, dtype=np.uint8).reshape(20, 10))
+    path = tmp_path / 'small.png'
+    path.write_bytes(data)
+    decoded, _ = input_pipeline.decode_image(str(path), 0)
+    assert np.array_equal(decoded.numpy(), modelML.load_pixels(data))
+
+def test_dataset_batches_and_reuses_cache(images, tmp_path):
+    database, root = images
+    training_set = input_pipeline.TrainingSet(database, 'train', uploads_root=root)
+    cache_dir = str(tmp_path / 'cache')
+    dataset = input_pipeline.make_dataset(training_set, batch_size=4, shuffle_buffer=8, cache_dir=cache_dir)
+    batches = list(dataset)
+    assert [len(labels) for _, labels in batches] == [4, 2]
+    assert batches[0][0].dtype == np.float32
+    assert batches[0][0].shape[1:] == (28, 28)
+    values = sorted(float(image[0, 0]) for images_batch, _ in batches for image in images_batch)
+    assert values == pytest.approx([index * 40 / 255.0 for index in range(6)])
+
+    # Later epochs read the cache, not the files
+    for name in os.listdir(os.path.join(root, 'uploads')):
+        os.remove(os.path.join(root, 'uploads', name))
+    assert sum(len(labels) for _, labels in dataset) == 6
+
+def test_train_reports_epoch_throughput(images, tmp_path):
+    database, root = images
+    model_path = str(tmp_path / 'model.h5')
+    registry = ModelRegistry(database, str(tmp_path / 'models'), model_path)
+    training_set = input_pipeline.TrainingSet
+    make_dataset = input_pipeline.make_dataset
+    with patch.object(input_pipeline, 'IMAGES_DATABASE', database), \
+            patch.object(input_pipeline, 'TrainingSet', lambda *args: training_set(*args, uploads_root=root)), \
+            patch.object(input_pipeline, 'make_dataset', lambda rows: make_dataset(rows, batch_size=4, cache_dir=str(tmp_path / 'cache'))), \
+            patch.object(modelML, 'registry', registry):
+        result = modelML.train_model_async(epochs=2)
+    assert registry.current() == result['version']
+    assert os.path.exists(model_path)
+    assert result['classes'] == ['0', '1']
+    assert registry.classes(result['version']) == ['0', '1']
+    assert [epoch['epoch'] for epoch in result['epochs']] == [1, 2]
+    assert all(epoch['images_per_s'] > 0 and 'loss' in epoch for epoch in result['epochs'])
+
+def test_train_rejects_an_empty_split(images):
+    database, _ = images
+    with patch.object(input_pipeline, 'IMAGES_DATABASE', database):
+        with pytest.raises(ValueError):
+            modelML.train_model_async(split='test')
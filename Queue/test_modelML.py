@@ -1,9 +1,17 @@
 import pytest
-from modelML import app
+from modelML import app, celery, predict_async, predict_batch_async, train_model_async
+import tensor_codec
+from model_cache import ModelCache
+from model_registry import ModelRegistry
+import modelML
 from unittest.mock import patch, MagicMock
 import numpy as np
 from PIL import Image
 import io
+import json
+import os
+import threading
+import time
 
 @pytest.fixture
 def client():
@@ -18,13 +26,29 @@ def test_train_route(client):
         assert response.json == {'message': 'Training started'}
         mock_train.assert_called_once()
 
+def test_train_route_takes_promote_only_as_a_boolean(client):
+    with patch('modelML.train_model_async.delay') as mock_train:
+        assert client.post('/train', json={'promote': False}).status_code == 200
+        assert mock_train.call_args.kwargs['promote'] is False
+        for value in ('false', 0, None):
+            assert client.post('/train', json={'promote': value}).status_code == 400
+        assert mock_train.call_count == 1
+
+def test_train_route_takes_a_positive_number_of_epochs(client):
+    with patch('modelML.train_model_async.delay') as mock_train:
+        assert client.post('/train', json={'epochs': 3}).status_code == 200
+        assert mock_train.call_args.kwargs['epochs'] == 3
+        for value in ('x', None, [1], True, 0, -2, 1.5):
+            assert client.post('/train', json={'epochs': value}).status_code == 400
+        assert mock_train.call_count == 1
+
 def test_predict_route_no_image(client):
     response = client.post('/predict')
     assert response.status_code == 400
     assert response.json == {'error': 'No image provided'}
 
 def test_predict_route_with_image(client):
-    with patch('modelML.predict_async.delay') as mock_predict:
+    with patch('modelML.predict_async.apply_async') as mock_predict:
         mock_task = MagicMock()
         mock_task.id = 'test_task_id'
         mock_predict.return_value = mock_task
@@ -38,4 +62,228 @@ def test_predict_route_with_image(client):
         response = client.post('/predict', data={'image': (io.BytesIO(img_bytes), 'test.png')})
         assert response.status_code == 202
         assert response.json == {'task_id': 'test_task_id'}
-        mock_predict.assert_called_once()
\ No newline at end of file
+        mock_predict.assert_called_once()
+
+def read_model(path):
+    with open(path) as f:
+        return f.read()
+
+def test_model_cache_loads_once(tmp_path):
+    path = tmp_path / 'model.h5'
+    path.write_text('v1')
+    loader = MagicMock(side_effect=read_model)
+    cache = ModelCache(str(path), loader)
+    first = cache.get()
+    assert cache.get() == first
+    assert first[1] == 'v1'
+    loader.assert_called_once()
+
+def test_model_cache_swaps_on_new_file(tmp_path):
+    path = tmp_path / 'model.h5'
+    path.write_text('v1')
+    cache = ModelCache(str(path), read_model)
+    old_version, old_model = cache.get()
+    # Training writes the next model beside the live one and renames it over
+    (tmp_path / 'next.h5').write_text('v2')
+    os.replace(tmp_path / 'next.h5', path)
+    new_version, new_model = cache.get()
+    assert (old_model, new_model) == ('v1', 'v2')
+    assert old_version != new_version
+
+def test_model_cache_refreshes_in_the_background(tmp_path):
+    path = tmp_path / 'model.h5'
+    path.write_text('v1')
+    loads = []
+    def loader(model_path):
+        loads.append(threading.current_thread().name)
+        return read_model(model_path)
+    cache = ModelCache(str(path), loader)
+    cache.get()
+    cache.start_refresh(0.01)
+    (tmp_path / 'next.h5').write_text('v2')
+    os.replace(tmp_path / 'next.h5', path)
+    deadline = time.time() + 5
+    while cache.get()[1] != 'v2' and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get()[1] == 'v2'
+    # Only the first load ran on the caller's thread
+    assert loads[1:] == ['model-refresh']
+
+def test_predict_reports_model_version():
+    model = MagicMock()
+    model.predict.return_value = np.array([[0.1, 0.7, 0.2]])
+    with patch('modelML.model_cache.get', return_value=('abc123', model)):
+        assert predict_async(np.zeros((28, 28)).tolist()) == {'class': 1, 'label': '1', 'model_version': 'abc123'}
+
+def test_predict_reports_the_trained_label(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'registry.db'), str(tmp_path / 'models'), str(tmp_path / 'model.h5'))
+    path = registry.temp_path()
+    with open(path, 'w') as f:
+        f.write('weights')
+    version = registry.register(registry.start_session(), path, 'dense', classes=['cat', 'dog', 'fish'])
+    model = MagicMock()
+    model.predict.return_value = np.array([[0.1, 0.7, 0.2]])
+    with patch.object(modelML, 'registry', registry), patch('modelML.model_cache.get', return_value=(version, model)):
+        assert predict_async(np.zeros((28, 28)).tolist())['label'] == 'dog'
+        model.predict.return_value = np.array([[0.1, 0.2, 0.7], [0.9, 0.0, 0.1]])
+        result = predict_batch_async(tensor_codec.to_message(np.zeros((2, 28, 28), dtype=np.uint8)))
+    assert result == {'classes': [2, 0], 'labels': ['fish', 'cat'], 'model_version': version}
+
+def png(color):
+    img_bytes = io.BytesIO()
+    Image.new('L', (28, 28), color=color).save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
+def test_predict_batch_sends_one_message(client):
+    with patch('modelML.predict_batch_async.apply_async') as mock_predict:
+        mock_predict.return_value = MagicMock(id='batch_task_id')
+        images = [(io.BytesIO(png(color)), f'{color}.png') for color in (0, 128, 255)]
+        response = client.post('/predict/batch', data={'images': images})
+        assert response.status_code == 202
+        assert response.json == {'task_id': 'batch_task_id', 'images': 3}
+        batch = tensor_codec.from_message(mock_predict.call_args[0][0][0])
+        assert mock_predict.call_args[1] == {'priority': 6}
+        assert batch.shape == (3, 28, 28)
+        assert batch.dtype == np.uint8
+        assert list(batch[:, 0, 0]) == [0, 128, 255]
+
+def test_predict_batch_rejects_bad_requests(client):
+    assert client.post('/predict/batch').status_code == 400
+    response = client.post('/predict/batch', data={'images': [(io.BytesIO(b'not an image'), 'x.png')]})
+    assert response.status_code == 400
+
+def test_predict_batch_returns_every_class():
+    model = MagicMock()
+    model.predict.return_value = np.array([[0.9, 0.1], [0.2, 0.8]])
+    batch = np.array([np.zeros((28, 28)), np.full((28, 28), 255)], dtype=np.uint8)
+    with patch('modelML.model_cache.get', return_value=('abc123', model)):
+        result = predict_batch_async(tensor_codec.to_message(batch))
+    assert result == {'classes': [0, 1], 'labels': ['0', '1'], 'model_version': 'abc123'}
+    inputs = model.predict.call_args[0][0]
+    assert inputs.dtype == np.float32
+    assert inputs.max() == 1.0
+
+def use_result_backend(url):
+    previous = celery.conf.result_backend
+    celery.conf.result_backend = url
+    celery._local.__dict__.pop('backend', None)
+    yield celery.backend
+    celery.conf.result_backend = previous
+    celery._local.__dict__.pop('backend', None)
+
+@pytest.fixture
+def backend():
+    # An in-process result backend, so results can be stored without Redis
+    yield from use_result_backend('cache+memory://')
+
+@pytest.fixture
+def database_backend(tmp_path):
+    # The backend BROKER_MODE=local uses
+    yield from use_result_backend(f'db+sqlite:///{tmp_path}/results.db')
+
+def read_events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        name, data = block.split('\n')
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+def test_result_returns_finished_task(client, backend):
+    backend.store_result('done-task', {'class': 3, 'model_version': 'abc123'}, 'SUCCESS')
+    response = client.get('/result/done-task')
+    assert response.status_code == 200
+    assert response.json == {'task_id': 'done-task', 'status': 'SUCCESS', 'result': {'class': 3, 'model_version': 'abc123'}}
+
+def test_result_long_poll(client, backend):
+    response = client.get('/result/slow-task?wait=0.2')
+    assert response.json == {'task_id': 'slow-task', 'status': 'PENDING'}
+    threading.Timer(0.1, backend.store_result, ('slow-task', {'class': 1}, 'SUCCESS')).start()
+    response = client.get('/result/slow-task?wait=5')
+    assert response.json['result'] == {'class': 1}
+
+def test_result_reports_failure(client, backend):
+    backend.mark_as_failure('bad-task', ValueError('not an image'))
+    response = client.get('/result/bad-task')
+    assert response.json == {'task_id': 'bad-task', 'status': 'FAILURE', 'error': 'not an image'}
+
+def test_stream_results_in_finish_order(client, backend):
+    backend.store_result('first', {'class': 1}, 'SUCCESS')
+    threading.Timer(0.1, backend.store_result, ('second', {'class': 2}, 'SUCCESS')).start()
+    response = client.get('/results/stream?ids=second,first,never&timeout=1')
+    assert response.mimetype == 'text/event-stream'
+    assert read_events(response) == [
+        ('result', {'task_id': 'first', 'status': 'SUCCESS', 'result': {'class': 1}}),
+        ('result', {'task_id': 'second', 'status': 'SUCCESS', 'result': {'class': 2}}),
+        ('done', {'pending': ['never']}),
+    ]
+
+def test_stream_results_accepts_posted_ids(client, backend):
+    backend.store_result('posted', {'class': 5}, 'SUCCESS')
+    response = client.post('/results/stream', json={'task_ids': ['posted']})
+    assert [name for name, _ in read_events(response)] == ['result', 'done']
+    assert client.get('/results/stream').status_code == 400
+
+def test_stream_results_polls_a_database_backend(client, database_backend):
+    database_backend.store_result('stored', {'class': 4}, 'SUCCESS')
+    threading.Timer(0.2, database_backend.store_result, ('later', {'class': 6}, 'SUCCESS')).start()
+    response = client.get('/results/stream?ids=later,stored,never&timeout=1')
+    assert read_events(response) == [
+        ('result', {'task_id': 'stored', 'status': 'SUCCESS', 'result': {'class': 4}}),
+        ('result', {'task_id': 'later', 'status': 'SUCCESS', 'result': {'class': 6}}),
+        ('done', {'pending': ['never']}),
+    ]
+
+def test_tasks_are_routed_to_their_own_queues():
+    router = celery.amqp.router
+    assert router.route({}, train_model_async.name)['queue'].name == 'train'
+    assert router.route({}, predict_async.name)['queue'].name == 'predict'
+    assert router.route({}, predict_batch_async.name)['queue'].name == 'predict'
+    assert train_model_async.soft_time_limit < train_model_async.time_limit
+    assert predict_async.time_limit
+
+def test_predict_priority(client):
+    with patch('modelML.predict_async.apply_async') as mock_predict:
+        mock_predict.return_value = MagicMock(id='task')
+        client.post('/predict', data={'image': (io.BytesIO(png(0)), 'a.png')})
+        assert mock_predict.call_args[1] == {'priority': 0}
+        client.post('/predict?priority=low', data={'image': (io.BytesIO(png(0)), 'a.png')})
+        assert mock_predict.call_args[1] == {'priority': 6}
+        response = client.post('/predict?priority=urgent', data={'image': (io.BytesIO(png(0)), 'a.png')})
+        assert response.status_code == 400
+
+def test_local_transport_passes_messages_through_files(tmp_path):
+    from kombu import Connection
+    options = {'data_folder_in': str(tmp_path), 'data_folder_out': str(tmp_path), 'control_folder': str(tmp_path / 'control')}
+    with Connection('filesystem://', transport='local_transport:Transport', transport_options=options) as connection:
+        queue = connection.SimpleQueue('predict')
+        queue.put({'image': 1})
+        # Only the renamed message, no temporary file left behind
+        assert [name.endswith('.predict.msg') for name in os.listdir(tmp_path) if name != 'control'] == [True]
+        message = queue.get(timeout=1)
+        assert message.payload == {'image': 1}
+        message.ack()
+        queue.close()
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'registry.db'), str(tmp_path / 'models'), str(tmp_path / 'model.h5'))
+    with patch.object(modelML, 'registry', registry):
+        yield registry
+
+def add_version(registry, content, accuracy):
+    path = registry.temp_path()
+    with open(path, 'w') as f:
+        f.write(content)
+    return registry.register(registry.start_session(), path, 'test', accuracy=accuracy, loss=1 - accuracy)
+
+def test_model_endpoints_promote_and_roll_back(client, registry):
+    first = add_version(registry, 'first', 0.5)
+    second = add_version(registry, 'second', 0.9)
+    assert client.post('/models/unknown/promote').status_code == 404
+    assert client.post('/models/rollback').status_code == 409
+    assert client.post(f'/models/{first}/promote').json == {'current': first}
+    assert client.post(f'/models/{second}/promote').json == {'current': second}
+    models = client.get('/models').json
+    assert models['current'] == second
+    assert [(model['version'], model['promoted']) for model in models['models']] == [(second, True), (first, False)]
+    assert client.post('/models/rollback').json == {'current': first}
@@ -0,0 +1,70 @@
+import pytest
+import hashlib
+import os
+import sqlite3
+from model_registry import ModelRegistry
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry.db'), str(tmp_path / 'models'), str(tmp_path / 'model.h5'))
+
+def save(registry, content):
+    path = registry.temp_path()
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+def rows(registry, query):
+    with sqlite3.connect(registry.database) as connection:
+        return connection.execute(query).fetchall()
+
+def test_register_stores_an_immutable_version(registry):
+    session_id = registry.start_session()
+    assert rows(registry, 'SELECT Status FROM training_sessions_table') == [('running',)]
+    version = registry.register(session_id, save(registry, 'weights'), 'dense', dataset_id=7, accuracy=0.75, loss=0.5)
+    assert version == hashlib.sha256(b'weights').hexdigest()[:12]
+    with open(registry.path(version)) as f:
+        assert f.read() == 'weights'
+    assert os.stat(registry.path(version)).st_mode & 0o222 == 0
+    assert rows(registry, 'SELECT Name, Architecture, TrainingDatasetID FROM models_table') == [(version, 'dense', 7)]
+    assert rows(registry, 'SELECT ModelID, Status, Accuracy, Loss FROM training_sessions_table') == [(1, 'trained', 0.75, 0.5)]
+    # Only the stored version is left in the directory
+    assert os.listdir(registry.root) == [f'{version}.h5']
+
+def test_register_keeps_the_class_labels(registry):
+    version = registry.register(registry.start_session(), save(registry, 'weights'), 'dense', classes=['cat', 'dog'])
+    assert registry.classes(version) == ['cat', 'dog']
+    assert registry.versions()[0]['classes'] == ['cat', 'dog']
+    assert registry.classes('0' * 12) is None
+
+def test_failed_session(registry):
+    session_id = registry.start_session()
+    registry.fail_session(session_id)
+    assert rows(registry, 'SELECT ModelID, Status FROM training_sessions_table') == [(None, 'failed')]
+    assert registry.versions() == []
+
+def test_promote_swaps_the_pointer(registry):
+    first = registry.register(registry.start_session(), save(registry, 'first'), 'dense')
+    second = registry.register(registry.start_session(), save(registry, 'second'), 'dense')
+    assert registry.current() is None
+    registry.promote(first)
+    with open(registry.pointer) as f:
+        assert f.read() == 'first'
+    registry.promote(second)
+    assert registry.current() == second
+    assert os.path.islink(registry.pointer)
+    # The link is relative, so the pointer and registry can move together
+    assert not os.path.isabs(os.readlink(registry.pointer))
+    with pytest.raises(KeyError):
+        registry.promote('0' * 12)
+
+def test_rollback(registry):
+    assert registry.rollback() is None
+    first = registry.register(registry.start_session(), save(registry, 'first'), 'dense')
+    second = registry.register(registry.start_session(), save(registry, 'second'), 'dense')
+    registry.promote(first)
+    registry.promote(second)
+    assert registry.rollback() == first
+    assert registry.current() == first
+    # Rolling back again returns to the version the rollback replaced
+    assert registry.rollback() == second
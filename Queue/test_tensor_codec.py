@@ -0,0 +1,34 @@
+import pytest
+import numpy as np
+import tensor_codec
+
+@pytest.mark.parametrize('array', [
+    np.arange(2 * 28 * 28, dtype=np.uint8).reshape(2, 28, 28),
+    np.linspace(0, 1, 12, dtype=np.float32).reshape(3, 4),
+    np.zeros((0, 28, 28), dtype=np.uint8),
+])
+def test_round_trip(array):
+    decoded = tensor_codec.from_message(tensor_codec.to_message(array))
+    assert decoded.dtype == array.dtype
+    assert decoded.shape == array.shape
+    assert np.array_equal(decoded, array)
+
+def test_payload_is_raw_bytes_plus_header():
+    array = np.ones((4, 28, 28), dtype=np.float32)
+    assert len(tensor_codec.encode(array)) == 6 + 3 * 4 + array.nbytes
+
+def test_big_endian_input_is_stored_little_endian():
+    array = np.arange(5, dtype='>f4')
+    assert tensor_codec.encode(array)[-4:] == np.float32(4).tobytes()
+    assert np.array_equal(tensor_codec.decode(tensor_codec.encode(array)), array)
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        tensor_codec.encode(np.zeros(3, dtype=np.float64))
+    with pytest.raises(ValueError):
+        tensor_codec.decode(b'not a tensor')
+    with pytest.raises(ValueError):
+        tensor_codec.decode(tensor_codec.encode(np.zeros((2, 2), dtype=np.uint8))[:-1])
+    # A header promising three dimensions with no shape after it
+    with pytest.raises(ValueError):
+        tensor_codec.decode(tensor_codec.HEADER.pack(tensor_codec.MAGIC, 0, 3))
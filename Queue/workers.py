@@ -0,0 +1,65 @@
+"""Start one Celery worker per queue, each with its own pool size and prefetch limit.
+
+    python workers.py
+    PREDICT_CONCURRENCY=8 TRAIN_CONCURRENCY=1 python workers.py
+
+The predict worker runs one pool process per core by default and the train
+worker one, so a training run takes a single process and never a prediction
+slot. Both reserve one task per process at a time (see celeryconfig.py), so
+queued predictions are picked highest priority first.
+"""
+import os
+import signal
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# queue: (pool processes, tasks reserved per process)
+WORKERS = {
+    'predict': (int(os.environ.get('PREDICT_CONCURRENCY', os.cpu_count() or 1)), int(os.environ.get('PREDICT_PREFETCH', 1))),
+    'train': (int(os.environ.get('TRAIN_CONCURRENCY', 1)), int(os.environ.get('TRAIN_PREFETCH', 1))),
+}
+
+
+def worker_command(queues, concurrency, prefetch):
+    name = '+'.join(queues)
+    return [sys.executable, '-m', 'celery', '-A', 'modelML:celery', 'worker', '-Q', ','.join(queues), '-n', f'{name}@%h',
+            '-c', str(concurrency), '--prefetch-multiplier', str(prefetch), '--loglevel', 'INFO']
+
+
+def start_workers(workers=None, cwd=None, env=None, output=None):
+    """Popen one worker per entry of workers ({queue or 'a,b': (concurrency, prefetch)}); cwd holds mnist_model.h5."""
+    env = dict(os.environ if env is None else env)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [HERE, env.get('PYTHONPATH')]))
+    return [subprocess.Popen(worker_command(queues.split(','), concurrency, prefetch), cwd=cwd or HERE, env=env,
+                             stdout=output, stderr=subprocess.STDOUT if output else None, start_new_session=True)
+            for queues, (concurrency, prefetch) in (workers or WORKERS).items()]
+
+
+def stop_workers(processes, timeout=30):
+    for process in processes:
+        # Warm shutdown: running tasks finish, queued ones stay queued
+        process.send_signal(signal.SIGTERM)
+    for process in processes:
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            # The worker and its pool processes share a process group
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def main():
+    processes = start_workers()
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == '__main__':
+    main()
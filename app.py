@@ -1,21 +1,110 @@
-from flask import Flask, jsonify, request
-from flask_restful import Resource, Api, fields, marshal_with, reqparse
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+from flask_restful import Resource, Api, fields, marshal, marshal_with, reqparse
+from flask_restful.representations.json import output_json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import (DDL, FetchedValue, column, create_engine, delete, event, false, func, insert, inspect, null, or_, select, table,
+                        true, tuple_, union_all, update)
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import scoped_session, sessionmaker
+import base64
+import hashlib
+import json
+import mimetypes
+import operator
 import os
-from datetime import datetime
+import random
+import re
+import threading
+import time
+from datetime import date, datetime
+from blobstore import BlobStore
+from cache import LRUCache
+from export import TombstoneSerializer, csv_chunks, gzip_chunks, ndjson_chunks
+from serializer import Serializer
 
 app = Flask(__name__)
 api = Api(app)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'EC530pro2.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'EC530pro2.db'))
 db = SQLAlchemy(app)
 
+# Storage configuration: STORAGE_MODE=wal switches the SQLite file to WAL journaling so readers and
+# the writer stop blocking each other, and serves GET traffic from a pool of read-only connections.
+# In every mode a commit that hits a locked database is retried COMMIT_RETRIES times with backoff.
+app.config['STORAGE_MODE'] = os.environ.get('STORAGE_MODE', 'default')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_KB'] = int(os.environ.get('SQLITE_CACHE_KB', 64000))
+app.config['READ_POOL_SIZE'] = int(os.environ.get('READ_POOL_SIZE', 8))
+app.config['COMMIT_RETRIES'] = int(os.environ.get('COMMIT_RETRIES', 5))
+app.config['COMMIT_RETRY_BACKOFF_MS'] = int(os.environ.get('COMMIT_RETRY_BACKOFF_MS', 20))
+
+read_session = None
+
+def set_wal_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # NORMAL only syncs at checkpoints in WAL mode; a power loss can drop the last commits, never corrupt
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_KB']}")
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+def set_read_pragmas(dbapi_connection, connection_record):
+    set_wal_pragmas(dbapi_connection, connection_record)
+    dbapi_connection.execute('PRAGMA query_only=ON')
+
+def configure_storage():
+    global read_session
+    with app.app_context():
+        engine = db.engine
+    if app.config['STORAGE_MODE'] != 'wal':
+        return
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        print('STORAGE_MODE=wal needs an SQLite database file, keeping the default storage mode')
+        return
+    event.listen(engine, 'connect', set_wal_pragmas)
+    read_engine = create_engine(engine.url, pool_size=app.config['READ_POOL_SIZE'], max_overflow=0)
+    event.listen(read_engine, 'connect', set_read_pragmas)
+    read_session = scoped_session(sessionmaker(bind=read_engine))
+
+def reader():
+    """Session for read-only work: the read pool in WAL mode, otherwise db.session."""
+    return read_session if read_session is not None else db.session
+
+@app.teardown_appcontext
+def remove_read_session(exception=None):
+    if read_session is not None:
+        read_session.remove()
+
+def commit_with_retry(stage):
+    """Run stage(), which adds changes to db.session, commit them and return stage()'s result.
+
+    When SQLite reports the database locked, the session is rolled back (which
+    discards the staged changes) and stage() runs again after a backoff.
+    """
+    for attempt in range(app.config['COMMIT_RETRIES'] + 1):
+        try:
+            result = stage()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if 'database is locked' not in str(e) or attempt == app.config['COMMIT_RETRIES']:
+                raise
+            time.sleep(app.config['COMMIT_RETRY_BACKOFF_MS'] / 1000.0 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+configure_storage()
+
 # Upload folder configuration
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+# Uploads are stored by content hash (blobstore.py), so two clients sending the same filename
+# no longer overwrite each other
+upload_store = BlobStore(UPLOAD_FOLDER)
 
 # Database model
 class Dataset(db.Model):
@@ -25,6 +114,67 @@ class Dataset(db.Model):
     Description = db.Column(db.Text)
     Type = db.Column(db.String(100))
     CreationDate = db.Column(db.Date)
+    UpdatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set by the CHANGE_SEQ_DDL triggers on every insert and update, in commit order
+    ChangeSeq = db.Column(db.Integer, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # Listing indexes: each ends in DatasetID, the keyset tie-breaker, so a filtered
+    # and sorted page is a single index range scan
+    __table_args__ = (
+        db.Index('ix_datasets_type_id', 'Type', 'DatasetID'),
+        db.Index('ix_datasets_type_created', 'Type', 'CreationDate', 'DatasetID'),
+        db.Index('ix_datasets_type_name', 'Type', 'Name', 'DatasetID'),
+        db.Index('ix_datasets_created', 'CreationDate', 'DatasetID'),
+        db.Index('ix_datasets_name', 'Name', 'DatasetID'),
+        db.Index('ix_datasets_updated', 'UpdatedAt', 'DatasetID'),
+        db.Index('ix_datasets_change_seq', 'ChangeSeq', 'DatasetID'),
+    )
+
+class DatasetTombstone(db.Model):
+    # A deleted dataset, numbered on the ChangeSeq sequence by the CHANGE_SEQ_DDL delete trigger
+    __tablename__ = 'datasets_tombstones'
+    ChangeSeq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    DatasetID = db.Column(db.Integer, nullable=False)
+
+# Full-text index over Name and Description. datasets_fts is an external-content FTS5 table:
+# it stores only the index and reads the text back from datasets_table, and the triggers
+# keep it in step with every insert, update and delete, including the bulk statements
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS datasets_fts USING fts5(Name, Description, content='datasets_table', "
+    "content_rowid='DatasetID', tokenize='porter unicode61 remove_diacritics 2')",
+    # Rank name matches above description matches
+    "INSERT INTO datasets_fts(datasets_fts, rank) VALUES('rank', 'bm25(4.0, 1.0)')",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_insert AFTER INSERT ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description); END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_delete AFTER DELETE ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description); END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_update AFTER UPDATE OF Name, Description ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description); "
+    "INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description); END",
+]
+# Change sequence for incremental exports. datasets_change_seq holds the last number handed out;
+# the triggers bump it and stamp the written row while the writing transaction holds SQLite's
+# single write lock, so a row that commits later always gets a higher number, however early its
+# UpdatedAt was stamped. A counter rather than MAX(ChangeSeq), which deleting the newest row would lower
+CHANGE_SEQ_BUMP = ("UPDATE datasets_change_seq SET value = value + 1; "
+                   "UPDATE datasets_table SET ChangeSeq = (SELECT value FROM datasets_change_seq) WHERE DatasetID = new.DatasetID; END")
+CHANGE_SEQ_DDL = [
+    "CREATE TABLE IF NOT EXISTS datasets_change_seq (value INTEGER NOT NULL)",
+    "INSERT INTO datasets_change_seq (value) SELECT IFNULL(MAX(ChangeSeq), 0) FROM datasets_table "
+    "WHERE NOT EXISTS (SELECT 1 FROM datasets_change_seq)",
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_insert AFTER INSERT ON datasets_table BEGIN " + CHANGE_SEQ_BUMP,
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_update AFTER UPDATE OF Name, Description, Type, CreationDate, UpdatedAt "
+    "ON datasets_table BEGIN " + CHANGE_SEQ_BUMP,
+    # A delete leaves a tombstone, so incremental exports can pass it on
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_delete AFTER DELETE ON datasets_table BEGIN "
+    "UPDATE datasets_change_seq SET value = value + 1; "
+    "INSERT INTO datasets_tombstones (ChangeSeq, DatasetID) SELECT value, old.DatasetID FROM datasets_change_seq; END",
+]
+for statement in SEARCH_DDL + CHANGE_SEQ_DDL:
+    event.listen(Dataset.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Dataset.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS datasets_fts').execute_if(dialect='sqlite'))
+event.listen(Dataset.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS datasets_change_seq').execute_if(dialect='sqlite'))
+
+datasets_fts = table('datasets_fts', column('rowid', db.Integer), column('rank', db.Float), column('datasets_fts'))
 
 # Fields for serialization
 dataset_fields = {
@@ -35,6 +185,13 @@ dataset_fields = {
     'CreationDate': fields.String
 }
 
+# Compiled once; writes the same bytes as marshal_with(dataset_fields) without the per-field walk
+dataset_serializer = Serializer(dataset_fields)
+
+def uses_compiled_serializer():
+    # flask_restful indents in debug mode and applies RESTFUL_JSON; the compiled path writes its default output
+    return not app.debug and not app.config.get('RESTFUL_JSON')
+
 # Argument parsing
 parser = reqparse.RequestParser()
 parser.add_argument('Name', required=True, help="Name cannot be blank")
@@ -42,6 +199,200 @@ parser.add_argument('Description')
 parser.add_argument('Type', required=True, help="Type cannot be blank")
 parser.add_argument('CreationDate', type=lambda x: datetime.strptime(x, '%Y-%m-%d'), help="Date must be in YYYY-MM-DD format")
 
+# Listing configuration: GET /datasets/ pages with a keyset cursor rather than OFFSET,
+# so every page costs the same however deep into the table it is
+app.config['LIST_DEFAULT_LIMIT'] = int(os.environ.get('LIST_DEFAULT_LIMIT', 50))
+app.config['LIST_MAX_LIMIT'] = int(os.environ.get('LIST_MAX_LIMIT', 500))
+
+SORT_COLUMNS = {'DatasetID': Dataset.DatasetID, 'Name': Dataset.Name, 'CreationDate': Dataset.CreationDate}
+# Range filters and the column each one bounds. A range and an order on different columns cannot share
+# one index, so SQLite would sort every match in a temp B-tree; those combinations are rejected
+RANGE_FILTERS = {'name_prefix': 'Name', 'created_from': 'CreationDate', 'created_to': 'CreationDate'}
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('type', location='args')
+list_parser.add_argument('created_from', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args', help="Date must be in YYYY-MM-DD format")
+list_parser.add_argument('created_to', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args', help="Date must be in YYYY-MM-DD format")
+list_parser.add_argument('name_prefix', location='args')
+list_parser.add_argument('sort', default='DatasetID', location='args')
+list_parser.add_argument('limit', type=int, location='args')
+list_parser.add_argument('cursor', location='args')
+
+def page_limit(requested):
+    return min(max(requested or app.config['LIST_DEFAULT_LIMIT'], 1), app.config['LIST_MAX_LIMIT'])
+
+def encode_cursor(segment, value, dataset_id):
+    if isinstance(value, date):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([segment, value, dataset_id]).encode()).decode()
+
+def decode_cursor(cursor, column):
+    try:
+        segment, value, dataset_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if column is Dataset.CreationDate and value is not None:
+            value = date.fromisoformat(value)
+        return segment, value, int(dataset_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def dataset_filters(args):
+    filters = []
+    if args['type'] is not None:
+        filters.append(Dataset.Type == args['type'])
+    if args['created_from'] is not None:
+        filters.append(Dataset.CreationDate >= args['created_from'])
+    if args['created_to'] is not None:
+        filters.append(Dataset.CreationDate <= args['created_to'])
+    if args['name_prefix']:
+        # A range instead of LIKE so the Name index can be used (the match is case-sensitive)
+        prefix = args['name_prefix']
+        filters.append(Dataset.Name >= prefix)
+        filters.append(Dataset.Name < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return filters
+
+def list_datasets(args):
+    """Return one page of datasets and the cursor of the next page (None on the last one).
+
+    Rows are ordered by the sort column, then DatasetID. Each page continues
+    from the last row of the previous one with a (column, DatasetID) range, and
+    rows whose sort column is NULL are paged as a segment of their own, first
+    ascending and last descending, the way SQLite orders NULLs.
+    """
+    sort = args['sort']
+    descending = sort.startswith('-')
+    column = SORT_COLUMNS.get(sort.lstrip('-'))
+    if column is None:
+        raise ValueError(f"Cannot sort by {sort.lstrip('-')}; use one of {', '.join(SORT_COLUMNS)}")
+    ranged = [name for name in RANGE_FILTERS if args[name]]
+    ranged_columns = sorted({RANGE_FILTERS[name] for name in ranged})
+    if ranged and column.key not in ranged_columns:
+        raise ValueError(f"Filtering by {', '.join(ranged)} needs sort={' or sort='.join(ranged_columns)} (or its - form)")
+    limit = page_limit(args['limit'])
+    after = operator.lt if descending else operator.gt
+    direction = (lambda c: c.desc()) if descending else (lambda c: c.asc())
+
+    if column is Dataset.DatasetID or column.key in ranged_columns:
+        # A range filter on the sort column already excludes its NULLs
+        segments = ['value']
+    else:
+        segments = ['value', 'null'] if descending else ['null', 'value']
+    cursor_segment = None
+    if args['cursor']:
+        cursor_segment, last_value, last_id = decode_cursor(args['cursor'], column)
+        if cursor_segment not in segments:
+            raise ValueError('Invalid cursor')
+        segments = segments[segments.index(cursor_segment):]
+
+    query = reader().query(Dataset).filter(*dataset_filters(args))
+    rows = []
+    for segment in segments:
+        page = query
+        if column is Dataset.DatasetID:
+            if segment == cursor_segment:
+                page = page.filter(after(Dataset.DatasetID, last_id))
+            page = page.order_by(direction(Dataset.DatasetID))
+        elif segment == 'null':
+            page = page.filter(column.is_(None))
+            if segment == cursor_segment:
+                page = page.filter(after(Dataset.DatasetID, last_id))
+            page = page.order_by(direction(Dataset.DatasetID))
+        else:
+            page = page.filter(column.isnot(None))
+            if segment == cursor_segment:
+                page = page.filter(after(tuple_(column, Dataset.DatasetID), tuple_(last_value, last_id)))
+            page = page.order_by(direction(column), direction(Dataset.DatasetID))
+        rows.extend(page.limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last_value = getattr(rows[-1], column.key)
+    return rows, encode_cursor('null' if last_value is None else 'value', last_value, rows[-1].DatasetID)
+
+search_parser = reqparse.RequestParser()
+search_parser.add_argument('q', required=True, location='args', help="q cannot be blank")
+search_parser.add_argument('limit', type=int, location='args')
+search_parser.add_argument('cursor', location='args')
+
+def match_expression(text):
+    # Each word becomes a quoted FTS5 string, so punctuation and operators in user input are literal
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+def search_datasets(args):
+    """Return one page of datasets matching every word of q, best bm25 rank first, and the next cursor.
+
+    Pages continue after the (rank, DatasetID) of the previous page's last row.
+    """
+    expression = match_expression(args['q'])
+    if not expression:
+        raise ValueError('q must contain at least one word')
+    limit = page_limit(args['limit'])
+    query = (select(Dataset, datasets_fts.c.rank)
+             .join(datasets_fts, datasets_fts.c.rowid == Dataset.DatasetID)
+             .where(datasets_fts.c.datasets_fts.op('MATCH')(expression)))
+    if args['cursor']:
+        segment, last_rank, last_id = decode_cursor(args['cursor'], None)
+        if segment != 'rank':
+            raise ValueError('Invalid cursor')
+        query = query.where(tuple_(datasets_fts.c.rank, datasets_fts.c.rowid) > tuple_(last_rank, last_id))
+    rows = reader().execute(query.order_by(datasets_fts.c.rank, datasets_fts.c.rowid).limit(limit + 1)).all()
+    datasets = [dataset for dataset, _ in rows[:limit]]
+    if len(rows) <= limit:
+        return datasets, None
+    last_dataset, last_rank = rows[limit - 1]
+    return datasets, encode_cursor('rank', last_rank, last_dataset.DatasetID)
+
+# Read-through cache of serialized GET /datasets/<id> bodies, up to DATASET_CACHE_SIZE entries.
+# Every write to a dataset invalidates it, so an unchanged resource is answered from memory.
+app.config['DATASET_CACHE_SIZE'] = int(os.environ.get('DATASET_CACHE_SIZE', 4096))
+dataset_cache = LRUCache(app.config['DATASET_CACHE_SIZE'])
+dataset_cache_lock = threading.Lock()
+dataset_cache_generation = 0
+
+def dataset_representation(dataset):
+    """Serialize a dataset once into (body, ETag, Last-Modified), as marshal_with would render it."""
+    if uses_compiled_serializer():
+        body = (dataset_serializer.dumps(dataset) + '\n').encode()
+    else:
+        body = output_json(marshal(dataset, dataset_fields), 200).get_data()
+    return body, hashlib.sha1(body).hexdigest(), dataset.UpdatedAt
+
+def invalidate_datasets(dataset_ids):
+    global dataset_cache_generation
+    with dataset_cache_lock:
+        dataset_cache_generation += 1
+        for dataset_id in dataset_ids:
+            dataset_cache.pop(dataset_id)
+
+def upgrade_schema():
+    """db.create_all() skips tables that already exist; add any column or index they are missing."""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'sqlite' and not inspector.has_table('datasets_fts'):
+        with db.engine.begin() as connection:
+            for statement in SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+            # Index the rows written before the search table existed
+            connection.exec_driver_sql("INSERT INTO datasets_fts(datasets_fts) VALUES('rebuild')")
+    if db.engine.dialect.name == 'sqlite':
+        # Rows written before the triggers have no ChangeSeq; full exports include them
+        with db.engine.begin() as connection:
+            for statement in CHANGE_SEQ_DDL:
+                connection.exec_driver_sql(statement)
+
 # Route for uploading images
 @app.route('/upload', methods=['POST'])
 def upload_image():
@@ -52,22 +403,89 @@ def upload_image():
         return jsonify({'error': 'No selected image'}), 400
     if file:
         filename = file.filename
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(save_path)
+        blob = upload_store.put_stream(filename, file.stream)
         print("file is training(fake)")
-        new_dataset = Dataset(Name=filename, Description='Uploaded image', Type='Image', CreationDate=datetime.today().date())
-        db.session.add(new_dataset)
-        db.session.commit()
-        return jsonify({'message': f'Image {filename} uploaded successfully'}), 200
+
+        def stage():
+            new_dataset = Dataset(Name=filename, Description='Uploaded image', Type='Image', CreationDate=datetime.today().date())
+            db.session.add(new_dataset)
+            return new_dataset
+        new_dataset = commit_with_retry(stage)
+        return jsonify({'message': f'Image {filename} uploaded successfully', 'DatasetID': new_dataset.DatasetID,
+                        'sha256': blob.digest}), 200
+
+SHA256_HEX = re.compile(r'[0-9a-f]{64}')
+
+# Route for an uploaded file: /uploads/<sha256>, as returned by /upload, is always that content;
+# any other name serves the most recent upload under it. send_file answers Range requests
+@app.route('/uploads/<path:name>', methods=['GET'])
+def uploaded_file(name):
+    blob = upload_store.get(name) if SHA256_HEX.fullmatch(name) else None
+    blob = blob or upload_store.lookup(name)
+    if blob is None:
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(os.path.abspath(blob.path), mimetype=mimetypes.guess_type(blob.name)[0] or 'application/octet-stream',
+                     conditional=True, etag=blob.digest, download_name=os.path.basename(blob.name))
+
+# Resource for listing and creating datasets
+class DatasetListAPI(Resource):
+    def get(self):
+        args = list_parser.parse_args()
+        try:
+            datasets, next_cursor = list_datasets(args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if uses_compiled_serializer():
+            body = '{"datasets": ' + dataset_serializer.dumps_many(datasets) + ', "next_cursor": ' + json.dumps(next_cursor) + '}\n'
+            return Response(body, mimetype='application/json')
+        return {'datasets': marshal(datasets, dataset_fields), 'next_cursor': next_cursor}, 200
+
+    @marshal_with(dataset_fields)  # 应用于 POST 方法
+    def post(self):
+        args = parser.parse_args()
+
+        def stage():
+            new_dataset = Dataset(Name=args['Name'], Description=args.get('Description'), Type=args['Type'], CreationDate=args.get('CreationDate'))
+            db.session.add(new_dataset)
+            return new_dataset
+        new_dataset = commit_with_retry(stage)
+        return new_dataset, 201  # 直接返回对象和状态码
+
+# Resource for full-text search over dataset names and descriptions
+class DatasetSearchAPI(Resource):
+    def get(self):
+        args = search_parser.parse_args()
+        try:
+            datasets, next_cursor = search_datasets(args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if uses_compiled_serializer():
+            body = '{"datasets": ' + dataset_serializer.dumps_many(datasets) + ', "next_cursor": ' + json.dumps(next_cursor) + '}\n'
+            return Response(body, mimetype='application/json')
+        return {'datasets': marshal(datasets, dataset_fields), 'next_cursor': next_cursor}, 200
 
 # Resource for handling datasets
 class DatasetAPI(Resource):
-    @marshal_with(dataset_fields)  # 正确使用 marshal_with 作为装饰器
     def get(self, dataset_id):
-        dataset = Dataset.query.filter_by(DatasetID=dataset_id).first()
-        if not dataset:
-            return {'error': 'Dataset not found'}, 404
-        return dataset
+        entry = dataset_cache.get(dataset_id)
+        if entry is None:
+            generation = dataset_cache_generation
+            dataset = reader().query(Dataset).filter_by(DatasetID=dataset_id).first()
+            if not dataset:
+                return {'error': 'Dataset not found'}, 404
+            entry = dataset_representation(dataset)
+            with dataset_cache_lock:
+                # Skip the fill when a write landed while the row was being read
+                if generation == dataset_cache_generation:
+                    dataset_cache.put(dataset_id, entry)
+        body, etag, last_modified = entry
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        # Answers 304 with no body when If-None-Match or If-Modified-Since still matches
+        return response.make_conditional(request)
 
     def put(self, dataset_id):
         dataset = Dataset.query.get(dataset_id)
@@ -75,47 +493,253 @@ class DatasetAPI(Resource):
             return {'error': 'Dataset not found'}, 404
 
         args = parser.parse_args()
-        has_update = False
-
-        if 'Name' in args and args['Name'] is not None:
-            dataset.Name = args['Name']
-            has_update = True
-        if 'Description' in args and args['Description'] is not None:
-            dataset.Description = args['Description']
-            has_update = True
-        if 'Type' in args and args['Type'] is not None:
-            dataset.Type = args['Type']
-            has_update = True
-        if 'CreationDate' in args and args['CreationDate'] is not None:
-            dataset.CreationDate = args['CreationDate']
-            has_update = True
-
-        if has_update:
-            db.session.commit()
+
+        def stage():
+            has_update = False
+            if 'Name' in args and args['Name'] is not None:
+                dataset.Name = args['Name']
+                has_update = True
+            if 'Description' in args and args['Description'] is not None:
+                dataset.Description = args['Description']
+                has_update = True
+            if 'Type' in args and args['Type'] is not None:
+                dataset.Type = args['Type']
+                has_update = True
+            if 'CreationDate' in args and args['CreationDate'] is not None:
+                dataset.CreationDate = args['CreationDate']
+                has_update = True
+            return has_update
+
+        if commit_with_retry(stage):
+            invalidate_datasets([dataset_id])
             return {'message': 'Dataset updated successfully'}, 200
         else:
             return {'message': 'No update performed'}, 200
-    @marshal_with(dataset_fields)  # 应用于 POST 方法
-    def post(self):
-        args = parser.parse_args()
-        new_dataset = Dataset(Name=args['Name'], Description=args.get('Description'), Type=args['Type'], CreationDate=args.get('CreationDate'))
-        db.session.add(new_dataset)
-        db.session.commit()
-        return new_dataset, 201  # 直接返回对象和状态码
 
     def delete(self, dataset_id):
         dataset = Dataset.query.get(dataset_id)
         if dataset:
-            db.session.delete(dataset)
-            db.session.commit()
+            commit_with_retry(lambda: db.session.delete(dataset))
+            invalidate_datasets([dataset_id])
             return {'message': 'Dataset deleted'}, 200
         return {'error': 'Dataset not found'}, 404
 
+# Bulk configuration: POST /datasets/bulk applies at most BULK_MAX_OPERATIONS operations in one transaction
+app.config['BULK_MAX_OPERATIONS'] = int(os.environ.get('BULK_MAX_OPERATIONS', 1000))
+
+DATASET_COLUMNS = ('Name', 'Description', 'Type', 'CreationDate')
+BULK_STATUSES = ('created', 'updated', 'deleted', 'not_found', 'error')
+
+def dataset_values(data, creating):
+    """Validate the data of one bulk operation and return its column values."""
+    if not isinstance(data, dict):
+        raise ValueError('data must be an object')
+    unknown = set(data) - set(DATASET_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    values = {key: value for key, value in data.items() if value is not None}
+    if creating:
+        for key in ('Name', 'Type'):
+            if not values.get(key):
+                raise ValueError(f'{key} cannot be blank')
+    elif not values:
+        raise ValueError('No fields to update')
+    if 'CreationDate' in values:
+        try:
+            values['CreationDate'] = datetime.strptime(values['CreationDate'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValueError('Date must be in YYYY-MM-DD format')
+    return values
+
+def insert_datasets(rows):
+    """Insert rows with one executemany and return their new DatasetIDs in order."""
+    if db.engine.dialect.name != 'sqlite':
+        return db.session.scalars(insert(Dataset).returning(Dataset.DatasetID, sort_by_parameter_order=True), rows).all()
+    # SQLite can only return ids in parameter order by inserting row by row; within one write
+    # transaction an INTEGER PRIMARY KEY takes consecutive rowids, so count back from the last one
+    db.session.execute(insert(Dataset), rows)
+    last_id = db.session.scalar(db.text('SELECT last_insert_rowid()'))
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+def run_bulk_operations(operations):
+    """Validate, then apply a batch of create/update/delete operations in one transaction.
+
+    Creates are one executemany INSERT, updates one executemany
+    UPDATE by primary key and deletes a single DELETE ... IN. Invalid operations
+    and unknown ids are reported per item and skipped; a database error rolls
+    back the whole batch.
+    """
+    results = [None] * len(operations)
+    creates, updates, deletes, targets = [], [], [], set()
+    for index, operation in enumerate(operations):
+        try:
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op == 'create':
+                creates.append((index, dataset_values(operation.get('data'), creating=True)))
+                continue
+            if op not in ('update', 'delete'):
+                raise ValueError("op must be 'create', 'update' or 'delete'")
+            dataset_id = operation.get('DatasetID')
+            if not isinstance(dataset_id, int) or isinstance(dataset_id, bool):
+                raise ValueError('DatasetID must be an integer')
+            if dataset_id in targets:
+                raise ValueError(f'DatasetID {dataset_id} appears in more than one operation')
+            if op == 'update':
+                updates.append((index, dataset_id, dataset_values(operation.get('data'), creating=False)))
+            else:
+                deletes.append((index, dataset_id))
+            targets.add(dataset_id)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+    def stage():
+        existing = set()
+        if targets:
+            existing = set(db.session.scalars(select(Dataset.DatasetID).where(Dataset.DatasetID.in_(targets))))
+        new_ids = []
+        if creates:
+            new_ids = insert_datasets([dict(dict.fromkeys(DATASET_COLUMNS), **values) for _, values in creates])
+        rows = [dict(values, DatasetID=dataset_id) for _, dataset_id, values in updates if dataset_id in existing]
+        if rows:
+            db.session.execute(update(Dataset), rows)
+        removed = [dataset_id for _, dataset_id in deletes if dataset_id in existing]
+        if removed:
+            db.session.execute(delete(Dataset).where(Dataset.DatasetID.in_(removed)))
+        return existing, new_ids
+
+    try:
+        existing, new_ids = commit_with_retry(stage)
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    invalidate_datasets(targets)
+
+    for (index, _), dataset_id in zip(creates, new_ids):
+        results[index] = {'index': index, 'status': 'created', 'DatasetID': dataset_id}
+    for index, dataset_id, _ in updates:
+        results[index] = {'index': index, 'status': 'updated' if dataset_id in existing else 'not_found', 'DatasetID': dataset_id}
+    for index, dataset_id in deletes:
+        results[index] = {'index': index, 'status': 'deleted' if dataset_id in existing else 'not_found', 'DatasetID': dataset_id}
+    return results
+
+# Resource for batches of create, update and delete operations
+class DatasetBulkAPI(Resource):
+    def post(self):
+        body = request.get_json(silent=True)
+        operations = body.get('operations') if isinstance(body, dict) else None
+        if not isinstance(operations, list):
+            return {'error': 'Expected a JSON object with an operations list'}, 400
+        if len(operations) > app.config['BULK_MAX_OPERATIONS']:
+            return {'error': f"At most {app.config['BULK_MAX_OPERATIONS']} operations per request"}, 413
+        try:
+            results = run_bulk_operations(operations)
+        except SQLAlchemyError as e:
+            return {'error': f"Batch rolled back: {getattr(e, 'orig', None) or e}"}, 500
+        summary = {status: sum(result['status'] == status for result in results) for status in BULK_STATUSES}
+        return dict(summary, results=results), 200
+
+# Export configuration: GET /export/<table> streams a whole table, reading EXPORT_BATCH_SIZE rows at a time
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+export_dataset_fields = dict(dataset_fields, UpdatedAt=fields.DateTime(dt_format='iso8601'))
+
+# Exportable tables: (model, watermark column, fields, tombstones). The watermark column only grows,
+# in commit order, as rows are written, so "changed since" is a range on it. A timestamp would not
+# do: it is stamped before the write lock is taken, so a delayed commit could land below a watermark
+# already handed out and never be exported. Deleted rows are gone from the table, so deltas read
+# them from the tombstones model
+EXPORTS = {
+    'datasets': (Dataset, Dataset.ChangeSeq, export_dataset_fields, DatasetTombstone),
+}
+export_serializers = {table: Serializer(spec) for table, (_, _, spec, _) in EXPORTS.items()}
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def encode_watermark(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def decode_watermark(value, column):
+    try:
+        return datetime.fromisoformat(value) if column.type.python_type is datetime else int(value)
+    except ValueError:
+        raise ValueError(f'Invalid since watermark: {value}')
+
+def export_statement(model, column, spec, since, tombstones=None):
+    """Return the SELECT of rows changed after since (all rows if None) and the new watermark.
+
+    The watermark is read first and caps the range, so rows written while the
+    export streams are left for the next one rather than sent twice. With a
+    tombstones model numbered on the same sequence, a delta also has a row
+    with deleted set for each key deleted in the range, in commit order with
+    the changed rows.
+    """
+    primary_key = inspect(model).primary_key[0]
+    if tombstones is None:
+        watermark = reader().query(func.max(column)).scalar()
+    else:
+        # One statement, so both maxima come from the same snapshot
+        watermark = max(filter(lambda value: value is not None, reader().execute(
+            select(func.max(column), select(func.max(tombstones.ChangeSeq)).scalar_subquery())).one()), default=None)
+    statement = select(*[getattr(model, key) for key in spec])
+    if since is not None:
+        if watermark is None or watermark <= since:
+            return statement.where(false()), since
+        if tombstones is None:
+            return statement.where(column > since, column <= watermark).order_by(column, primary_key), watermark
+        changed = statement.add_columns(column.label('change_seq'), false().label('deleted')).where(column > since, column <= watermark)
+        deleted = select(*[getattr(tombstones, key).label(key) if key == primary_key.key else null().label(key) for key in spec],
+                         tombstones.ChangeSeq.label('change_seq'), true().label('deleted')) \
+            .where(tombstones.ChangeSeq > since, tombstones.ChangeSeq <= watermark)
+        return union_all(changed, deleted).order_by('change_seq'), watermark
+    if watermark is None:
+        return statement.order_by(primary_key), None
+    if column is primary_key:
+        return statement.where(column <= watermark).order_by(primary_key), watermark
+    # Rows from before the column existed have no watermark value; a full export includes them
+    return statement.where(or_(column <= watermark, column.is_(None))).order_by(primary_key), watermark
+
+# Route for streaming a table as NDJSON or CSV, gzip-compressed when the client accepts it
+@app.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    if table not in EXPORTS:
+        return jsonify({'error': f"Unknown table {table}; export one of {', '.join(EXPORTS)}"}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    model, column, spec, tombstones = EXPORTS[table]
+    try:
+        since = request.args.get('since')
+        since = None if since is None else decode_watermark(since, column)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    statement, watermark = export_statement(model, column, spec, since, tombstones)
+
+    # yield_per fetches from the open cursor in batches, so memory does not grow with the table
+    batches = reader().execute(statement.execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])).partitions()
+    serializer, columns = export_serializers[table], list(spec)
+    if since is not None and tombstones is not None:
+        serializer = TombstoneSerializer(serializer, inspect(model).primary_key[0].key)
+        columns.append('deleted')
+    if export_format == 'csv':
+        chunks = csv_chunks(batches, columns)
+    else:
+        chunks = ndjson_chunks(batches, serializer)
+    headers = {'Content-Disposition': f'attachment; filename={table}.{export_format}', 'Vary': 'Accept-Encoding'}
+    if watermark is not None:
+        headers['X-Export-Watermark'] = encode_watermark(watermark)
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format], headers=headers)
+
 # Adding resources to API
-api.add_resource(DatasetAPI, '/datasets/', '/datasets/<int:dataset_id>')
+api.add_resource(DatasetListAPI, '/datasets/')
+api.add_resource(DatasetAPI, '/datasets/<int:dataset_id>')
+api.add_resource(DatasetBulkAPI, '/datasets/bulk')
+api.add_resource(DatasetSearchAPI, '/datasets/search')
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade_schema()
     app.run(debug=True)
 
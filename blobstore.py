@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+Blob = namedtuple('Blob', 'name digest size path')
+
+
+class BlobStore:
+    """Content-addressed file store with a filename index.
+
+    Each distinct content is stored once, under root/blobs/<2 hex>/<2 hex>/<sha256>,
+    so identical uploads share a file and no directory grows past a few entries.
+    Files are written to root/tmp and renamed into place, so a blob path only
+    ever holds complete content. root/index.db records which names were stored
+    with which content: the same name stored twice keeps both blobs and
+    resolves to the most recent, while get(digest) always finds the one content.
+    """
+
+    def __init__(self, root, chunk_size=1 << 16):
+        self.root = root
+        self.chunk_size = chunk_size
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(root, 'index.db'), timeout=30, check_same_thread=False)
+        with self._lock, self._index:
+            self._index.execute('PRAGMA journal_mode=WAL')
+            self._index.execute('CREATE TABLE IF NOT EXISTS files (name TEXT NOT NULL, digest TEXT NOT NULL, size INTEGER NOT NULL, '
+                                'stored REAL NOT NULL, PRIMARY KEY (name, digest))')
+            self._index.execute('CREATE INDEX IF NOT EXISTS ix_files_name_stored ON files (name, stored)')
+            self._index.execute('CREATE INDEX IF NOT EXISTS ix_files_digest_stored ON files (digest, stored)')
+
+    def path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest[2:4], digest)
+
+    def put_stream(self, name, stream):
+        """Copy a binary file object into the store chunk by chunk, hashing as it is written."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            return self._add(name, digest.hexdigest(), size, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def put_bytes(self, name, data, digest=None):
+        """Store data that is already in memory; pass its sha256 hex digest if the caller has it."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if os.path.exists(self.path(digest)):
+            return self._record(name, digest, len(data))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                temp.write(data)
+            return self._add(name, digest, len(data), temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def lookup(self, name):
+        """The Blob most recently stored under name, or None."""
+        with self._lock:
+            row = self._index.execute('SELECT digest, size FROM files WHERE name = ? ORDER BY stored DESC LIMIT 1', (name,)).fetchone()
+        return None if row is None else Blob(name, row[0], row[1], self.path(row[0]))
+
+    def get(self, digest):
+        """The Blob with this sha256 hex digest, under the name it was most recently stored as, or None."""
+        with self._lock:
+            row = self._index.execute('SELECT name, size FROM files WHERE digest = ? ORDER BY stored DESC LIMIT 1', (digest,)).fetchone()
+        return None if row is None else Blob(row[0], digest, row[1], self.path(digest))
+
+    def names(self):
+        with self._lock:
+            return [row[0] for row in self._index.execute('SELECT DISTINCT name FROM files ORDER BY name')]
+
+    def _add(self, name, digest, size, temp_path):
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic; a concurrent upload of the same content replaces the blob with identical bytes
+            os.replace(temp_path, path)
+        return self._record(name, digest, size)
+
+    def _record(self, name, digest, size):
+        with self._lock, self._index:
+            self._index.execute('INSERT INTO files (name, digest, size, stored) VALUES (?, ?, ?, ?) '
+                                'ON CONFLICT (name, digest) DO UPDATE SET stored = excluded.stored', (name, digest, size, time.time()))
+        return Blob(name, digest, size, self.path(digest))
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class TombstoneSerializer:
+    """A delta's changed rows as serializer writes them, and its deleted ones as {key: id, "deleted": true}."""
+
+    def __init__(self, serializer, key):
+        self.serializer = serializer
+        self.key = key
+
+    def dumps(self, row):
+        if row.deleted:
+            return json.dumps({self.key: getattr(row, self.key), 'deleted': True})
+        return self.serializer.dumps(row)
+
+
+def ndjson_chunks(batches, serializer):
+    """Render each batch of rows as one chunk of NDJSON text."""
+    for rows in batches:
+        yield ''.join([serializer.dumps(row) + '\n' for row in rows])
+
+
+def csv_chunks(batches, columns):
+    """A header line, then each batch of rows as one chunk of CSV text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_value(getattr(row, column)) for column in columns] for row in rows)
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress text chunks into a single gzip stream.
+
+    The compressor is sync-flushed after every chunk, so each batch reaches the
+    client as soon as it is rendered instead of waiting for deflate's window to fill.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -3,6 +3,7 @@ from flask_restful import Resource, Api, fields, marshal_with, reqparse
 from flask_sqlalchemy import SQLAlchemy
 import os
 from datetime import datetime
+from blobstore import BlobStore
 
 app = Flask(__name__)
 api = Api(app)
@@ -15,6 +16,8 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+# Uploads are stored by content hash, so two clients sending the same filename do not overwrite each other
+upload_store = BlobStore(UPLOAD_FOLDER)
 
 class Dataset(db.Model):
     __tablename__ = 'datasets_table'
@@ -47,8 +50,7 @@ def upload_image():
         return jsonify({'error': 'No selected image'}), 400
     if file:
         filename = file.filename
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(save_path)
+        upload_store.put_stream(filename, file.stream)
         return jsonify({'message': f'Image {filename} uploaded successfully'}), 200
 
 class DatasetAPI(Resource):
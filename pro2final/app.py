@@ -1,55 +1,364 @@
-from flask import Flask, jsonify, request
-from flask_restful import Resource, Api, fields, marshal_with, reqparse
+import time
+startup_began = time.perf_counter()
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+from flask_restful import Resource, Api, fields, marshal, marshal_with, reqparse
+from flask_restful.representations.json import output_json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import (DDL, FetchedValue, column, create_engine, delete, event, false, func, insert, inspect, null, or_, select, table,
+                        true, tuple_, union_all, update)
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.orm import scoped_session, sessionmaker
 from werkzeug.utils import secure_filename
 import torch
-from torchvision import models, transforms
+import atexit
+import base64
+import hashlib
+import mimetypes
+import operator
 import os
-from datetime import datetime
-from PIL import Image
+import random
+import re
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 import json
-import urllib.request
+from backends import build_backend, load_network, set_threads
+from blobstore import BlobStore
+from cache import InferenceCache, LRUCache, content_key
+from cascade import Cascade, classify_batch
+from export import TombstoneSerializer, csv_chunks, gzip_chunks, ndjson_chunks
+from ingest import chunked, iter_upload_items
+from jobs import JobQueue, QueueFull
+from pipeline import Pipeline
+from pool import InferencePool
+from preprocess import CROP_SIZE, decode_image, load_imagenet_classes, transform
+from serializer import Serializer
+from writer import GroupCommitWriter
+
+startup_times = {'imports_s': round(time.perf_counter() - startup_began, 3)}
 
 app = Flask(__name__)
 api = Api(app)
-model = models.resnet50(pretrained=True)
-model.eval()
 
+# Model configuration: weights load on first use, or in the background when MODEL_WARMUP=1.
+# MODEL_WEIGHTS=none builds an untrained network, which needs no weight file.
+app.config['MODEL_WEIGHTS'] = os.environ.get('MODEL_WEIGHTS', 'IMAGENET1K_V1')
+app.config['MODEL_WARMUP'] = os.environ.get('MODEL_WARMUP', '0') == '1'
+# Inference backend (see backends.BACKENDS) and torch intra-op threads (0 keeps torch's default)
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'eager')
+app.config['INTRA_OP_THREADS'] = int(os.environ.get('INTRA_OP_THREADS', 0))
+# Cascade: when CASCADE_THRESHOLD is set, CASCADE_MODEL answers first and only images
+# whose top-1 probability is below the threshold are passed on to ResNet-50
+app.config['CASCADE_THRESHOLD'] = float(os.environ['CASCADE_THRESHOLD']) if os.environ.get('CASCADE_THRESHOLD') else None
+app.config['CASCADE_MODEL'] = os.environ.get('CASCADE_MODEL', 'mobilenet_v3_large')
+
+model = None
+model_lock = threading.Lock()
+model_state = {'status': 'not_loaded', 'error': None}
+
+def load_classifier():
+    started = time.perf_counter()
+    net = load_network(app.config['MODEL_WEIGHTS'])
+    if app.config['CASCADE_THRESHOLD'] is not None:
+        small = load_network(app.config['MODEL_WEIGHTS'], arch=app.config['CASCADE_MODEL'])
+        net = Cascade(small, net, app.config['CASCADE_THRESHOLD'], small_stage=app.config['CASCADE_MODEL'])
+    startup_times['weight_load_s'] = round(time.perf_counter() - started, 3)
+    return net
 
-transform = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
+def load_model():
+    set_threads(app.config['INTRA_OP_THREADS'])
+    net = load_classifier()
+    started = time.perf_counter()
+    if isinstance(net, Cascade):
+        net = net.with_backend(app.config['INFERENCE_BACKEND'])
+    else:
+        net = build_backend(net, app.config['INFERENCE_BACKEND'])
+    startup_times['backend_build_s'] = round(time.perf_counter() - started, 3)
+    started = time.perf_counter()
+    classify_batch(net, torch.zeros(1, 3, CROP_SIZE, CROP_SIZE))
+    startup_times['warmup_inference_s'] = round(time.perf_counter() - started, 3)
+    return net
 
-def load_imagenet_classes():
-    class_idx_url = "https://storage.googleapis.com/download.tensorflow.org/data/imagenet_class_index.json"
-    with urllib.request.urlopen(class_idx_url) as url:
-        class_idx = json.loads(url.read().decode())
-        class_labels = {int(key): value[1] for key, value in class_idx.items()}
-    return class_labels
+def get_model():
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                model_state.update(status='loading', error=None)
+                try:
+                    loaded = load_model()
+                except Exception as e:
+                    model_state.update(status='failed', error=str(e))
+                    raise
+                model = loaded
+                model_state['status'] = 'ready'
+                print("model is loaded:", startup_times)
+    return model
+
+def warm_up():
+    try:
+        get_pool() if use_pool() else get_model()
+    except Exception as e:
+        print("model warm-up failed:", e)
+
+def start_warmup():
+    thread = threading.Thread(target=warm_up, name='model-warmup', daemon=True)
+    thread.start()
+    return thread
 
 imagenet_classes = load_imagenet_classes()
 
-def classify_image(image_path):
-    image = Image.open(image_path).convert('RGB')
-    image = transform(image)
-    image = image.unsqueeze(0)
-    with torch.no_grad():
-        output = model(image)
-    prediction = output.argmax(dim=1).item()
+# Micro-batching configuration: concurrent requests share one forward pass
+app.config['BATCH_MAX_SIZE'] = int(os.environ.get('BATCH_MAX_SIZE', 8))
+app.config['BATCH_MAX_WAIT_MS'] = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+def predict_batch(images):
+    """Classify preprocessed tensors; returns (class index, stage) per image."""
+    return classify_batch(get_model(), torch.stack(images))
+
+# Pipeline configuration: DECODE_WORKERS threads decode and preprocess into a buffer of
+# PIPELINE_BUFFER tensors that INFERENCE_WORKERS threads drain in micro-batches
+app.config['DECODE_WORKERS'] = int(os.environ.get('DECODE_WORKERS', 2))
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', 1))
+app.config['PIPELINE_BUFFER'] = int(os.environ.get('PIPELINE_BUFFER', 32))
+
+def preprocess_bytes(data):
+    return transform(decode_image(data))
+
+pipeline = None
+lazy_init_lock = threading.Lock()
+
+def get_pipeline():
+    global pipeline
+    with lazy_init_lock:
+        if pipeline is None:
+            pipeline = Pipeline(preprocess_bytes, predict_batch,
+                                decode_workers=app.config['DECODE_WORKERS'],
+                                inference_workers=app.config['INFERENCE_WORKERS'],
+                                buffer_size=app.config['PIPELINE_BUFFER'],
+                                max_batch_size=app.config['BATCH_MAX_SIZE'],
+                                max_wait_ms=app.config['BATCH_MAX_WAIT_MS'])
+    return pipeline
+
+# Inference mode: 'thread' runs the model in this process behind the pipeline,
+# 'pool' sends raw bytes to POOL_WORKERS processes that share one copy of the weights.
+# POOL_THREADS_PER_WORKER=0 splits the available cores evenly between workers.
+app.config['INFERENCE_MODE'] = os.environ.get('INFERENCE_MODE', 'thread')
+app.config['POOL_WORKERS'] = int(os.environ.get('POOL_WORKERS', 2))
+app.config['POOL_THREADS_PER_WORKER'] = int(os.environ.get('POOL_THREADS_PER_WORKER', 0))
+app.config['INFERENCE_TIMEOUT_S'] = float(os.environ.get('INFERENCE_TIMEOUT_S', 60))
+
+pool = None
+
+def get_pool():
+    global pool
+    with lazy_init_lock:
+        if pool is None:
+            workers = app.config['POOL_WORKERS']
+            threads = app.config['POOL_THREADS_PER_WORKER'] or max(1, (os.cpu_count() or 1) // workers)
+            net = load_classifier()
+            pool = InferencePool(net, workers=workers, threads_per_worker=threads,
+                                 backend=app.config['INFERENCE_BACKEND'],
+                                 max_batch_size=app.config['BATCH_MAX_SIZE'])
+            atexit.register(pool.close)
+            model_state['status'] = 'ready'
+    return pool
+
+def use_pool():
+    return app.config['INFERENCE_MODE'] == 'pool'
+
+def submit_image(data):
+    return get_pool().submit(data) if use_pool() else get_pipeline().submit(data)
+
+def predict_one(data):
+    return submit_image(data).result(timeout=app.config['INFERENCE_TIMEOUT_S'])
+
+def predict_many(datas):
+    """Classify a list of raw images; each result is (class index, stage) or the exception it raised."""
+    futures = [submit_image(data) for data in datas]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=app.config['INFERENCE_TIMEOUT_S']))
+        except Exception as e:
+            results.append(e)
+    return results
+
+# Inference cache: results keyed by image content and model version
+def model_version():
+    # Backends other than eager and the cascade can change predictions, so they get their own cache entries
+    version = f"resnet50-{app.config['MODEL_WEIGHTS'].lower()}-{app.config['INFERENCE_BACKEND']}"
+    if app.config['CASCADE_THRESHOLD'] is not None:
+        version += f"-cascade-{app.config['CASCADE_MODEL']}-{app.config['CASCADE_THRESHOLD']}"
+    return version
+app.config['INFERENCE_CACHE_SIZE'] = int(os.environ.get('INFERENCE_CACHE_SIZE', 10000))
+
+def load_cached_inference(key):
+    row = reader().query(Inference.Result).filter_by(InputData=key).first()
+    return row[0] if row else None
+
+inference_cache = None
+
+def get_inference_cache():
+    global inference_cache
+    with lazy_init_lock:
+        if inference_cache is None:
+            inference_cache = InferenceCache(app.config['INFERENCE_CACHE_SIZE'], load=load_cached_inference)
+    return inference_cache
+
+def remember_inference(key, predicted_class, model_id):
+    # Added to the caller's session so it commits with the upload's own rows
+    db.session.add(Inference(ModelID=model_id, InputData=key, Result=predicted_class, InferenceDate=datetime.utcnow()))
+
+def get_model_id():
+    """ModelID of the models_table row for the running model version, added on first use."""
+    version = model_version()
+    model_id = db.session.query(MLModel.ModelID).filter_by(Name=version).scalar()
+    if model_id is not None:
+        return model_id
+    architecture = 'resnet50' if app.config['CASCADE_THRESHOLD'] is None else f"{app.config['CASCADE_MODEL']}+resnet50"
+
+    def stage():
+        row = MLModel(Name=version, Architecture=architecture, CreationDate=datetime.today().date())
+        db.session.add(row)
+        return row
+    try:
+        return commit_with_retry(stage).ModelID
+    except IntegrityError:
+        # Another worker registered this version first
+        db.session.rollback()
+        return db.session.query(MLModel.ModelID).filter_by(Name=version).scalar()
+
+# Which stage answered each request: a cascade stage, resnet50, or the cache
+stage_counts = {}
+stage_lock = threading.Lock()
+
+def record_stage(stage):
+    with stage_lock:
+        stage_counts[stage] = stage_counts.get(stage, 0) + 1
+
+def classify_bytes(data):
+    """Return (predicted class, stage that produced it, cache key).
+
+    A fresh answer goes into the in-memory cache; the caller stores it with
+    remember_inference() in the same transaction as its own rows.
+    """
+    key = content_key(data, model_version())
+    predicted_class = get_inference_cache().get(key)
+    if predicted_class is not None:
+        record_stage('cache')
+        return predicted_class, 'cache', key
+    prediction, stage = predict_one(data)
     predicted_class = imagenet_classes[prediction]
-    return predicted_class
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'EC530pro2.db')
+    get_inference_cache().put(key, predicted_class)
+    record_stage(stage)
+    return predicted_class, stage, key
+
+def classify_image(image_path):
+    with open(image_path, 'rb') as f:
+        return classify_bytes(f.read())[0]
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'EC530pro2.db'))
 db = SQLAlchemy(app)
 
+# Storage configuration: STORAGE_MODE=wal switches the SQLite file to WAL journaling so readers and
+# the writer stop blocking each other, and serves GET traffic from a pool of read-only connections.
+# In every mode a commit that hits a locked database is retried COMMIT_RETRIES times with backoff.
+app.config['STORAGE_MODE'] = os.environ.get('STORAGE_MODE', 'default')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_KB'] = int(os.environ.get('SQLITE_CACHE_KB', 64000))
+app.config['READ_POOL_SIZE'] = int(os.environ.get('READ_POOL_SIZE', 8))
+app.config['COMMIT_RETRIES'] = int(os.environ.get('COMMIT_RETRIES', 5))
+app.config['COMMIT_RETRY_BACKOFF_MS'] = int(os.environ.get('COMMIT_RETRY_BACKOFF_MS', 20))
+
+read_session = None
+
+def set_wal_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # NORMAL only syncs at checkpoints in WAL mode; a power loss can drop the last commits, never corrupt
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_KB']}")
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+def set_read_pragmas(dbapi_connection, connection_record):
+    set_wal_pragmas(dbapi_connection, connection_record)
+    dbapi_connection.execute('PRAGMA query_only=ON')
+
+def configure_storage():
+    global read_session
+    with app.app_context():
+        engine = db.engine
+    if app.config['STORAGE_MODE'] != 'wal':
+        return
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        print('STORAGE_MODE=wal needs an SQLite database file, keeping the default storage mode')
+        return
+    event.listen(engine, 'connect', set_wal_pragmas)
+    read_engine = create_engine(engine.url, pool_size=app.config['READ_POOL_SIZE'], max_overflow=0)
+    event.listen(read_engine, 'connect', set_read_pragmas)
+    read_session = scoped_session(sessionmaker(bind=read_engine))
+
+def reader():
+    """Session for read-only work: the read pool in WAL mode, otherwise db.session."""
+    return read_session if read_session is not None else db.session
+
+@app.teardown_appcontext
+def remove_read_session(exception=None):
+    if read_session is not None:
+        read_session.remove()
+
+def commit_with_retry(stage):
+    """Run stage(), which adds changes to db.session, commit them and return stage()'s result.
+
+    When SQLite reports the database locked, the session is rolled back (which
+    discards the staged changes) and stage() runs again after a backoff.
+    """
+    for attempt in range(app.config['COMMIT_RETRIES'] + 1):
+        try:
+            result = stage()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if 'database is locked' not in str(e) or attempt == app.config['COMMIT_RETRIES']:
+                raise
+            time.sleep(app.config['COMMIT_RETRY_BACKOFF_MS'] / 1000.0 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+configure_storage()
+
 # Upload folder configuration
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Uploads are stored by content hash (blobstore.py), so two clients sending the same filename
+# no longer overwrite each other; they are written by a background pool, off the request's latency path
+upload_store = BlobStore(UPLOAD_FOLDER)
+app.config['SAVE_WORKERS'] = int(os.environ.get('SAVE_WORKERS', 2))
+save_executor = None
+
+def save_upload(filename, data, digest=None):
+    """Store an upload in the background; the Future resolves to its Blob."""
+    global save_executor
+    with lazy_init_lock:
+        if save_executor is None:
+            save_executor = ThreadPoolExecutor(max_workers=app.config['SAVE_WORKERS'], thread_name_prefix='upload-save')
+    return save_executor.submit(upload_store.put_bytes, filename, data, digest)
+
+def store_upload(filename, data):
+    """Start saving an upload; returns its sha256 hex digest and the save's Future.
+
+    The content is stored under upload_store.path(digest); callers wait for the
+    Future before committing a row that points there.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    return digest, save_upload(filename, data, digest)
+
 # Database model
 class Dataset(db.Model):
     __tablename__ = 'datasets_table'
@@ -58,6 +367,117 @@ class Dataset(db.Model):
     Description = db.Column(db.Text)
     Type = db.Column(db.String(100))
     CreationDate = db.Column(db.Date)
+    UpdatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set by the CHANGE_SEQ_DDL triggers on every insert and update, in commit order
+    ChangeSeq = db.Column(db.Integer, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # Listing indexes: each ends in DatasetID, the keyset tie-breaker, so a filtered
+    # and sorted page is a single index range scan
+    __table_args__ = (
+        db.Index('ix_datasets_type_id', 'Type', 'DatasetID'),
+        db.Index('ix_datasets_type_created', 'Type', 'CreationDate', 'DatasetID'),
+        db.Index('ix_datasets_type_name', 'Type', 'Name', 'DatasetID'),
+        db.Index('ix_datasets_created', 'CreationDate', 'DatasetID'),
+        db.Index('ix_datasets_name', 'Name', 'DatasetID'),
+        db.Index('ix_datasets_updated', 'UpdatedAt', 'DatasetID'),
+        db.Index('ix_datasets_change_seq', 'ChangeSeq', 'DatasetID'),
+    )
+
+class DatasetTombstone(db.Model):
+    # A deleted dataset, numbered on the ChangeSeq sequence by the CHANGE_SEQ_DDL delete trigger
+    __tablename__ = 'datasets_tombstones'
+    ChangeSeq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    DatasetID = db.Column(db.Integer, nullable=False)
+
+class Image(db.Model):
+    __tablename__ = 'images_table'
+    ImageID = db.Column(db.Integer, primary_key=True)
+    DatasetID = db.Column(db.Integer, db.ForeignKey('datasets_table.DatasetID'))
+    FilePath = db.Column(db.Text)
+    Label = db.Column(db.String(255))
+    Split = db.Column(db.String(50))
+    # One index per filter combination of GET /datasets/<id>/images, each ending in the ImageID page key
+    __table_args__ = (
+        db.Index('ix_images_dataset', 'DatasetID', 'ImageID'),
+        db.Index('ix_images_dataset_label', 'DatasetID', 'Label', 'ImageID'),
+        db.Index('ix_images_dataset_split', 'DatasetID', 'Split', 'ImageID'),
+        db.Index('ix_images_dataset_label_split', 'DatasetID', 'Label', 'Split', 'ImageID'),
+    )
+
+class Annotation(db.Model):
+    __tablename__ = 'annotations_table'
+    AnnotationID = db.Column(db.Integer, primary_key=True)
+    ImageID = db.Column(db.Integer, db.ForeignKey('images_table.ImageID'), index=True)
+    ObjectClass = db.Column(db.String(100))
+    BoundingBox = db.Column(db.String(100))
+    __table_args__ = (db.Index('ix_annotations_class', 'ObjectClass', 'ImageID'),)
+
+class MLModel(db.Model):
+    __tablename__ = 'models_table'
+    ModelID = db.Column(db.Integer, primary_key=True)
+    Name = db.Column(db.String(255), unique=True)
+    Architecture = db.Column(db.String(100))
+    CreationDate = db.Column(db.Date)
+    TrainingDatasetID = db.Column(db.Integer, db.ForeignKey('datasets_table.DatasetID'), index=True)
+
+class TrainingSession(db.Model):
+    __tablename__ = 'training_sessions_table'
+    SessionID = db.Column(db.Integer, primary_key=True)
+    ModelID = db.Column(db.Integer, db.ForeignKey('models_table.ModelID'))
+    StartDate = db.Column(db.DateTime)
+    EndDate = db.Column(db.DateTime)
+    Status = db.Column(db.String(50))
+    Accuracy = db.Column(db.Float)
+    Loss = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_training_sessions_model', 'ModelID', 'StartDate'),)
+
+class Inference(db.Model):
+    __tablename__ = 'inferences_table'
+    InferenceID = db.Column(db.Integer, primary_key=True)
+    ModelID = db.Column(db.Integer, db.ForeignKey('models_table.ModelID'), index=True)
+    InputData = db.Column(db.Text, index=True)
+    Result = db.Column(db.Text)
+    InferenceDate = db.Column(db.DateTime)
+
+# Full-text index over Name and Description. datasets_fts is an external-content FTS5 table:
+# it stores only the index and reads the text back from datasets_table, and the triggers
+# keep it in step with every insert, update and delete, including the bulk statements
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS datasets_fts USING fts5(Name, Description, content='datasets_table', "
+    "content_rowid='DatasetID', tokenize='porter unicode61 remove_diacritics 2')",
+    # Rank name matches above description matches
+    "INSERT INTO datasets_fts(datasets_fts, rank) VALUES('rank', 'bm25(4.0, 1.0)')",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_insert AFTER INSERT ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description); END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_delete AFTER DELETE ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description); END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_update AFTER UPDATE OF Name, Description ON datasets_table BEGIN "
+    "INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description); "
+    "INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description); END",
+]
+# Change sequence for incremental exports. datasets_change_seq holds the last number handed out;
+# the triggers bump it and stamp the written row while the writing transaction holds SQLite's
+# single write lock, so a row that commits later always gets a higher number, however early its
+# UpdatedAt was stamped. A counter rather than MAX(ChangeSeq), which deleting the newest row would lower
+CHANGE_SEQ_BUMP = ("UPDATE datasets_change_seq SET value = value + 1; "
+                   "UPDATE datasets_table SET ChangeSeq = (SELECT value FROM datasets_change_seq) WHERE DatasetID = new.DatasetID; END")
+CHANGE_SEQ_DDL = [
+    "CREATE TABLE IF NOT EXISTS datasets_change_seq (value INTEGER NOT NULL)",
+    "INSERT INTO datasets_change_seq (value) SELECT IFNULL(MAX(ChangeSeq), 0) FROM datasets_table "
+    "WHERE NOT EXISTS (SELECT 1 FROM datasets_change_seq)",
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_insert AFTER INSERT ON datasets_table BEGIN " + CHANGE_SEQ_BUMP,
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_update AFTER UPDATE OF Name, Description, Type, CreationDate, UpdatedAt "
+    "ON datasets_table BEGIN " + CHANGE_SEQ_BUMP,
+    # A delete leaves a tombstone, so incremental exports can pass it on
+    "CREATE TRIGGER IF NOT EXISTS datasets_change_seq_delete AFTER DELETE ON datasets_table BEGIN "
+    "UPDATE datasets_change_seq SET value = value + 1; "
+    "INSERT INTO datasets_tombstones (ChangeSeq, DatasetID) SELECT value, old.DatasetID FROM datasets_change_seq; END",
+]
+for statement in SEARCH_DDL + CHANGE_SEQ_DDL:
+    event.listen(Dataset.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Dataset.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS datasets_fts').execute_if(dialect='sqlite'))
+event.listen(Dataset.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS datasets_change_seq').execute_if(dialect='sqlite'))
+
+datasets_fts = table('datasets_fts', column('rowid', db.Integer), column('rank', db.Float), column('datasets_fts'))
 
 # Fields for serialization
 dataset_fields = {
@@ -68,6 +488,13 @@ dataset_fields = {
     'CreationDate': fields.String
 }
 
+# Compiled once; writes the same bytes as marshal_with(dataset_fields) without the per-field walk
+dataset_serializer = Serializer(dataset_fields)
+
+def uses_compiled_serializer():
+    # flask_restful indents in debug mode and applies RESTFUL_JSON; the compiled path writes its default output
+    return not app.debug and not app.config.get('RESTFUL_JSON')
+
 # Argument parsing
 parser = reqparse.RequestParser()
 parser.add_argument('Name', required=True, help="Name cannot be blank")
@@ -75,6 +502,332 @@ parser.add_argument('Description')
 parser.add_argument('Type', required=True, help="Type cannot be blank")
 parser.add_argument('CreationDate', type=lambda x: datetime.strptime(x, '%Y-%m-%d'), help="Date must be in YYYY-MM-DD format")
 
+# Listing configuration: GET /datasets/ pages with a keyset cursor rather than OFFSET,
+# so every page costs the same however deep into the table it is
+app.config['LIST_DEFAULT_LIMIT'] = int(os.environ.get('LIST_DEFAULT_LIMIT', 50))
+app.config['LIST_MAX_LIMIT'] = int(os.environ.get('LIST_MAX_LIMIT', 500))
+
+SORT_COLUMNS = {'DatasetID': Dataset.DatasetID, 'Name': Dataset.Name, 'CreationDate': Dataset.CreationDate}
+# Range filters and the column each one bounds. A range and an order on different columns cannot share
+# one index, so SQLite would sort every match in a temp B-tree; those combinations are rejected
+RANGE_FILTERS = {'name_prefix': 'Name', 'created_from': 'CreationDate', 'created_to': 'CreationDate'}
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('type', location='args')
+list_parser.add_argument('created_from', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args', help="Date must be in YYYY-MM-DD format")
+list_parser.add_argument('created_to', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args', help="Date must be in YYYY-MM-DD format")
+list_parser.add_argument('name_prefix', location='args')
+list_parser.add_argument('sort', default='DatasetID', location='args')
+list_parser.add_argument('limit', type=int, location='args')
+list_parser.add_argument('cursor', location='args')
+
+def page_limit(requested):
+    return min(max(requested or app.config['LIST_DEFAULT_LIMIT'], 1), app.config['LIST_MAX_LIMIT'])
+
+def encode_cursor(segment, value, dataset_id):
+    if isinstance(value, date):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([segment, value, dataset_id]).encode()).decode()
+
+def decode_cursor(cursor, column):
+    try:
+        segment, value, dataset_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if column is Dataset.CreationDate and value is not None:
+            value = date.fromisoformat(value)
+        return segment, value, int(dataset_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def dataset_filters(args):
+    filters = []
+    if args['type'] is not None:
+        filters.append(Dataset.Type == args['type'])
+    if args['created_from'] is not None:
+        filters.append(Dataset.CreationDate >= args['created_from'])
+    if args['created_to'] is not None:
+        filters.append(Dataset.CreationDate <= args['created_to'])
+    if args['name_prefix']:
+        # A range instead of LIKE so the Name index can be used (the match is case-sensitive)
+        prefix = args['name_prefix']
+        filters.append(Dataset.Name >= prefix)
+        filters.append(Dataset.Name < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return filters
+
+def list_datasets(args):
+    """Return one page of datasets and the cursor of the next page (None on the last one).
+
+    Rows are ordered by the sort column, then DatasetID. Each page continues
+    from the last row of the previous one with a (column, DatasetID) range, and
+    rows whose sort column is NULL are paged as a segment of their own, first
+    ascending and last descending, the way SQLite orders NULLs.
+    """
+    sort = args['sort']
+    descending = sort.startswith('-')
+    column = SORT_COLUMNS.get(sort.lstrip('-'))
+    if column is None:
+        raise ValueError(f"Cannot sort by {sort.lstrip('-')}; use one of {', '.join(SORT_COLUMNS)}")
+    ranged = [name for name in RANGE_FILTERS if args[name]]
+    ranged_columns = sorted({RANGE_FILTERS[name] for name in ranged})
+    if ranged and column.key not in ranged_columns:
+        raise ValueError(f"Filtering by {', '.join(ranged)} needs sort={' or sort='.join(ranged_columns)} (or its - form)")
+    limit = page_limit(args['limit'])
+    after = operator.lt if descending else operator.gt
+    direction = (lambda c: c.desc()) if descending else (lambda c: c.asc())
+
+    if column is Dataset.DatasetID or column.key in ranged_columns:
+        # A range filter on the sort column already excludes its NULLs
+        segments = ['value']
+    else:
+        segments = ['value', 'null'] if descending else ['null', 'value']
+    cursor_segment = None
+    if args['cursor']:
+        cursor_segment, last_value, last_id = decode_cursor(args['cursor'], column)
+        if cursor_segment not in segments:
+            raise ValueError('Invalid cursor')
+        segments = segments[segments.index(cursor_segment):]
+
+    query = reader().query(Dataset).filter(*dataset_filters(args))
+    rows = []
+    for segment in segments:
+        page = query
+        if column is Dataset.DatasetID:
+            if segment == cursor_segment:
+                page = page.filter(after(Dataset.DatasetID, last_id))
+            page = page.order_by(direction(Dataset.DatasetID))
+        elif segment == 'null':
+            page = page.filter(column.is_(None))
+            if segment == cursor_segment:
+                page = page.filter(after(Dataset.DatasetID, last_id))
+            page = page.order_by(direction(Dataset.DatasetID))
+        else:
+            page = page.filter(column.isnot(None))
+            if segment == cursor_segment:
+                page = page.filter(after(tuple_(column, Dataset.DatasetID), tuple_(last_value, last_id)))
+            page = page.order_by(direction(column), direction(Dataset.DatasetID))
+        rows.extend(page.limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last_value = getattr(rows[-1], column.key)
+    return rows, encode_cursor('null' if last_value is None else 'value', last_value, rows[-1].DatasetID)
+
+search_parser = reqparse.RequestParser()
+search_parser.add_argument('q', required=True, location='args', help="q cannot be blank")
+search_parser.add_argument('limit', type=int, location='args')
+search_parser.add_argument('cursor', location='args')
+
+def match_expression(text):
+    # Each word becomes a quoted FTS5 string, so punctuation and operators in user input are literal
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+def search_datasets(args):
+    """Return one page of datasets matching every word of q, best bm25 rank first, and the next cursor.
+
+    Pages continue after the (rank, DatasetID) of the previous page's last row.
+    """
+    expression = match_expression(args['q'])
+    if not expression:
+        raise ValueError('q must contain at least one word')
+    limit = page_limit(args['limit'])
+    query = (select(Dataset, datasets_fts.c.rank)
+             .join(datasets_fts, datasets_fts.c.rowid == Dataset.DatasetID)
+             .where(datasets_fts.c.datasets_fts.op('MATCH')(expression)))
+    if args['cursor']:
+        segment, last_rank, last_id = decode_cursor(args['cursor'], None)
+        if segment != 'rank':
+            raise ValueError('Invalid cursor')
+        query = query.where(tuple_(datasets_fts.c.rank, datasets_fts.c.rowid) > tuple_(last_rank, last_id))
+    rows = reader().execute(query.order_by(datasets_fts.c.rank, datasets_fts.c.rowid).limit(limit + 1)).all()
+    datasets = [dataset for dataset, _ in rows[:limit]]
+    if len(rows) <= limit:
+        return datasets, None
+    last_dataset, last_rank = rows[limit - 1]
+    return datasets, encode_cursor('rank', last_rank, last_dataset.DatasetID)
+
+image_fields = {
+    'ImageID': fields.Integer,
+    'DatasetID': fields.Integer,
+    'FilePath': fields.String,
+    'Label': fields.String,
+    'Split': fields.String
+}
+image_serializer = Serializer(image_fields)
+
+image_parser = reqparse.RequestParser()
+image_parser.add_argument('label', location='args')
+image_parser.add_argument('split', location='args')
+image_parser.add_argument('limit', type=int, location='args')
+image_parser.add_argument('cursor', type=int, location='args', help="cursor must be an ImageID")
+
+def list_images(dataset_id, args):
+    """Return one page of a dataset's images, filtered by label and/or split, and the next cursor."""
+    limit = page_limit(args['limit'])
+    query = reader().query(Image).filter(Image.DatasetID == dataset_id)
+    if args['label'] is not None:
+        query = query.filter(Image.Label == args['label'])
+    if args['split'] is not None:
+        query = query.filter(Image.Split == args['split'])
+    if args['cursor'] is not None:
+        query = query.filter(Image.ImageID > args['cursor'])
+    images = query.order_by(Image.ImageID).limit(limit + 1).all()
+    if len(images) <= limit:
+        return images, None
+    return images[:limit], images[limit - 1].ImageID
+
+def delete_images(dataset_ids):
+    """Stage deletes for the images of these datasets and their annotations."""
+    image_ids = select(Image.ImageID).where(Image.DatasetID.in_(dataset_ids))
+    db.session.execute(delete(Annotation).where(Annotation.ImageID.in_(image_ids)), execution_options={'synchronize_session': False})
+    db.session.execute(delete(Image).where(Image.DatasetID.in_(dataset_ids)), execution_options={'synchronize_session': False})
+
+# Read-through cache of serialized GET /datasets/<id> bodies, up to DATASET_CACHE_SIZE entries.
+# Every write to a dataset invalidates it, so an unchanged resource is answered from memory.
+app.config['DATASET_CACHE_SIZE'] = int(os.environ.get('DATASET_CACHE_SIZE', 4096))
+dataset_cache = LRUCache(app.config['DATASET_CACHE_SIZE'])
+dataset_cache_lock = threading.Lock()
+dataset_cache_generation = 0
+
+def dataset_representation(dataset):
+    """Serialize a dataset once into (body, ETag, Last-Modified), as marshal_with would render it."""
+    if uses_compiled_serializer():
+        body = (dataset_serializer.dumps(dataset) + '\n').encode()
+    else:
+        body = output_json(marshal(dataset, dataset_fields), 200).get_data()
+    return body, hashlib.sha1(body).hexdigest(), dataset.UpdatedAt
+
+def invalidate_datasets(dataset_ids):
+    global dataset_cache_generation
+    with dataset_cache_lock:
+        dataset_cache_generation += 1
+        for dataset_id in dataset_ids:
+            dataset_cache.pop(dataset_id)
+
+def upgrade_schema():
+    """db.create_all() skips tables that already exist; add any column or index they are missing."""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'sqlite' and not inspector.has_table('datasets_fts'):
+        with db.engine.begin() as connection:
+            for statement in SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+            # Index the rows written before the search table existed
+            connection.exec_driver_sql("INSERT INTO datasets_fts(datasets_fts) VALUES('rebuild')")
+    if db.engine.dialect.name == 'sqlite':
+        # Rows written before the triggers have no ChangeSeq; full exports include them
+        with db.engine.begin() as connection:
+            for statement in CHANGE_SEQ_DDL:
+                connection.exec_driver_sql(statement)
+
+# Upload metadata writes: 'direct' commits each upload's rows on its own. 'write_behind' and
+# 'durable' queue them for one writer thread that commits GROUP_COMMIT_ROWS uploads at a time,
+# or whatever arrived within GROUP_COMMIT_MS; 'write_behind' answers before the group commits,
+# 'durable' waits for it
+app.config['UPLOAD_WRITE_MODE'] = os.environ.get('UPLOAD_WRITE_MODE', 'direct')
+app.config['GROUP_COMMIT_ROWS'] = int(os.environ.get('GROUP_COMMIT_ROWS', 64))
+app.config['GROUP_COMMIT_MS'] = float(os.environ.get('GROUP_COMMIT_MS', 20))
+app.config['GROUP_COMMIT_QUEUE'] = int(os.environ.get('GROUP_COMMIT_QUEUE', 10000))
+
+def stage_upload_rows(uploads):
+    """Add the Inference, Dataset and Image rows of classified uploads to the session; returns the Images."""
+    for upload in uploads:
+        if upload['stage'] != 'cache':
+            remember_inference(upload['key'], upload['class'], upload['model_id'])
+    # The image joins the given dataset, otherwise a Dataset row of its own, as uploads always did
+    datasets = [None if upload['dataset_id'] is not None else
+                Dataset(Name=upload['filename'], Description=f"Classified image with class ID: {upload['class']}",
+                        Type='Image', CreationDate=upload['date']) for upload in uploads]
+    db.session.add_all([dataset for dataset in datasets if dataset is not None])
+    db.session.flush()
+    images = [Image(DatasetID=upload['dataset_id'] if dataset is None else dataset.DatasetID,
+                    FilePath=upload['path'], Label=upload['class'], Split=upload['split'])
+              for upload, dataset in zip(uploads, datasets)]
+    db.session.add_all(images)
+    db.session.flush()
+    return images
+
+def write_upload_group(uploads):
+    """Group commit for the upload writer: every upload's rows in one transaction, (DatasetID, ImageID) for each."""
+    with app.app_context():
+        images = commit_with_retry(lambda: stage_upload_rows(uploads))
+        return [(image.DatasetID, image.ImageID) for image in images]
+
+upload_writer = None
+
+def get_upload_writer():
+    global upload_writer
+    with lazy_init_lock:
+        if upload_writer is None:
+            upload_writer = GroupCommitWriter(write_upload_group, max_rows=app.config['GROUP_COMMIT_ROWS'],
+                                              max_wait_ms=app.config['GROUP_COMMIT_MS'], max_pending=app.config['GROUP_COMMIT_QUEUE'])
+            # Commit the uploads still queued when the process exits
+            atexit.register(upload_writer.close)
+    return upload_writer
+
+def process_upload(filename, data, dataset_id=None, split=None):
+    """Save and classify an upload, then record it as an Image labelled with the predicted class.
+
+    With UPLOAD_WRITE_MODE=write_behind the rows are only queued when this
+    returns, and the result's ImageID (and DatasetID, unless one was given) is None.
+    """
+    digest, saved = store_upload(filename, data)
+    class_id, stage, key = classify_bytes(data)
+    print("file is classified, class ID:", class_id, "stage:", stage)
+    # The file was saved while the image was classified; no row may point at a file that is not there
+    saved.result()
+    model_id = get_model_id() if stage != 'cache' else None
+    upload = {'filename': filename, 'path': upload_store.path(digest), 'class': class_id, 'stage': stage, 'key': key, 'model_id': model_id,
+              'dataset_id': dataset_id, 'split': split, 'date': datetime.today().date()}
+    mode = app.config['UPLOAD_WRITE_MODE']
+    if mode == 'direct':
+        image = commit_with_retry(lambda: stage_upload_rows([upload]))[0]
+        dataset_id, image_id = image.DatasetID, image.ImageID
+    else:
+        future = get_upload_writer().write(upload)
+        if mode == 'durable':
+            dataset_id, image_id = future.result()
+        else:
+            image_id = None
+    return {'DatasetID': dataset_id, 'ImageID': image_id, 'class': class_id, 'stage': stage, 'sha256': digest}
+
+# Async upload configuration: with UPLOAD_ASYNC=1 (or ?async=1 per request) /upload answers 202
+# and JOB_WORKERS threads classify from a queue holding at most JOB_QUEUE_SIZE waiting uploads
+app.config['UPLOAD_ASYNC'] = os.environ.get('UPLOAD_ASYNC', '0') == '1'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 64))
+app.config['JOB_MAX_WAIT_S'] = float(os.environ.get('JOB_MAX_WAIT_S', 30))
+
+def run_upload_job(payload):
+    with app.app_context():
+        return process_upload(*payload)
+
+job_queue = None
+
+def get_job_queue():
+    global job_queue
+    with lazy_init_lock:
+        if job_queue is None:
+            job_queue = JobQueue(run_upload_job, workers=app.config['JOB_WORKERS'], max_pending=app.config['JOB_QUEUE_SIZE'])
+    return job_queue
+
+def wants_async():
+    if 'async' in request.args:
+        return request.args['async'] not in ('0', 'false')
+    return app.config['UPLOAD_ASYNC']
+
 # Route for uploading images
 @app.route('/upload', methods=['POST'])
 def upload_image():
@@ -85,22 +838,240 @@ def upload_image():
         return jsonify({'error': 'No selected image'}), 400
     if file:
         filename = secure_filename(file.filename)
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(save_path)
-        class_id = classify_image(save_path)
-        print("file is classified, class ID:", class_id)
-        new_dataset = Dataset(Name=filename, Description=f'Classified image with class ID: {class_id}', Type='Image', CreationDate=datetime.today().date())
-        db.session.add(new_dataset)
-        db.session.commit()
-        return jsonify({'message': f'Image {filename} uploaded and classified successfully'}), 200
+        data = file.read()
+        dataset_id = request.values.get('DatasetID', type=int)
+        split = request.values.get('Split')
+        if dataset_id is not None and reader().get(Dataset, dataset_id) is None:
+            return jsonify({'error': 'Dataset not found'}), 404
+        if wants_async():
+            try:
+                job = get_job_queue().submit((filename, data, dataset_id, split))
+            except QueueFull as e:
+                response = jsonify({'error': 'Upload queue is full, try again later'})
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 429
+            response = jsonify({'message': f'Image {filename} queued for classification', 'job_id': job.id})
+            response.headers['Location'] = f'/jobs/{job.id}'
+            return response, 202
+        result = process_upload(filename, data, dataset_id, split)
+        return jsonify({'message': f'Image {filename} uploaded and classified successfully', 'stage': result['stage'],
+                        'DatasetID': result['DatasetID'], 'ImageID': result['ImageID'], 'sha256': result['sha256']}), 200
+
+SHA256_HEX = re.compile(r'[0-9a-f]{64}')
+
+# Route for an uploaded file: /uploads/<sha256>, as returned by /upload, is always that content;
+# any other name serves the most recent upload under it. send_file answers Range requests
+@app.route('/uploads/<path:name>', methods=['GET'])
+def uploaded_file(name):
+    blob = upload_store.get(name) if SHA256_HEX.fullmatch(name) else None
+    blob = blob or upload_store.lookup(name)
+    if blob is None:
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(os.path.abspath(blob.path), mimetype=mimetypes.guess_type(blob.name)[0] or 'application/octet-stream',
+                     conditional=True, etag=blob.digest, download_name=os.path.basename(blob.name))
+
+# Route for async upload status; ?wait=<seconds> long-polls until the job finishes
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    queue = get_job_queue()
+    wait = min(request.args.get('wait', 0, type=float), app.config['JOB_MAX_WAIT_S'])
+    job = queue.wait(job_id, wait) if wait > 0 else queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+# Route for inference counters
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    with stage_lock:
+        stages = dict(stage_counts)
+    body = {'inference_cache': get_inference_cache().stats(), 'stages': stages}
+    # Pool mode never uses the thread pipeline, so asking it for stats must not start it
+    if not use_pool():
+        pipeline_stats = get_pipeline().stats()
+        body.update(batching=pipeline_stats['inference'], pipeline=pipeline_stats)
+    if pool is not None:
+        body['pool'] = pool.stats()
+    if job_queue is not None:
+        body['jobs'] = job_queue.stats()
+    if upload_writer is not None:
+        body['upload_writer'] = upload_writer.stats()
+    return jsonify(body), 200
+
+# Route for readiness: 200 once the model is loaded, 503 before that or while a pool worker is down
+@app.route('/ready', methods=['GET'])
+def ready():
+    if use_pool():
+        stats = pool.stats() if pool is not None else None
+        loaded = stats is not None and stats['alive'] == stats['workers']
+    else:
+        loaded = model is not None
+    body = {'ready': loaded, 'mode': app.config['INFERENCE_MODE'], 'status': model_state['status'], 'backend': app.config['INFERENCE_BACKEND'], 'startup': startup_times}
+    if model_state['error']:
+        body['error'] = model_state['error']
+    return jsonify(body), 200 if loaded else 503
+
+# Bulk upload configuration: images are decoded and classified this many at a time
+app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 32))
+
+def ndjson_line(obj):
+    return json.dumps(obj) + '\n'
+
+# Route for bulk uploads: a multipart 'images' list or a tar/zip body, answered as NDJSON
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    items = iter_upload_items(request)
+    if items is None:
+        return jsonify({'error': 'Send images as a multipart list or a tar/zip archive'}), 400
+    # Images join ?DatasetID= when given, otherwise each gets a Dataset row of its own
+    dataset_id = request.args.get('DatasetID', type=int)
+    split = request.args.get('Split')
+    if dataset_id is not None and reader().get(Dataset, dataset_id) is None:
+        return jsonify({'error': 'Dataset not found'}), 404
+
+    def generate():
+        # Every stream ends with a status line, even when classifying or committing fails part way
+        try:
+            yield from classify_and_insert()
+        except Exception as e:
+            print("bulk upload failed:", e)
+            yield ndjson_line({'status': 'error', 'error': str(e), 'inserted': 0})
+
+    def classify_and_insert():
+        uploads = []
+        inferences = []
+        failed = 0
+        today = datetime.today().date()
+        cache = get_inference_cache()
+        model_id = None
+
+        def add_row(filename, data, class_id):
+            digest, saved = store_upload(filename, data)
+            row = None if dataset_id is not None else \
+                {'Name': filename, 'Description': f'Classified image with class ID: {class_id}', 'Type': 'Image', 'CreationDate': today}
+            uploads.append((filename, saved, row, {'FilePath': upload_store.path(digest), 'Label': class_id, 'Split': split}))
+            return digest
+
+        try:
+            for chunk in chunked(items, app.config['BULK_BATCH_SIZE']):
+                pending = []
+                for filename, data in chunk:
+                    key = content_key(data, model_version())
+                    class_id = cache.get(key)
+                    if class_id is None:
+                        pending.append((filename, key, data))
+                        continue
+                    digest = add_row(filename, data, class_id)
+                    record_stage('cache')
+                    yield ndjson_line({'file': filename, 'status': 'classified', 'class': class_id, 'cached': True, 'stage': 'cache',
+                                       'sha256': digest})
+                if not pending:
+                    continue
+                predictions = predict_many([data for _, _, data in pending])
+                if model_id is None:
+                    model_id = get_model_id()
+                for (filename, key, data), result in zip(pending, predictions):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        error = 'Not a readable image' if isinstance(result, OSError) else str(result)
+                        yield ndjson_line({'file': filename, 'status': 'error', 'error': error})
+                        continue
+                    prediction, stage = result
+                    class_id = imagenet_classes[prediction]
+                    cache.put(key, class_id)
+                    inferences.append({'ModelID': model_id, 'InputData': key, 'Result': class_id, 'InferenceDate': datetime.utcnow()})
+                    digest = add_row(filename, data, class_id)
+                    record_stage(stage)
+                    yield ndjson_line({'file': filename, 'status': 'classified', 'class': class_id, 'cached': False, 'stage': stage,
+                                       'sha256': digest})
+        except (tarfile.TarError, zipfile.BadZipFile) as e:
+            yield ndjson_line({'status': 'error', 'error': f'Unreadable archive: {e}', 'inserted': 0})
+            return
+
+        # Only images whose file is on disk get rows
+        rows = []
+        images = []
+        for filename, saved, row, image in uploads:
+            try:
+                saved.result()
+            except OSError as e:
+                failed += 1
+                yield ndjson_line({'file': filename, 'status': 'error', 'error': f'Could not save the upload: {e}'})
+                continue
+            if row is not None:
+                rows.append(row)
+            images.append(image)
+
+        def stage():
+            targets = insert_datasets(rows) if dataset_id is None else [dataset_id] * len(images)
+            db.session.execute(insert(Image), [dict(image, DatasetID=target) for image, target in zip(images, targets)])
+            if inferences:
+                db.session.execute(insert(Inference), inferences)
+        if images:
+            commit_with_retry(stage)
+        yield ndjson_line({'status': 'done', 'inserted': len(images), 'failed': failed})
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Resource for listing and creating datasets
+class DatasetListAPI(Resource):
+    def get(self):
+        args = list_parser.parse_args()
+        try:
+            datasets, next_cursor = list_datasets(args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if uses_compiled_serializer():
+            body = '{"datasets": ' + dataset_serializer.dumps_many(datasets) + ', "next_cursor": ' + json.dumps(next_cursor) + '}\n'
+            return Response(body, mimetype='application/json')
+        return {'datasets': marshal(datasets, dataset_fields), 'next_cursor': next_cursor}, 200
+
+    @marshal_with(dataset_fields)  
+    def post(self):
+        args = parser.parse_args()
+
+        def stage():
+            new_dataset = Dataset(Name=args['Name'], Description=args.get('Description'), Type=args['Type'], CreationDate=args.get('CreationDate'))
+            db.session.add(new_dataset)
+            return new_dataset
+        new_dataset = commit_with_retry(stage)
+        return new_dataset, 201 
+
+# Resource for full-text search over dataset names and descriptions
+class DatasetSearchAPI(Resource):
+    def get(self):
+        args = search_parser.parse_args()
+        try:
+            datasets, next_cursor = search_datasets(args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if uses_compiled_serializer():
+            body = '{"datasets": ' + dataset_serializer.dumps_many(datasets) + ', "next_cursor": ' + json.dumps(next_cursor) + '}\n'
+            return Response(body, mimetype='application/json')
+        return {'datasets': marshal(datasets, dataset_fields), 'next_cursor': next_cursor}, 200
+
 # Resource for handling datasets
 class DatasetAPI(Resource):
-    @marshal_with(dataset_fields)
     def get(self, dataset_id):
-        dataset = Dataset.query.filter_by(DatasetID=dataset_id).first()
-        if not dataset:
-            return {'error': 'Dataset not found'}, 404
-        return dataset
+        entry = dataset_cache.get(dataset_id)
+        if entry is None:
+            generation = dataset_cache_generation
+            dataset = reader().query(Dataset).filter_by(DatasetID=dataset_id).first()
+            if not dataset:
+                return {'error': 'Dataset not found'}, 404
+            entry = dataset_representation(dataset)
+            with dataset_cache_lock:
+                # Skip the fill when a write landed while the row was being read
+                if generation == dataset_cache_generation:
+                    dataset_cache.put(dataset_id, entry)
+        body, etag, last_modified = entry
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        # Answers 304 with no body when If-None-Match or If-Modified-Since still matches
+        return response.make_conditional(request)
 
     def put(self, dataset_id):
         dataset = Dataset.query.get(dataset_id)
@@ -108,48 +1079,294 @@ class DatasetAPI(Resource):
             return {'error': 'Dataset not found'}, 404
 
         args = parser.parse_args()
-        has_update = False
-
-        if 'Name' in args and args['Name'] is not None:
-            dataset.Name = args['Name']
-            has_update = True
-        if 'Description' in args and args['Description'] is not None:
-            dataset.Description = args['Description']
-            has_update = True
-        if 'Type' in args and args['Type'] is not None:
-            dataset.Type = args['Type']
-            has_update = True
-        if 'CreationDate' in args and args['CreationDate'] is not None:
-            dataset.CreationDate = args['CreationDate']
-            has_update = True
-
-        if has_update:
-            db.session.commit()
+
+        def stage():
+            has_update = False
+            if 'Name' in args and args['Name'] is not None:
+                dataset.Name = args['Name']
+                has_update = True
+            if 'Description' in args and args['Description'] is not None:
+                dataset.Description = args['Description']
+                has_update = True
+            if 'Type' in args and args['Type'] is not None:
+                dataset.Type = args['Type']
+                has_update = True
+            if 'CreationDate' in args and args['CreationDate'] is not None:
+                dataset.CreationDate = args['CreationDate']
+                has_update = True
+            return has_update
+
+        if commit_with_retry(stage):
+            invalidate_datasets([dataset_id])
             return {'message': 'Dataset updated successfully'}, 200
         else:
             return {'message': 'No update performed'}, 200
-    @marshal_with(dataset_fields)  
-    def post(self):
-        args = parser.parse_args()
-        new_dataset = Dataset(Name=args['Name'], Description=args.get('Description'), Type=args['Type'], CreationDate=args.get('CreationDate'))
-        db.session.add(new_dataset)
-        db.session.commit()
-        return new_dataset, 201 
 
     def delete(self, dataset_id):
         dataset = Dataset.query.get(dataset_id)
         if dataset:
-            db.session.delete(dataset)
-            db.session.commit()
+            def stage():
+                delete_images([dataset_id])
+                db.session.delete(dataset)
+            commit_with_retry(stage)
+            invalidate_datasets([dataset_id])
             return {'message': 'Dataset deleted'}, 200
         return {'error': 'Dataset not found'}, 404
 
+# Bulk configuration: POST /datasets/bulk applies at most BULK_MAX_OPERATIONS operations in one transaction
+app.config['BULK_MAX_OPERATIONS'] = int(os.environ.get('BULK_MAX_OPERATIONS', 1000))
+
+DATASET_COLUMNS = ('Name', 'Description', 'Type', 'CreationDate')
+BULK_STATUSES = ('created', 'updated', 'deleted', 'not_found', 'error')
+
+def dataset_values(data, creating):
+    """Validate the data of one bulk operation and return its column values."""
+    if not isinstance(data, dict):
+        raise ValueError('data must be an object')
+    unknown = set(data) - set(DATASET_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    values = {key: value for key, value in data.items() if value is not None}
+    if creating:
+        for key in ('Name', 'Type'):
+            if not values.get(key):
+                raise ValueError(f'{key} cannot be blank')
+    elif not values:
+        raise ValueError('No fields to update')
+    if 'CreationDate' in values:
+        try:
+            values['CreationDate'] = datetime.strptime(values['CreationDate'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValueError('Date must be in YYYY-MM-DD format')
+    return values
+
+def insert_datasets(rows):
+    """Insert rows with one executemany and return their new DatasetIDs in order."""
+    if db.engine.dialect.name != 'sqlite':
+        return db.session.scalars(insert(Dataset).returning(Dataset.DatasetID, sort_by_parameter_order=True), rows).all()
+    # SQLite can only return ids in parameter order by inserting row by row; within one write
+    # transaction an INTEGER PRIMARY KEY takes consecutive rowids, so count back from the last one
+    db.session.execute(insert(Dataset), rows)
+    last_id = db.session.scalar(db.text('SELECT last_insert_rowid()'))
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+def run_bulk_operations(operations):
+    """Validate, then apply a batch of create/update/delete operations in one transaction.
+
+    Creates are one executemany INSERT, updates one executemany
+    UPDATE by primary key and deletes a single DELETE ... IN. Invalid operations
+    and unknown ids are reported per item and skipped; a database error rolls
+    back the whole batch.
+    """
+    results = [None] * len(operations)
+    creates, updates, deletes, targets = [], [], [], set()
+    for index, operation in enumerate(operations):
+        try:
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op == 'create':
+                creates.append((index, dataset_values(operation.get('data'), creating=True)))
+                continue
+            if op not in ('update', 'delete'):
+                raise ValueError("op must be 'create', 'update' or 'delete'")
+            dataset_id = operation.get('DatasetID')
+            if not isinstance(dataset_id, int) or isinstance(dataset_id, bool):
+                raise ValueError('DatasetID must be an integer')
+            if dataset_id in targets:
+                raise ValueError(f'DatasetID {dataset_id} appears in more than one operation')
+            if op == 'update':
+                updates.append((index, dataset_id, dataset_values(operation.get('data'), creating=False)))
+            else:
+                deletes.append((index, dataset_id))
+            targets.add(dataset_id)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+    def stage():
+        existing = set()
+        if targets:
+            existing = set(db.session.scalars(select(Dataset.DatasetID).where(Dataset.DatasetID.in_(targets))))
+        new_ids = []
+        if creates:
+            new_ids = insert_datasets([dict(dict.fromkeys(DATASET_COLUMNS), **values) for _, values in creates])
+        rows = [dict(values, DatasetID=dataset_id) for _, dataset_id, values in updates if dataset_id in existing]
+        if rows:
+            db.session.execute(update(Dataset), rows)
+        removed = [dataset_id for _, dataset_id in deletes if dataset_id in existing]
+        if removed:
+            delete_images(removed)
+            db.session.execute(delete(Dataset).where(Dataset.DatasetID.in_(removed)))
+        return existing, new_ids
+
+    try:
+        existing, new_ids = commit_with_retry(stage)
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    invalidate_datasets(targets)
+
+    for (index, _), dataset_id in zip(creates, new_ids):
+        results[index] = {'index': index, 'status': 'created', 'DatasetID': dataset_id}
+    for index, dataset_id, _ in updates:
+        results[index] = {'index': index, 'status': 'updated' if dataset_id in existing else 'not_found', 'DatasetID': dataset_id}
+    for index, dataset_id in deletes:
+        results[index] = {'index': index, 'status': 'deleted' if dataset_id in existing else 'not_found', 'DatasetID': dataset_id}
+    return results
+
+# Resource for batches of create, update and delete operations
+class DatasetBulkAPI(Resource):
+    def post(self):
+        body = request.get_json(silent=True)
+        operations = body.get('operations') if isinstance(body, dict) else None
+        if not isinstance(operations, list):
+            return {'error': 'Expected a JSON object with an operations list'}, 400
+        if len(operations) > app.config['BULK_MAX_OPERATIONS']:
+            return {'error': f"At most {app.config['BULK_MAX_OPERATIONS']} operations per request"}, 413
+        try:
+            results = run_bulk_operations(operations)
+        except SQLAlchemyError as e:
+            return {'error': f"Batch rolled back: {getattr(e, 'orig', None) or e}"}, 500
+        summary = {status: sum(result['status'] == status for result in results) for status in BULK_STATUSES}
+        return dict(summary, results=results), 200
+
+# Resource for a dataset's images, filtered by label and split
+class DatasetImagesAPI(Resource):
+    def get(self, dataset_id):
+        args = image_parser.parse_args()
+        if reader().get(Dataset, dataset_id) is None:
+            return {'error': 'Dataset not found'}, 404
+        images, next_cursor = list_images(dataset_id, args)
+        if uses_compiled_serializer():
+            body = '{"images": ' + image_serializer.dumps_many(images) + ', "next_cursor": ' + json.dumps(next_cursor) + '}\n'
+            return Response(body, mimetype='application/json')
+        return {'images': marshal(images, image_fields), 'next_cursor': next_cursor}, 200
+
+# Resource for the number of images per label in a dataset
+class DatasetLabelsAPI(Resource):
+    def get(self, dataset_id):
+        if reader().get(Dataset, dataset_id) is None:
+            return {'error': 'Dataset not found'}, 404
+        counts = reader().query(Image.Label, func.count(Image.ImageID)).filter(Image.DatasetID == dataset_id).group_by(Image.Label).all()
+        return {'labels': {label: count for label, count in counts if label is not None}}, 200
+
+# Export configuration: GET /export/<table> streams a whole table, reading EXPORT_BATCH_SIZE rows at a time
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+export_dataset_fields = dict(dataset_fields, UpdatedAt=fields.DateTime(dt_format='iso8601'))
+
+inference_fields = {
+    'InferenceID': fields.Integer,
+    'ModelID': fields.Integer,
+    'InputData': fields.String,
+    'Result': fields.String,
+    'InferenceDate': fields.DateTime(dt_format='iso8601')
+}
+
+# Exportable tables: (model, watermark column, fields, tombstones). The watermark column only grows,
+# in commit order, as rows are written, so "changed since" is a range on it. A timestamp would not
+# do: it is stamped before the write lock is taken, so a delayed commit could land below a watermark
+# already handed out and never be exported. Images and inferences are never updated, so their
+# primary key serves. Deleted datasets are gone from the table, so deltas read them from the
+# tombstones model; a dataset's tombstone also stands for the images deleted with it
+EXPORTS = {
+    'datasets': (Dataset, Dataset.ChangeSeq, export_dataset_fields, DatasetTombstone),
+    'images': (Image, Image.ImageID, image_fields, None),
+    'inferences': (Inference, Inference.InferenceID, inference_fields, None),
+}
+export_serializers = {table: Serializer(spec) for table, (_, _, spec, _) in EXPORTS.items()}
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def encode_watermark(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def decode_watermark(value, column):
+    try:
+        return datetime.fromisoformat(value) if column.type.python_type is datetime else int(value)
+    except ValueError:
+        raise ValueError(f'Invalid since watermark: {value}')
+
+def export_statement(model, column, spec, since, tombstones=None):
+    """Return the SELECT of rows changed after since (all rows if None) and the new watermark.
+
+    The watermark is read first and caps the range, so rows written while the
+    export streams are left for the next one rather than sent twice. With a
+    tombstones model numbered on the same sequence, a delta also has a row
+    with deleted set for each key deleted in the range, in commit order with
+    the changed rows.
+    """
+    primary_key = inspect(model).primary_key[0]
+    if tombstones is None:
+        watermark = reader().query(func.max(column)).scalar()
+    else:
+        # One statement, so both maxima come from the same snapshot
+        watermark = max(filter(lambda value: value is not None, reader().execute(
+            select(func.max(column), select(func.max(tombstones.ChangeSeq)).scalar_subquery())).one()), default=None)
+    statement = select(*[getattr(model, key) for key in spec])
+    if since is not None:
+        if watermark is None or watermark <= since:
+            return statement.where(false()), since
+        if tombstones is None:
+            return statement.where(column > since, column <= watermark).order_by(column, primary_key), watermark
+        changed = statement.add_columns(column.label('change_seq'), false().label('deleted')).where(column > since, column <= watermark)
+        deleted = select(*[getattr(tombstones, key).label(key) if key == primary_key.key else null().label(key) for key in spec],
+                         tombstones.ChangeSeq.label('change_seq'), true().label('deleted')) \
+            .where(tombstones.ChangeSeq > since, tombstones.ChangeSeq <= watermark)
+        return union_all(changed, deleted).order_by('change_seq'), watermark
+    if watermark is None:
+        return statement.order_by(primary_key), None
+    if column is primary_key:
+        return statement.where(column <= watermark).order_by(primary_key), watermark
+    # Rows from before the column existed have no watermark value; a full export includes them
+    return statement.where(or_(column <= watermark, column.is_(None))).order_by(primary_key), watermark
+
+# Route for streaming a table as NDJSON or CSV, gzip-compressed when the client accepts it
+@app.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    if table not in EXPORTS:
+        return jsonify({'error': f"Unknown table {table}; export one of {', '.join(EXPORTS)}"}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    model, column, spec, tombstones = EXPORTS[table]
+    try:
+        since = request.args.get('since')
+        since = None if since is None else decode_watermark(since, column)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    statement, watermark = export_statement(model, column, spec, since, tombstones)
+
+    # yield_per fetches from the open cursor in batches, so memory does not grow with the table
+    batches = reader().execute(statement.execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])).partitions()
+    serializer, columns = export_serializers[table], list(spec)
+    if since is not None and tombstones is not None:
+        serializer = TombstoneSerializer(serializer, inspect(model).primary_key[0].key)
+        columns.append('deleted')
+    if export_format == 'csv':
+        chunks = csv_chunks(batches, columns)
+    else:
+        chunks = ndjson_chunks(batches, serializer)
+    headers = {'Content-Disposition': f'attachment; filename={table}.{export_format}', 'Vary': 'Accept-Encoding'}
+    if watermark is not None:
+        headers['X-Export-Watermark'] = encode_watermark(watermark)
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format], headers=headers)
+
 # Adding resources to API
-api.add_resource(DatasetAPI, '/datasets/', '/datasets/<int:dataset_id>')
+api.add_resource(DatasetListAPI, '/datasets/')
+api.add_resource(DatasetAPI, '/datasets/<int:dataset_id>')
+api.add_resource(DatasetBulkAPI, '/datasets/bulk')
+api.add_resource(DatasetSearchAPI, '/datasets/search')
+api.add_resource(DatasetImagesAPI, '/datasets/<int:dataset_id>/images')
+api.add_resource(DatasetLabelsAPI, '/datasets/<int:dataset_id>/labels')
+
+if app.config['MODEL_WARMUP']:
+    start_warmup()
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade_schema()
     app.run(debug=True)
 
 
@@ -0,0 +1,50 @@
+import torch
+from torchvision import models
+
+BACKENDS = ('eager', 'torchscript', 'int8', 'channels_last')
+
+
+class ChannelsLast(torch.nn.Module):
+    """Runs a network with NHWC weights and inputs, which oneDNN convolutions prefer on CPU."""
+
+    def __init__(self, net):
+        super().__init__()
+        self.net = net.to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.net(x.contiguous(memory_format=torch.channels_last))
+
+
+def load_network(weights='IMAGENET1K_V1', arch='resnet50'):
+    """Build an eval-mode torchvision classifier; weights='none' skips loading pretrained weights."""
+    net = models.get_model(arch, weights=None if weights.lower() == 'none' else weights)
+    return net.eval()
+
+
+def set_threads(threads):
+    """Set torch's intra-op thread count; 0 keeps torch's default."""
+    if threads and threads > 0:
+        torch.set_num_threads(threads)
+
+
+def build_backend(net, mode='eager', input_size=224):
+    """Wrap an eval-mode network for the requested inference backend.
+
+    eager          - the network as is (FP32)
+    torchscript    - traced with a dummy batch, then frozen so weights fold into the graph
+    int8           - dynamic int8 quantization; only Linear layers are quantized, convolutions stay FP32
+    channels_last  - NHWC memory format for weights and inputs
+    """
+    if mode not in BACKENDS:
+        raise ValueError(f'Unknown inference backend {mode!r}, expected one of {", ".join(BACKENDS)}')
+    net.eval()
+    if mode == 'eager':
+        return net
+    if mode == 'channels_last':
+        return ChannelsLast(net).eval()
+    if mode == 'int8':
+        return torch.ao.quantization.quantize_dynamic(net, {torch.nn.Linear}, dtype=torch.qint8)
+    example = torch.zeros(1, 3, input_size, input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(net, example)
+    return torch.jit.freeze(traced)
@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects concurrent requests into one batched call.
+
+    Each worker thread waits for the first pending item, then keeps pulling
+    until either max_batch_size items are collected or max_wait_ms has passed
+    since that first item arrived. run_batch receives the list of items and
+    must return one result per item, in the same order. With max_queue set,
+    submit() blocks while that many items are already waiting. close() runs
+    whatever is still queued and stops the workers.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5, workers=1, max_queue=0):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = workers
+        self._queue = Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'max_batch_size_seen': 0,
+            'total_queue_delay_ms': 0.0,
+            'max_queue_delay_ms': 0.0,
+            'total_run_ms': 0.0,
+            'batch_size_histogram': {},
+        }
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result."""
+        if self._closed:
+            raise RuntimeError('MicroBatcher is closed')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['batch_size_histogram'] = dict(self._stats['batch_size_histogram'])
+        batches = stats['batches']
+        stats['avg_batch_size'] = stats['requests'] / batches if batches else 0.0
+        stats['avg_queue_delay_ms'] = stats['total_queue_delay_ms'] / stats['requests'] if stats['requests'] else 0.0
+        stats['avg_run_ms'] = stats['total_run_ms'] / batches if batches else 0.0
+        stats['pending'] = self._queue.qsize()
+        stats['workers'] = self.workers
+        return stats
+
+    def close(self):
+        """Stop accepting items, run the batches still queued and wait for the workers to exit."""
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+        # Anything submitted while close() was running has no worker left to take it
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError('MicroBatcher is closed'))
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'micro-batcher-{index}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _collect(self):
+        """Return the next batch and whether close() asked this worker to stop after it."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _record(self, batch, started):
+        delays = [(started - enqueued) * 1000.0 for _, _, enqueued in batch]
+        size = len(batch)
+        with self._lock:
+            self._stats['requests'] += size
+            self._stats['batches'] += 1
+            self._stats['max_batch_size_seen'] = max(self._stats['max_batch_size_seen'], size)
+            self._stats['total_queue_delay_ms'] += sum(delays)
+            self._stats['max_queue_delay_ms'] = max(self._stats['max_queue_delay_ms'], max(delays))
+            histogram = self._stats['batch_size_histogram']
+            histogram[size] = histogram.get(size, 0) + 1
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect()
+            if batch:
+                self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        self._record(batch, started)
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.run_batch(items)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._stats['total_run_ms'] += (time.perf_counter() - started) * 1000.0
+        if len(results) != len(batch):
+            # Every item's result is unknown, and leaving futures unset would hang their callers
+            error = RuntimeError(f'run_batch returned {len(results)} results for {len(batch)} items')
+            for _, future, _ in batch:
+                future.set_exception(error)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,91 @@
+"""Compare inference backends on a sample image set.
+
+    python benchmark_backends.py --images samples/ --backends eager,torchscript,int8,channels_last
+
+Reports per-batch latency, throughput and top-1 agreement with eager mode.
+Without --images a fixed set of random tensors is used, which is enough for
+timing but makes the agreement figure meaningless.
+"""
+import argparse
+import copy
+import os
+import statistics
+import time
+import torch
+from backends import BACKENDS, build_backend, load_network, set_threads
+from preprocess import CROP_SIZE, decode_image, transform
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_samples(image_dir, count):
+    if not image_dir:
+        generator = torch.Generator().manual_seed(0)
+        return torch.randn(count, 3, CROP_SIZE, CROP_SIZE, generator=generator)
+    tensors = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(image_dir, name), 'rb') as f:
+                tensors.append(transform(decode_image(f.read())))
+    if not tensors:
+        raise SystemExit(f'No images found in {image_dir}')
+    return torch.stack(tensors)
+
+
+def run(net, samples, batch_size):
+    predictions, latencies = [], []
+    with torch.no_grad():
+        for start in range(0, len(samples), batch_size):
+            batch = samples[start:start + batch_size]
+            began = time.perf_counter()
+            output = net(batch)
+            latencies.append((time.perf_counter() - began) * 1000.0)
+            predictions.extend(output.argmax(dim=1).tolist())
+    return predictions, latencies
+
+
+def benchmark(mode, base, samples, batch_size, repeats, warmup):
+    net = build_backend(copy.deepcopy(base), mode)
+    for _ in range(warmup):
+        run(net, samples[:batch_size], batch_size)
+    latencies = []
+    for _ in range(repeats):
+        predictions, batch_latencies = run(net, samples, batch_size)
+        latencies.extend(batch_latencies)
+    return predictions, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='directory of sample images')
+    parser.add_argument('--count', type=int, default=32, help='random samples to use when --images is not given')
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--weights', default='IMAGENET1K_V1', help="torchvision weights, or 'none'")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=0, help='intra-op threads, 0 keeps the default')
+    parser.add_argument('--tolerance', type=float, default=0.99, help='minimum top-1 agreement with eager')
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    samples = load_samples(args.images, args.count)
+    base = load_network(args.weights)
+    modes = [mode.strip() for mode in args.backends.split(',') if mode.strip()]
+    reference, _ = run(base, samples, args.batch_size)
+
+    print(f'{len(samples)} samples, batch size {args.batch_size}, {torch.get_num_threads()} threads')
+    print(f'{"backend":<14}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}{"img/s":>10}{"top-1 agree":>13}')
+    for mode in modes:
+        predictions, latencies = benchmark(mode, base, samples, args.batch_size, args.repeats, args.warmup)
+        agreement = sum(p == r for p, r in zip(predictions, reference)) / len(reference)
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        throughput = len(samples) * args.repeats / (sum(latencies) / 1000.0)
+        flag = '' if agreement >= args.tolerance else '  below tolerance'
+        print(f'{mode:<14}{statistics.mean(latencies):>10.1f}{statistics.median(latencies):>10.1f}'
+              f'{p95:>10.1f}{throughput:>10.1f}{agreement:>12.1%}{flag}')
+
+
+if __name__ == '__main__':
+    main()
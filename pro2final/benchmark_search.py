@@ -0,0 +1,60 @@
+"""Latency of GET /datasets/search over a large datasets table.
+
+    python benchmark_search.py --rows 300000 --repeat 50
+
+Fills a fresh SQLite file with rows whose names and descriptions are drawn
+from a fixed vocabulary (so some words are rare and some match thousands of
+rows), then times first pages and cursor pages through the Flask test client.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmark_storage import percentile
+
+WORDS = [f'word{index}' for index in range(5000)] + ['cats', 'kitten', 'tabby', 'retriever', 'parrot']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=50, help='requests per query')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'search.db')
+    os.environ.setdefault('MODEL_WEIGHTS', 'none')
+    from app import app, db, insert_datasets
+
+    rng = random.Random(0)
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        for _ in range(0, args.rows, 10000):
+            insert_datasets([{'Name': ' '.join(rng.choices(WORDS, k=3)), 'Description': ' '.join(rng.choices(WORDS, k=20)),
+                              'Type': 'Bench'} for _ in range(10000)])
+            db.session.commit()
+    print(f'Inserted and indexed {args.rows} rows in {time.perf_counter() - started:.1f}s')
+
+    client = app.test_client()
+    print(f'{"query":>16}{"p50 ms":>9}{"p99 ms":>9}{"next p50 ms":>13}')
+    for query in ('word17', 'word17 word18', 'cat', 'tabby kitten', 'nomatch'):
+        first, following = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            page = client.get('/datasets/search', query_string={'q': query, 'limit': args.limit}).json
+            first.append((time.perf_counter() - started) * 1000.0)
+            if page['next_cursor']:
+                started = time.perf_counter()
+                client.get('/datasets/search', query_string={'q': query, 'limit': args.limit, 'cursor': page['next_cursor']})
+                following.append((time.perf_counter() - started) * 1000.0)
+        print(f'{query:>16}{percentile(first, 0.5):>9.1f}{percentile(first, 0.99):>9.1f}{percentile(following, 0.5):>13.1f}')
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Microbenchmark of Dataset serialization: flask_restful marshal + json.dumps vs the compiled serializer.
+
+    python benchmark_serializer.py --sizes 1,50,500 --repeat 2000
+
+Rows are unsaved Dataset objects, so no database is involved. Each case is
+checked to be byte-identical before it is timed.
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import date
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('MODEL_WEIGHTS', 'none')
+
+from flask_restful import marshal
+from app import Dataset, dataset_fields, dataset_serializer
+
+
+def make_rows(count):
+    return [Dataset(DatasetID=index + 1, Name=f'dataset-{index}', Description='Classified image with class ID: tabby',
+                    Type='Image', CreationDate=date(2024, 1, 1 + index % 28)) for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,50,500', help='comma-separated list sizes; 1 serializes a single object')
+    parser.add_argument('--repeat', type=int, default=2000, help='serializations per measurement')
+    args = parser.parse_args()
+
+    print(f'{"rows":>6}{"marshal us":>12}{"compiled us":>13}{"speedup":>9}')
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        rows = make_rows(size)
+        if size == 1:
+            row = rows[0]
+            baseline = lambda: json.dumps(marshal(row, dataset_fields))
+            compiled = lambda: dataset_serializer.dumps(row)
+        else:
+            baseline = lambda: json.dumps(marshal(rows, dataset_fields))
+            compiled = lambda: dataset_serializer.dumps_many(rows)
+        if baseline() != compiled():
+            raise SystemExit(f'Output differs for {size} rows')
+        # Best of five runs, in microseconds per serialization
+        slow = min(timeit.repeat(baseline, number=args.repeat, repeat=5)) / args.repeat * 1e6
+        fast = min(timeit.repeat(compiled, number=args.repeat, repeat=5)) / args.repeat * 1e6
+        print(f'{size:>6}{slow:>12.1f}{fast:>13.1f}{slow / fast:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Mixed read/write throughput of the datasets API in each storage mode.
+
+    python benchmark_storage.py --writers 4 --readers 8 --seconds 10
+
+Every mode runs in its own process against a fresh SQLite file: writer threads
+POST /datasets/, reader threads alternate between a GET /datasets/ page and a
+GET /datasets/<id>. Requests go through the Flask test client, so the handlers,
+commit retries and read pool are the ones the server uses. Any non-2xx answer
+(a "database is locked" error surfaces as a 500) is counted as an error.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run_mode(args):
+    """Child process: benchmark the storage mode configured in the environment and print JSON."""
+    from app import app, db, Dataset, upgrade_schema
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        db.session.add_all(Dataset(Name=f'seed-{index}', Description='Seed row', Type='Seed') for index in range(args.seed_rows))
+        db.session.commit()
+
+    stats = {'write': {'ok': 0, 'errors': 0, 'latency': []}, 'read': {'ok': 0, 'errors': 0, 'latency': []}}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def record(kind, status, elapsed):
+        with lock:
+            stats[kind]['ok' if status < 300 else 'errors'] += 1
+            stats[kind]['latency'].append(elapsed * 1000.0)
+
+    def writer(index):
+        client = app.test_client()
+        count = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.post('/datasets/', json={'Name': f'bench-{index}-{count}', 'Type': 'Bench', 'CreationDate': '2024-01-01'})
+            record('write', response.status_code, time.perf_counter() - started)
+            count += 1
+
+    def reader(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        while not stop.is_set():
+            started = time.perf_counter()
+            if rng.random() < 0.5:
+                response = client.get('/datasets/', query_string={'limit': 20, 'sort': '-DatasetID'})
+            else:
+                response = client.get(f'/datasets/{rng.randint(1, args.seed_rows)}')
+            record('read', response.status_code, time.perf_counter() - started)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(index,)) for index in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    report = {}
+    for kind, values in stats.items():
+        report[kind] = {'per_s': values['ok'] / args.seconds, 'errors': values['errors'],
+                        'p50_ms': percentile(values['latency'], 0.5), 'p99_ms': percentile(values['latency'], 0.99)}
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='default,wal', help='comma-separated STORAGE_MODE values')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed-rows', type=int, default=10000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args)
+        return
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds:g}s per mode')
+    print(f'{"mode":>8}{"writes/s":>10}{"w err":>7}{"w p99 ms":>10}{"reads/s":>10}{"r err":>7}{"r p99 ms":>10}')
+    for mode in (m.strip() for m in args.modes.split(',') if m.strip()):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, STORAGE_MODE=mode, MODEL_WEIGHTS='none',
+                       DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'))
+            command = [sys.executable, os.path.abspath(__file__), '--child', '--writers', str(args.writers),
+                       '--readers', str(args.readers), '--seconds', str(args.seconds), '--seed-rows', str(args.seed_rows)]
+            output = subprocess.run(command, env=env, cwd=directory, capture_output=True, text=True, check=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        write, read = report['write'], report['read']
+        print(f'{mode:>8}{write["per_s"]:>10.0f}{write["errors"]:>7}{write["p99_ms"]:>10.1f}'
+              f'{read["per_s"]:>10.0f}{read["errors"]:>7}{read["p99_ms"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry past max_entries."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def content_key(data, model_version):
+    """Cache key for raw image bytes classified by one model version."""
+    return f'{model_version}:{hashlib.sha256(data).hexdigest()}'
+
+
+class InferenceCache:
+    """In-memory LRU tier in front of a persistent lookup.
+
+    load(key) is called on a memory miss and returns the stored result or
+    None. Writing to the persistent tier is left to the caller so that it can
+    share the caller's transaction; put() only fills the memory tier.
+    """
+
+    def __init__(self, max_entries=10000, load=None):
+        self.memory = LRUCache(max_entries)
+        self.load = load
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0}
+
+    def get(self, key):
+        result = self.memory.get(key)
+        if result is not None:
+            self._count('memory_hits')
+            return result
+        if self.load is not None:
+            result = self.load(key)
+            if result is not None:
+                self.memory.put(key, result)
+                self._count('persistent_hits')
+                return result
+        self._count('misses')
+        return None
+
+    def put(self, key, result):
+        self.memory.put(key, result)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hits'] = stats['memory_hits'] + stats['persistent_hits']
+        stats['entries'] = len(self.memory)
+        stats['max_entries'] = self.memory.max_entries
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,45 @@
+import torch
+from backends import build_backend
+
+LARGE_STAGE = 'resnet50'
+
+
+class Cascade(torch.nn.Module):
+    """Two-stage classifier: a cheap network answers when it is confident,
+    everything below threshold top-1 probability is re-run through the large one.
+
+    Both networks must predict over the same label set (ImageNet-1k here).
+    """
+
+    def __init__(self, small, large, threshold, small_stage='mobilenet_v3_large'):
+        super().__init__()
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+        self.small_stage = small_stage
+
+    def classify(self, batch):
+        """Return (class indices, stage names) for a batch tensor."""
+        with torch.no_grad():
+            confidence, predictions = torch.softmax(self.small(batch), dim=1).max(dim=1)
+            predictions = predictions.tolist()
+            stages = [self.small_stage] * len(predictions)
+            uncertain = (confidence < self.threshold).nonzero(as_tuple=True)[0]
+            if len(uncertain):
+                escalated = self.large(batch[uncertain]).argmax(dim=1).tolist()
+                for position, prediction in zip(uncertain.tolist(), escalated):
+                    predictions[position] = prediction
+                    stages[position] = LARGE_STAGE
+        return predictions, stages
+
+    def with_backend(self, mode):
+        return Cascade(build_backend(self.small, mode), build_backend(self.large, mode), self.threshold, self.small_stage)
+
+
+def classify_batch(model, batch):
+    """Run a plain network or a Cascade; returns a list of (class index, stage)."""
+    if isinstance(model, Cascade):
+        return list(zip(*model.classify(batch)))
+    with torch.no_grad():
+        predictions = model(batch).argmax(dim=1).tolist()
+    return [(prediction, LARGE_STAGE) for prediction in predictions]
@@ -3,7 +3,8 @@ CREATE TABLE `Datasets Table` (
     `Name` VARCHAR(255),
     `Description` TEXT,
     `Type` VARCHAR(100),
-    `CreationDate` DATE
+    `CreationDate` DATE,
+    `UpdatedAt` DATETIME
 );
 
 CREATE TABLE `Images Table` (
@@ -51,3 +52,37 @@ CREATE TABLE `Inferences Table` (
     `InferenceDate` DATETIME,
     FOREIGN KEY (`ModelID`) REFERENCES `Models Table`(`ModelID`)
 );
+
+CREATE INDEX `idx_inferences_input` ON `Inferences Table` (`InputData`);
+
+CREATE INDEX `ix_datasets_type_id` ON `Datasets Table` (`Type`, `DatasetID`);
+CREATE INDEX `ix_datasets_type_created` ON `Datasets Table` (`Type`, `CreationDate`, `DatasetID`);
+CREATE INDEX `ix_datasets_type_name` ON `Datasets Table` (`Type`, `Name`, `DatasetID`);
+CREATE INDEX `ix_datasets_created` ON `Datasets Table` (`CreationDate`, `DatasetID`);
+CREATE INDEX `ix_datasets_name` ON `Datasets Table` (`Name`, `DatasetID`);
+CREATE INDEX `ix_datasets_updated` ON `Datasets Table` (`UpdatedAt`, `DatasetID`);
+
+CREATE INDEX `ix_images_dataset` ON `Images Table` (`DatasetID`, `ImageID`);
+CREATE INDEX `ix_images_dataset_label` ON `Images Table` (`DatasetID`, `Label`, `ImageID`);
+CREATE INDEX `ix_images_dataset_split` ON `Images Table` (`DatasetID`, `Split`, `ImageID`);
+CREATE INDEX `ix_images_dataset_label_split` ON `Images Table` (`DatasetID`, `Label`, `Split`, `ImageID`);
+CREATE INDEX `ix_annotations_image` ON `Annotations Table` (`ImageID`);
+CREATE INDEX `ix_annotations_class` ON `Annotations Table` (`ObjectClass`, `ImageID`);
+CREATE UNIQUE INDEX `ix_models_name` ON `Models Table` (`Name`);
+CREATE INDEX `ix_models_training_dataset` ON `Models Table` (`TrainingDatasetID`);
+CREATE INDEX `ix_training_sessions_model` ON `Training Sessions Table` (`ModelID`, `StartDate`);
+CREATE INDEX `ix_inferences_model` ON `Inferences Table` (`ModelID`);
+
+-- Full-text search over dataset names and descriptions (SQLite FTS5, external content)
+CREATE VIRTUAL TABLE `datasets_fts` USING fts5(Name, Description, content='Datasets Table', content_rowid='DatasetID', tokenize='porter unicode61 remove_diacritics 2');
+INSERT INTO datasets_fts(datasets_fts, rank) VALUES('rank', 'bm25(4.0, 1.0)');
+CREATE TRIGGER datasets_fts_insert AFTER INSERT ON `Datasets Table` BEGIN
+    INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description);
+END;
+CREATE TRIGGER datasets_fts_delete AFTER DELETE ON `Datasets Table` BEGIN
+    INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description);
+END;
+CREATE TRIGGER datasets_fts_update AFTER UPDATE OF Name, Description ON `Datasets Table` BEGIN
+    INSERT INTO datasets_fts(datasets_fts, rowid, Name, Description) VALUES ('delete', old.DatasetID, old.Name, old.Description);
+    INSERT INTO datasets_fts(rowid, Name, Description) VALUES (new.DatasetID, new.Name, new.Description);
+END;
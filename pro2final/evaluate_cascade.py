@@ -0,0 +1,102 @@
+"""Offline latency/accuracy trade-off of the cascade for a range of thresholds.
+
+    python evaluate_cascade.py --images samples/ --labels samples/labels.csv --thresholds 0.3,0.5,0.7,0.9
+
+Both stages are run once over every image; each threshold is then evaluated
+from those outputs. Latency is the mean per-image cost: the small model always
+runs, ResNet-50 only for the escalated share. The labels file is a CSV of
+filename,label where label is an ImageNet class index or class name; without
+it accuracy is reported as top-1 agreement with ResNet-50 alone.
+"""
+import argparse
+import csv
+import os
+import time
+import torch
+from backends import load_network, set_threads
+from preprocess import decode_image, load_imagenet_classes, transform
+from benchmark_backends import IMAGE_EXTENSIONS
+
+
+def load_images(image_dir):
+    names, tensors = [], []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(image_dir, name), 'rb') as f:
+                tensors.append(transform(decode_image(f.read())))
+            names.append(name)
+    if not tensors:
+        raise SystemExit(f'No images found in {image_dir}')
+    return names, torch.stack(tensors)
+
+
+def load_labels(path, names):
+    by_name = {label: index for index, label in load_imagenet_classes().items()}
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            filename, label = row[0].strip(), row[1].strip()
+            labels[filename] = int(label) if label.isdigit() else by_name.get(label)
+    return [labels.get(name) for name in names]
+
+
+def run(net, samples, batch_size):
+    """Return softmax outputs for every sample and the mean per-image latency in ms."""
+    outputs, elapsed = [], 0.0
+    with torch.no_grad():
+        for start in range(0, len(samples), batch_size):
+            began = time.perf_counter()
+            logits = net(samples[start:start + batch_size])
+            elapsed += time.perf_counter() - began
+            outputs.append(torch.softmax(logits, dim=1))
+    return torch.cat(outputs), elapsed * 1000.0 / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='directory of sample images')
+    parser.add_argument('--labels', help='CSV of filename,label')
+    parser.add_argument('--thresholds', default='0.3,0.4,0.5,0.6,0.7,0.8,0.9')
+    parser.add_argument('--small', default='mobilenet_v3_large', help='torchvision model for the first stage')
+    parser.add_argument('--weights', default='IMAGENET1K_V1', help="torchvision weights, or 'none'")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    names, samples = load_images(args.images)
+    small_probs, small_ms = run(load_network(args.weights, arch=args.small), samples, args.batch_size)
+    large_probs, large_ms = run(load_network(args.weights), samples, args.batch_size)
+    confidence, small_pred = small_probs.max(dim=1)
+    large_pred = large_probs.argmax(dim=1)
+
+    if args.labels:
+        labels = load_labels(args.labels, names)
+        known = [i for i, label in enumerate(labels) if label is not None]
+        if not known:
+            raise SystemExit('No image in the labels file matched the sample images')
+        reference = torch.tensor([labels[i] for i in known])
+        metric = 'accuracy'
+    else:
+        known = list(range(len(names)))
+        reference = large_pred
+        metric = 'agree w/ resnet50'
+
+    def score(predictions):
+        return (predictions[known] == reference).float().mean().item()
+
+    print(f'{len(names)} images; {args.small} {small_ms:.1f} ms/img, resnet50 {large_ms:.1f} ms/img')
+    print(f'{"threshold":>10}{"escalated":>11}{"ms/img":>9}{"speedup":>9}{metric:>19}')
+    print(f'{"resnet50":>10}{1:>11.1%}{large_ms:>9.1f}{1:>8.2f}x{score(large_pred):>19.1%}')
+    for threshold in (float(t) for t in args.thresholds.split(',') if t.strip()):
+        escalated = confidence < threshold
+        predictions = torch.where(escalated, large_pred, small_pred)
+        share = escalated.float().mean().item()
+        latency = small_ms + share * large_ms
+        print(f'{threshold:>10.2f}{share:>11.1%}{latency:>9.1f}{large_ms / latency:>8.2f}x{score(predictions):>19.1%}')
+
+
+if __name__ == '__main__':
+    main()
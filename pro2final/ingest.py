@@ -0,0 +1,73 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from werkzeug.utils import secure_filename
+
+ZIP_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+TAR_MIMETYPES = {'application/x-tar', 'application/gzip', 'application/x-gzip', 'application/x-gtar', 'application/octet-stream'}
+
+# Bodies larger than this are spooled to disk before the zip directory is read
+ZIP_SPOOL_SIZE = 64 * 1024 * 1024
+
+
+def safe_name(path):
+    """Strip directories and unsafe characters from an archive or form filename."""
+    return secure_filename(os.path.basename(path)) or 'upload'
+
+
+def iter_files(files):
+    """Yield (filename, bytes) for every non-empty part of a multipart list."""
+    for file in files:
+        if file.filename:
+            yield safe_name(file.filename), file.read()
+
+
+def iter_tar(stream):
+    """Yield (filename, bytes) from a tar stream without seeking, so the body is never buffered whole."""
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            data = archive.extractfile(member).read()
+            yield safe_name(member.name), data
+
+
+def iter_zip(stream):
+    """Yield (filename, bytes) from a zip body; zip needs its central directory so the body is spooled first."""
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) as spool:
+        shutil.copyfileobj(stream, spool)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                yield safe_name(info.filename), archive.read(info)
+
+
+def iter_upload_items(request):
+    """Pick the right reader for a bulk upload request."""
+    files = request.files.getlist('images')
+    if files:
+        # Form parts are closed with the original request context, before a
+        # streamed response runs, so they are read up front; large loads should
+        # use a tar body instead
+        return list(iter_files(files))
+    if request.mimetype in ZIP_MIMETYPES:
+        return iter_zip(request.stream)
+    if request.mimetype in TAR_MIMETYPES:
+        return iter_tar(request.stream)
+    return None
+
+
+def chunked(items, size):
+    """Group an iterable into lists of at most size items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
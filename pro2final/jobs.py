@@ -0,0 +1,120 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from queue import Queue, Full
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the pending queue is at capacity."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Job queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        body = {'job_id': self.id, 'status': self.status}
+        if self.result is not None:
+            body['result'] = self.result
+        if self.error is not None:
+            body['error'] = self.error
+        return body
+
+
+class JobQueue:
+    """Bounded work queue served by a fixed set of worker threads.
+
+    handler(payload) runs on a worker thread and its return value becomes the
+    job result. submit() never blocks: when max_pending jobs are already
+    waiting it raises QueueFull with a Retry-After estimate instead. Finished
+    jobs are kept for lookup until max_finished newer ones have completed.
+    """
+
+    def __init__(self, handler, workers=2, max_pending=64, max_finished=10000):
+        self.handler = handler
+        self.workers = workers
+        self.max_finished = max_finished
+        self._queue = Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._service_time = 0.0
+        self._completed = 0
+        self._rejected = 0
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload):
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, payload))
+        except Full:
+            with self._lock:
+                del self._jobs[job.id]
+                self._rejected += 1
+            raise QueueFull(self.retry_after())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or timeout seconds pass; returns the job or None."""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, from the mean service time so far."""
+        with self._lock:
+            average = self._service_time / self._completed if self._completed else 1.0
+        return max(1, int(round(average * self._queue.qsize() / self.workers)))
+
+    def stats(self):
+        with self._lock:
+            average = self._service_time / self._completed if self._completed else 0.0
+            return {'pending': self._queue.qsize(), 'capacity': self._queue.maxsize, 'workers': self.workers,
+                    'completed': self._completed, 'rejected': self._rejected,
+                    'avg_service_ms': average * 1000.0}
+
+    def _run(self):
+        while True:
+            job, payload = self._queue.get()
+            job.status = 'running'
+            started = time.perf_counter()
+            try:
+                job.result = self.handler(payload)
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            job.finished = time.time()
+            self._finish(job, time.perf_counter() - started)
+            job.done.set()
+
+    def _finish(self, job, elapsed):
+        with self._lock:
+            self._service_time += elapsed
+            self._completed += 1
+            self._finished[job.id] = True
+            while len(self._finished) > self.max_finished:
+                expired, _ = self._finished.popitem(last=False)
+                self._jobs.pop(expired, None)
@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from batching import MicroBatcher
+
+
+class Pipeline:
+    """Two-stage classifier pipeline: decode/preprocess, then batched inference.
+
+    decode_workers threads turn raw bytes into tensors with preprocess() and
+    hand them to the inference stage through a buffer of buffer_size tensors.
+    inference_workers threads drain that buffer in micro-batches, so the next
+    images are being decoded while the current batch is in the model. When the
+    buffer is full the decode threads wait. submit() blocks while
+    decode_workers + buffer_size images are already in the pipeline, so raw
+    bytes cannot pile up in the decode queue either.
+    """
+
+    def __init__(self, preprocess, run_batch, decode_workers=2, inference_workers=1, buffer_size=32,
+                 max_batch_size=8, max_wait_ms=5):
+        self.preprocess = preprocess
+        self.decode_workers = decode_workers
+        self.decoder = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='pipeline-decode')
+        self._admission = threading.BoundedSemaphore(decode_workers + buffer_size)
+        self.batcher = MicroBatcher(run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                    workers=inference_workers, max_queue=buffer_size)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._decode = {'items': 0, 'failed': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'blocked_ms': 0.0}
+
+    def submit(self, data):
+        """Queue raw image bytes and return a Future for run_batch's result for it."""
+        self._admission.acquire()
+        result = Future()
+        result.add_done_callback(lambda _: self._admission.release())
+        self.decoder.submit(self._decode_one, data, result)
+        return result
+
+    def stats(self):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000.0
+        with self._lock:
+            decode = dict(self._decode)
+        decode['avg_ms'] = decode['total_ms'] / decode['items'] if decode['items'] else 0.0
+        decode['workers'] = self.decode_workers
+        decode['utilization'] = decode['total_ms'] / (elapsed_ms * self.decode_workers) if elapsed_ms else 0.0
+        inference = self.batcher.stats()
+        inference['utilization'] = inference['total_run_ms'] / (elapsed_ms * self.batcher.workers) if elapsed_ms else 0.0
+        # The stage whose workers are busiest is the one limiting throughput
+        bottleneck = 'decode' if decode['utilization'] > inference['utilization'] else 'inference'
+        return {'decode': decode, 'inference': inference, 'bottleneck': bottleneck}
+
+    def _decode_one(self, data, result):
+        started = time.perf_counter()
+        try:
+            tensor = self.preprocess(data)
+        except Exception as e:
+            with self._lock:
+                self._decode['failed'] += 1
+            result.set_exception(e)
+            return
+        decoded = time.perf_counter()
+        try:
+            inner = self.batcher.submit(tensor)
+        except Exception as e:
+            # e.g. the batcher was closed; failing result also frees its admission slot
+            with self._lock:
+                self._decode['failed'] += 1
+            result.set_exception(e)
+            return
+        blocked = time.perf_counter() - decoded
+        with self._lock:
+            elapsed = (decoded - started) * 1000.0
+            self._decode['items'] += 1
+            self._decode['total_ms'] += elapsed
+            self._decode['max_ms'] = max(self._decode['max_ms'], elapsed)
+            self._decode['blocked_ms'] += blocked * 1000.0
+        inner.add_done_callback(lambda done: _copy_result(done, result))
+
+
+def _copy_result(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,195 @@
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+import torch
+import torch.multiprocessing as mp
+from backends import build_backend
+from cascade import Cascade, classify_batch
+from preprocess import decode_image, transform
+
+
+def core_slices(workers, threads_per_worker):
+    """Split the cores this process may run on into one slice per worker."""
+    if not hasattr(os, 'sched_getaffinity'):
+        return [None] * workers
+    cores = sorted(os.sched_getaffinity(0))
+    slices = []
+    for index in range(workers):
+        chunk = cores[index * threads_per_worker:(index + 1) * threads_per_worker]
+        slices.append(chunk or None)
+    return slices
+
+
+def _classify(model, items):
+    tensors, ids, results = [], [], []
+    for request_id, data in items:
+        try:
+            tensors.append(transform(decode_image(data)))
+            ids.append(request_id)
+        except Exception as e:
+            # e.g. OSError for bytes PIL cannot read, DecompressionBombError for oversized images
+            results.append((request_id, None, str(e)))
+    if tensors:
+        try:
+            predictions = classify_batch(model, torch.stack(tensors))
+        except Exception as e:
+            results.extend((request_id, None, str(e)) for request_id in ids)
+        else:
+            results.extend((request_id, prediction, None) for request_id, prediction in zip(ids, predictions))
+    return results
+
+
+def _worker(index, net, backend, requests, results, threads, cores, max_batch_size):
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    model = net.with_backend(backend) if isinstance(net, Cascade) else build_backend(net, backend)
+    stopping = False
+    while not stopping:
+        item = requests.get()
+        if item is None:
+            break
+        batch = [item]
+        while len(batch) < max_batch_size:
+            try:
+                item = requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        # Tell the collector which requests this worker holds, so they can be failed if it dies
+        results.put(('claim', index, [request_id for request_id, _ in batch]))
+        results.put(('done', index, _classify(model, batch)))
+
+
+class InferencePool:
+    """Worker processes that decode, preprocess and classify raw image bytes.
+
+    The network is loaded once in the web process and moved to shared memory.
+    With backend='eager' workers map the same weight pages instead of each
+    loading a copy; the other backends convert the network inside each worker,
+    so every worker holds its own converted weights. Each worker owns
+    threads_per_worker cores (pinned where the OS allows) and opportunistically
+    batches whatever requests are already queued.
+
+    A worker that dies (killed, out of memory, a crash in native code) fails
+    the requests it had taken and is started again; stats()['restarts'] counts
+    these. Requests it took but had not yet reported are lost with it and
+    time out in the caller.
+    """
+
+    def __init__(self, net, workers=2, threads_per_worker=1, backend='eager', max_batch_size=8, start_method='fork'):
+        self.workers = workers
+        self._context = mp.get_context(start_method)
+        net.share_memory()
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._futures = {}
+        self._claimed = [set() for _ in range(workers)]
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'restarts': 0, 'per_worker': [0] * workers}
+        self._worker_args = [(index, net, backend, self._requests, self._results, threads_per_worker, cores, max_batch_size)
+                             for index, cores in enumerate(core_slices(workers, threads_per_worker))]
+        self._processes = [self._spawn(index) for index in range(workers)]
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-results', daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        process = self._context.Process(target=_worker, name=f'inference-worker-{index}', daemon=True,
+                                        args=self._worker_args[index])
+        process.start()
+        return process
+
+    def submit(self, data):
+        """Send raw image bytes to the pool and return a Future for (class index, stage)."""
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+            self._stats['submitted'] += 1
+        self._requests.put((request_id, data))
+        return future
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['per_worker'] = list(self._stats['per_worker'])
+            stats['pending'] = len(self._futures)
+        stats['workers'] = self.workers
+        stats['alive'] = sum(process.is_alive() for process in self._processes)
+        return stats
+
+    def close(self):
+        self._closing = True
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        # Let the collector drain and exit before multiprocessing's own exit hooks close the pipes
+        self._results.put(None)
+        self._collector.join(timeout=5)
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message is None:
+                return
+            self._handle(message)
+            self._check_workers()
+
+    def _handle(self, message):
+        kind, index, body = message
+        if kind == 'claim':
+            with self._lock:
+                self._claimed[index].update(body)
+            return
+        for request_id, prediction, error in body:
+            with self._lock:
+                self._claimed[index].discard(request_id)
+                future = self._futures.pop(request_id, None)
+                self._stats['per_worker'][index] += 1
+                self._stats['completed' if error is None else 'failed'] += 1
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(prediction)
+            else:
+                future.set_exception(OSError(error))
+
+    def _check_workers(self):
+        if self._closing:
+            return
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            # Whatever the worker reported before it died is already in the pipe
+            while True:
+                try:
+                    message = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    # close() is under way; leave the stop message for _collect
+                    self._results.put(None)
+                    return
+                self._handle(message)
+            with self._lock:
+                lost = [self._futures.pop(request_id, None) for request_id in self._claimed[index]]
+                self._claimed[index].clear()
+                self._stats['failed'] += len(lost)
+                self._stats['restarts'] += 1
+            for future in lost:
+                if future is not None:
+                    future.set_exception(OSError(f'Inference worker {index} exited with code {process.exitcode}'))
+            process.join()
+            self._processes[index] = self._spawn(index)
@@ -0,0 +1,31 @@
+import io
+import json
+import os
+from PIL import Image
+from torchvision import transforms
+
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+
+transform = transforms.Compose([
+    transforms.Resize(RESIZE_SIZE),
+    transforms.CenterCrop(CROP_SIZE),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+# Class index shipped next to this file (originally from download.tensorflow.org)
+CLASS_INDEX_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'imagenet_class_index.json')
+
+def load_imagenet_classes():
+    with open(CLASS_INDEX_PATH) as f:
+        class_idx = json.load(f)
+        class_labels = {int(key): value[1] for key, value in class_idx.items()}
+    return class_labels
+
+def decode_image(data):
+    image = Image.open(io.BytesIO(data))
+    if image.format == 'JPEG':
+        # libjpeg decodes at 1/2, 1/4 or 1/8 scale while both sides stay >= RESIZE_SIZE
+        image.draft('RGB', (RESIZE_SIZE, RESIZE_SIZE))
+    return image.convert('RGB')
@@ -1,7 +1,30 @@
 import unittest
-from app import app, db, Dataset
+import csv
+import gzip
+import io
+import json
+import os
+import tarfile
+import tempfile
+
+# Keep the suite offline and away from the real database file
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('MODEL_WEIGHTS', 'none')
+
+import app as app_module
+from app import app, db, Dataset, Image as ImageRow, Inference, MLModel, commit_with_retry, dataset_cache, upgrade_schema, get_inference_cache, get_model, imagenet_classes, decode_image, save_upload
+from blobstore import BlobStore
 from datetime import datetime
 from flask_testing import TestCase
+from sqlalchemy import event, func
+from sqlalchemy.exc import OperationalError
+from unittest import mock
+from PIL import Image
+
+def make_png(color='red', size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
 
 class BaseTestCase(TestCase):
 
@@ -11,7 +34,14 @@ class BaseTestCase(TestCase):
         return app
 
     def setUp(self):
+        # Uploads go to a temporary folder, not the real uploads/
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        patcher = mock.patch.object(app_module, 'upload_store', BlobStore(folder.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
         db.create_all()
+        dataset_cache.clear()
         sample_dataset = Dataset(Name='Sample', Description='Sample dataset', Type='Sample Type', CreationDate=datetime.utcnow())
         db.session.add(sample_dataset)
         db.session.commit()
@@ -59,5 +89,641 @@ class TestDatasetAPI(BaseTestCase):
         response = self.client.get('/datasets/1')
         self.assertEqual(response.status_code, 404)
 
+class TestBulkUpload(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_inference_cache().memory.clear()
+
+    def read_lines(self, response):
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_bulk_upload_multipart(self):
+        response = self.client.post('/upload/bulk', data={
+            'images': [(io.BytesIO(make_png()), 'a.png'),
+                       (io.BytesIO(make_png('blue')), 'b.png'),
+                       (io.BytesIO(b'not an image'), 'c.png')]
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        lines = self.read_lines(response)
+        self.assertEqual(sorted(line['status'] for line in lines[:-1]), ['classified', 'classified', 'error'])
+        self.assertEqual(lines[-1]['inserted'], 2)
+        self.assertEqual(lines[-1]['failed'], 1)
+        self.assertEqual(Dataset.query.filter_by(Type='Image').count(), 2)
+
+    def test_bulk_upload_tar_stream(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            for name in ('x.png', 'y.png', 'z.png'):
+                data = make_png()
+                info = tarfile.TarInfo(name=f'batch/{name}')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        response = self.client.post('/upload/bulk', data=archive.getvalue(), content_type='application/x-tar')
+        lines = self.read_lines(response)
+        self.assertEqual(lines[-1], {'status': 'done', 'inserted': 3, 'failed': 0})
+        self.assertEqual(Dataset.query.filter_by(Type='Image').count(), 3)
+
+    def test_bulk_upload_reports_a_model_error_per_image(self):
+        with mock.patch.object(app_module, 'submit_image') as submit:
+            submit.return_value.result.side_effect = RuntimeError('out of memory')
+            response = self.client.post('/upload/bulk', data={'images': [(io.BytesIO(make_png()), 'a.png')]},
+                                        content_type='multipart/form-data')
+            lines = self.read_lines(response)
+        self.assertEqual(lines[0], {'file': 'a.png', 'status': 'error', 'error': 'out of memory'})
+        self.assertEqual(lines[-1], {'status': 'done', 'inserted': 0, 'failed': 1})
+
+    def test_bulk_upload_ends_with_an_error_line_when_the_commit_fails(self):
+        with mock.patch.object(app_module, 'insert_datasets', side_effect=RuntimeError('disk I/O error')):
+            response = self.client.post('/upload/bulk', data={'images': [(io.BytesIO(make_png()), 'a.png')]},
+                                        content_type='multipart/form-data')
+            lines = self.read_lines(response)
+        self.assertEqual(lines[0]['status'], 'classified')
+        self.assertEqual(lines[-1], {'status': 'error', 'error': 'disk I/O error', 'inserted': 0})
+
+    def test_bulk_upload_commits_only_saved_files(self):
+        with mock.patch.object(app_module.upload_store, 'put_bytes', side_effect=OSError('No space left on device')):
+            response = self.client.post('/upload/bulk', data={'images': [(io.BytesIO(make_png()), 'a.png')]},
+                                        content_type='multipart/form-data')
+            lines = self.read_lines(response)
+        self.assertEqual(lines[-2]['status'], 'error')
+        self.assertEqual(lines[-1], {'status': 'done', 'inserted': 0, 'failed': 1})
+        self.assertEqual(ImageRow.query.count(), 0)
+
+    def test_bulk_upload_without_images(self):
+        response = self.client.post('/upload/bulk', json={})
+        self.assertEqual(response.status_code, 400)
+
+class TestInferenceCache(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_inference_cache().memory.clear()
+
+    def upload(self, data):
+        return self.client.post('/upload', data={'image': (io.BytesIO(data), 'same.png')},
+                                content_type='multipart/form-data')
+
+    def test_repeat_upload_hits_cache(self):
+        data = make_png('green')
+        before = get_inference_cache().stats()
+        first, second = self.upload(data), self.upload(data)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json['stage'], 'resnet50')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json['stage'], 'cache')
+        after = get_inference_cache().stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['memory_hits'] - before['memory_hits'], 1)
+        self.assertEqual(Inference.query.count(), 1)
+
+    def test_persistent_tier_survives_memory_eviction(self):
+        data = make_png('purple')
+        self.upload(data)
+        get_inference_cache().memory.clear()
+        before = get_inference_cache().stats()
+        self.upload(data)
+        after = get_inference_cache().stats()
+        self.assertEqual(after['persistent_hits'] - before['persistent_hits'], 1)
+        self.assertEqual(after['misses'], before['misses'])
+
+    def test_metrics_expose_cache_counters(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.json['inference_cache'])
+        self.assertIn('misses', response.json['inference_cache'])
+        self.assertIn('stages', response.json)
+
+class TestAsyncUpload(BaseTestCase):
+
+    def test_async_upload_returns_job_and_result(self):
+        response = self.client.post('/upload?async=1', data={'image': (io.BytesIO(make_png('orange')), 'async.png')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json['job_id']
+        self.assertEqual(response.headers['Location'], f'/jobs/{job_id}')
+
+        status = self.client.get(f'/jobs/{job_id}?wait=10')
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual(status.json['status'], 'done')
+        self.assertIn('class', status.json['result'])
+        self.assertIsNotNone(Dataset.query.get(status.json['result']['DatasetID']))
+
+    def test_unknown_job_is_404(self):
+        self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+
+class TestDecode(BaseTestCase):
+
+    def test_large_jpeg_is_decoded_at_reduced_scale(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 3000), color='white').save(buffer, format='JPEG')
+        image = decode_image(buffer.getvalue())
+        self.assertEqual(image.mode, 'RGB')
+        self.assertEqual(image.size, (500, 375))
+
+    def test_small_png_is_decoded_unchanged(self):
+        image = decode_image(make_png(size=(64, 48)))
+        self.assertEqual(image.size, (64, 48))
+
+    def test_upload_is_saved_in_background(self):
+        blob = save_upload('saved.png', b'data').result(timeout=5)
+        self.assertEqual(blob.path, app_module.upload_store.lookup('saved.png').path)
+        with open(blob.path, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+class TestStartup(BaseTestCase):
+
+    def test_class_index_is_shipped(self):
+        self.assertEqual(len(imagenet_classes), 1000)
+        self.assertEqual(imagenet_classes[0], 'tench')
+
+    def test_ready_reports_startup_breakdown(self):
+        get_model()
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['ready'])
+        for key in ('imports_s', 'weight_load_s', 'warmup_inference_s'):
+            self.assertIn(key, response.json['startup'])
+
+    def test_ready_fails_while_a_pool_worker_is_down(self):
+        pool = mock.Mock()
+        pool.stats.return_value = {'workers': 2, 'alive': 1}
+        with mock.patch.dict(app.config, {'INFERENCE_MODE': 'pool'}), mock.patch.object(app_module, 'pool', pool):
+            self.assertEqual(self.client.get('/ready').status_code, 503)
+            pool.stats.return_value = {'workers': 2, 'alive': 2}
+            self.assertEqual(self.client.get('/ready').status_code, 200)
+
+    def test_metrics_in_pool_mode_leave_the_pipeline_unstarted(self):
+        pool = mock.Mock()
+        pool.stats.return_value = {'workers': 2, 'alive': 2}
+        with mock.patch.dict(app.config, {'INFERENCE_MODE': 'pool'}), mock.patch.object(app_module, 'pool', pool), \
+                mock.patch.object(app_module, 'pipeline', None):
+            response = self.client.get('/metrics')
+            self.assertIsNone(app_module.pipeline)
+        self.assertEqual(response.json['pool'], {'workers': 2, 'alive': 2})
+        self.assertNotIn('pipeline', response.json)
+
+class TestDatasetListing(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(12):
+            created = datetime(2024, 1, 1 + index % 4).date() if index % 5 else None
+            db.session.add(Dataset(Name=f'set-{index % 6}', Description='Listing', Type='A' if index % 2 else 'B', CreationDate=created))
+        db.session.commit()
+
+    def walk(self, **params):
+        names, cursor = [], None
+        while True:
+            query = dict(params, limit=5)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/datasets/', query_string=query)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json['datasets']), 5)
+            names.extend(item['DatasetID'] for item in response.json['datasets'])
+            cursor = response.json['next_cursor']
+            if cursor is None:
+                return names
+
+    def test_pages_cover_every_row_in_order(self):
+        rows = Dataset.query.all()
+        self.assertEqual(self.walk(), sorted(row.DatasetID for row in rows))
+        self.assertEqual(self.walk(sort='-DatasetID'), sorted((row.DatasetID for row in rows), reverse=True))
+        # NULLs come first ascending and last descending, ties are broken by DatasetID
+        by_date = sorted(rows, key=lambda row: (row.CreationDate is not None, row.CreationDate or datetime.min.date(), row.DatasetID))
+        self.assertEqual(self.walk(sort='CreationDate'), [row.DatasetID for row in by_date])
+        self.assertEqual(self.walk(sort='-CreationDate'), [row.DatasetID for row in reversed(by_date)])
+        by_name = sorted(rows, key=lambda row: (row.Name, row.DatasetID))
+        self.assertEqual(self.walk(sort='Name'), [row.DatasetID for row in by_name])
+
+    def test_filters(self):
+        rows = Dataset.query.all()
+        expected = [row.DatasetID for row in rows if row.Type == 'A' and row.CreationDate
+                    and datetime(2024, 1, 2).date() <= row.CreationDate <= datetime(2024, 1, 3).date()]
+        expected.sort(key=lambda dataset_id: (db.session.get(Dataset, dataset_id).CreationDate, dataset_id))
+        self.assertEqual(self.walk(type='A', created_from='2024-01-02', created_to='2024-01-03', sort='CreationDate'), expected)
+        expected = [row.DatasetID for row in rows if row.Name.startswith('set-1')]
+        self.assertEqual(self.walk(name_prefix='set-1', sort='Name'), sorted(expected))
+
+    def test_bad_sort_and_cursor_are_rejected(self):
+        self.assertEqual(self.client.get('/datasets/?sort=Description').status_code, 400)
+        self.assertEqual(self.client.get('/datasets/?cursor=not-a-cursor').status_code, 400)
+        self.assertEqual(self.client.get('/datasets/?created_from=yesterday').status_code, 400)
+        # A range filter on one column and an order on another would need a sort of every match
+        self.assertEqual(self.client.get('/datasets/?name_prefix=set').status_code, 400)
+        self.assertEqual(self.client.get('/datasets/?name_prefix=set&sort=CreationDate').status_code, 400)
+        self.assertEqual(self.client.get('/datasets/?created_from=2024-01-02&sort=-Name').status_code, 400)
+
+    def test_compiled_body_matches_flask_restful(self):
+        fast = self.client.get('/datasets/', query_string={'limit': 5, 'sort': 'Name'})
+        # Any RESTFUL_JSON setting sends responses through flask_restful's own encoder
+        app.config['RESTFUL_JSON'] = {'separators': (', ', ': ')}
+        try:
+            slow = self.client.get('/datasets/', query_string={'limit': 5, 'sort': 'Name'})
+        finally:
+            del app.config['RESTFUL_JSON']
+        self.assertEqual(fast.data, slow.data)
+        self.assertEqual(fast.headers['Content-Type'], slow.headers['Content-Type'])
+
+    def test_listing_queries_use_an_index(self):
+        every_sort = ['DatasetID', '-DatasetID', 'Name', '-Name', 'CreationDate', '-CreationDate']
+        supported = [
+            ({}, every_sort),
+            ({'type': 'A'}, every_sort),
+            ({'name_prefix': 'set'}, ['Name', '-Name']),
+            ({'type': 'B', 'name_prefix': 'set'}, ['Name', '-Name']),
+            ({'created_from': '2024-01-02', 'created_to': '2024-01-03'}, ['CreationDate', '-CreationDate']),
+            ({'type': 'A', 'created_from': '2024-01-02'}, ['CreationDate', '-CreationDate']),
+            ({'type': 'A', 'name_prefix': 'set', 'created_to': '2024-01-03'}, ['Name', '-Name', 'CreationDate', '-CreationDate']),
+        ]
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('SELECT') and 'FROM datasets_table' in statement:
+                statements.append((statement, parameters))
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            for filters, sorts in supported:
+                for sort in sorts:
+                    self.walk(sort=sort, **filters)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        self.assertTrue(any('> (?, ?)' in statement or '< (?, ?)' in statement for statement, _ in statements))
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = ' '.join(row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters))
+            self.assertNotIn('TEMP B-TREE', plan, statement)
+
+class TestBulkOperations(BaseTestCase):
+
+    def test_mixed_batch_reports_each_item(self):
+        extra = Dataset(Name='Extra', Type='Sample Type')
+        db.session.add(extra)
+        db.session.commit()
+        response = self.client.post('/datasets/bulk', json={'operations': [
+            {'op': 'create', 'data': {'Name': 'First', 'Type': 'Catalog', 'CreationDate': '2024-02-01'}},
+            {'op': 'create', 'data': {'Name': 'Second', 'Type': 'Catalog'}},
+            {'op': 'update', 'DatasetID': 1, 'data': {'Description': 'Synced'}},
+            {'op': 'delete', 'DatasetID': extra.DatasetID},
+            {'op': 'delete', 'DatasetID': 999},
+            {'op': 'create', 'data': {'Name': 'No type'}},
+            {'op': 'rename', 'DatasetID': 1},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'created', 'updated', 'deleted', 'not_found', 'error', 'error'])
+        self.assertEqual(response.json['created'], 2)
+        self.assertEqual(response.json['error'], 2)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Dataset, results[0]['DatasetID']).Name, 'First')
+        self.assertEqual(db.session.get(Dataset, results[1]['DatasetID']).Name, 'Second')
+        self.assertEqual(db.session.get(Dataset, 1).Description, 'Synced')
+        self.assertEqual(db.session.get(Dataset, 1).Name, 'Sample')
+        self.assertIsNone(db.session.get(Dataset, extra.DatasetID))
+
+    def test_same_id_twice_is_rejected(self):
+        response = self.client.post('/datasets/bulk', json={'operations': [
+            {'op': 'update', 'DatasetID': 1, 'data': {'Name': 'Renamed'}},
+            {'op': 'delete', 'DatasetID': 1},
+        ]})
+        self.assertEqual([result['status'] for result in response.json['results']], ['updated', 'error'])
+        self.assertIsNotNone(db.session.get(Dataset, 1))
+
+    def test_batch_size_limit(self):
+        app.config['BULK_MAX_OPERATIONS'] = 2
+        try:
+            response = self.client.post('/datasets/bulk', json={'operations': [{'op': 'delete', 'DatasetID': 1}] * 3})
+        finally:
+            app.config['BULK_MAX_OPERATIONS'] = 1000
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.client.post('/datasets/bulk', json=[]).status_code, 400)
+
+class TestStorage(BaseTestCase):
+
+    def test_commit_retries_when_database_is_locked(self):
+        locked = OperationalError('COMMIT', {}, Exception('database is locked'))
+        staged = []
+        with mock.patch.object(db.session, 'commit', side_effect=[locked, locked, None]), mock.patch('time.sleep'):
+            result = commit_with_retry(lambda: staged.append(1) or 'done')
+        self.assertEqual(result, 'done')
+        self.assertEqual(len(staged), 3)
+
+    def test_commit_gives_up_on_other_errors_and_after_retries(self):
+        broken = OperationalError('COMMIT', {}, Exception('disk I/O error'))
+        with mock.patch.object(db.session, 'commit', side_effect=broken):
+            self.assertRaises(OperationalError, commit_with_retry, lambda: None)
+        locked = OperationalError('COMMIT', {}, Exception('database is locked'))
+        with mock.patch.object(db.session, 'commit', side_effect=locked) as commit, mock.patch('time.sleep'):
+            self.assertRaises(OperationalError, commit_with_retry, lambda: None)
+        self.assertEqual(commit.call_count, app.config['COMMIT_RETRIES'] + 1)
+
+class TestDatasetCache(BaseTestCase):
+
+    def test_repeat_get_is_served_from_cache(self):
+        first = self.client.get('/datasets/1')
+        with mock.patch('app.reader', side_effect=AssertionError('database queried')):
+            second = self.client.get('/datasets/1')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.json['Name'], 'Sample')
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertIn('Last-Modified', first.headers)
+
+    def test_unchanged_resource_is_not_modified(self):
+        first = self.client.get('/datasets/1')
+        with mock.patch('app.reader', side_effect=AssertionError('database queried')):
+            response = self.client.get('/datasets/1', headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            response = self.client.get('/datasets/1', headers={'If-Modified-Since': first.headers['Last-Modified']})
+            self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_the_cache(self):
+        etag = self.client.get('/datasets/1').headers['ETag']
+        self.client.put('/datasets/1', json={'Name': 'Renamed', 'Type': 'Sample Type'})
+        response = self.client.get('/datasets/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['Name'], 'Renamed')
+        etag = response.headers['ETag']
+        self.client.post('/datasets/bulk', json={'operations': [{'op': 'update', 'DatasetID': 1, 'data': {'Name': 'Bulk'}}]})
+        response = self.client.get('/datasets/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.json['Name'], 'Bulk')
+        self.client.delete('/datasets/1')
+        response = self.client.get('/datasets/1')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json, {'error': 'Dataset not found'})
+
+class TestImageSchema(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_inference_cache().memory.clear()
+
+    def upload(self, data, name, **fields):
+        return self.client.post('/upload', data=dict(fields, image=(io.BytesIO(data), name)),
+                                content_type='multipart/form-data')
+
+    def test_upload_records_image_inference_and_model(self):
+        response = self.upload(make_png('olive'), 'olive.png')
+        self.assertEqual(response.status_code, 200)
+        image = db.session.get(ImageRow, response.json['ImageID'])
+        self.assertEqual(image.DatasetID, response.json['DatasetID'])
+        self.assertEqual(image.FilePath, app_module.upload_store.lookup('olive.png').path)
+        self.assertIn(image.Label, imagenet_classes.values())
+        inference = Inference.query.one()
+        self.assertEqual(db.session.get(MLModel, inference.ModelID).Architecture, 'resnet50')
+
+    def test_images_by_label_and_split(self):
+        target = Dataset.query.first().DatasetID
+        labels = []
+        for index, color in enumerate(('red', 'red', 'blue', 'red')):
+            split = 'train' if index < 3 else 'test'
+            response = self.upload(make_png(color), f'{index}.png', DatasetID=str(target), Split=split)
+            labels.append(db.session.get(ImageRow, response.json['ImageID']).Label)
+        self.assertEqual(Dataset.query.count(), 1)
+        red = labels[0]
+        response = self.client.get(f'/datasets/{target}/images', query_string={'label': red, 'split': 'train', 'limit': 1})
+        self.assertEqual(len(response.json['images']), 1)
+        second = self.client.get(f'/datasets/{target}/images', query_string={'label': red, 'split': 'train', 'cursor': response.json['next_cursor']})
+        found = response.json['images'] + second.json['images']
+        self.assertEqual(len(found), labels[:3].count(red))
+        self.assertTrue(all(image['Split'] == 'train' and image['Label'] == red for image in found))
+        self.assertIsNone(second.json['next_cursor'])
+        counts = self.client.get(f'/datasets/{target}/labels').json['labels']
+        self.assertEqual(sum(counts.values()), 4)
+        self.assertEqual(self.client.get('/datasets/999/images').status_code, 404)
+
+    def test_deleting_a_dataset_deletes_its_images(self):
+        response = self.upload(make_png('navy'), 'navy.png')
+        self.client.delete(f"/datasets/{response.json['DatasetID']}")
+        self.assertIsNone(db.session.get(ImageRow, response.json['ImageID']))
+
+    def test_image_queries_use_an_index(self):
+        queries = [
+            "SELECT * FROM images_table WHERE DatasetID = 1 AND Label = 'tabby' AND Split = 'train' AND ImageID > 5 ORDER BY ImageID LIMIT 51",
+            "SELECT * FROM images_table WHERE DatasetID = 1 AND Split = 'train' AND ImageID > 5 ORDER BY ImageID LIMIT 51",
+            "SELECT * FROM images_table WHERE DatasetID = 1 AND Label = 'tabby' ORDER BY ImageID LIMIT 51",
+        ]
+        for query in queries:
+            plan = ' '.join(row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + query)))
+            self.assertIn('INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+class TestExport(BaseTestCase):
+
+    def lines(self, response):
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_full_export_streams_ndjson(self):
+        self.client.post('/datasets/', json={'Name': 'Second', 'Type': 'Sample Type', 'CreationDate': '2024-01-01'})
+        response = self.client.get('/export/datasets')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = self.lines(response)
+        self.assertEqual([row['Name'] for row in rows], ['Sample', 'Second'])
+        self.assertEqual(response.headers['X-Export-Watermark'], str(db.session.query(func.max(Dataset.ChangeSeq)).scalar()))
+
+    def test_since_watermark_exports_only_changes(self):
+        watermark = self.client.get('/export/datasets').headers['X-Export-Watermark']
+        self.assertEqual(self.lines(self.client.get('/export/datasets', query_string={'since': watermark})), [])
+        self.client.post('/datasets/', json={'Name': 'New', 'Type': 'Sample Type', 'CreationDate': '2024-01-01'})
+        self.client.put('/datasets/1', json={'Name': 'Renamed', 'Type': 'Sample Type'})
+        response = self.client.get('/export/datasets', query_string={'since': watermark})
+        self.assertEqual([row['Name'] for row in self.lines(response)], ['New', 'Renamed'])
+        later = self.client.get('/export/datasets', query_string={'since': response.headers['X-Export-Watermark']})
+        self.assertEqual(self.lines(later), [])
+
+    def test_delta_carries_deletes_in_commit_order(self):
+        watermark = self.client.get('/export/datasets').headers['X-Export-Watermark']
+        kept = self.client.post('/datasets/', json={'Name': 'Kept', 'Type': 'Sample Type'}).json['DatasetID']
+        self.client.delete('/datasets/1')
+        short_lived = self.client.post('/datasets/', json={'Name': 'Short-lived', 'Type': 'Sample Type'}).json['DatasetID']
+        self.client.post('/datasets/bulk', json={'operations': [{'op': 'delete', 'DatasetID': short_lived}]})
+        self.client.put(f'/datasets/{kept}', json={'Name': 'Kept', 'Type': 'Sample Type', 'Description': 'Updated last'})
+        response = self.client.get('/export/datasets', query_string={'since': watermark})
+        rows = self.lines(response)
+        self.assertEqual(rows[:2], [{'DatasetID': 1, 'deleted': True}, {'DatasetID': short_lived, 'deleted': True}])
+        self.assertEqual([(rows[2]['DatasetID'], rows[2]['Description']), len(rows)], [(kept, 'Updated last'), 3])
+        self.assertNotIn('deleted', rows[2])
+        later = self.client.get('/export/datasets', query_string={'since': response.headers['X-Export-Watermark']})
+        self.assertEqual(self.lines(later), [])
+        # A delete is the newest change, so it moves the watermark too
+        self.client.delete(f'/datasets/{kept}')
+        response = self.client.get('/export/datasets', query_string={'since': response.headers['X-Export-Watermark'], 'format': 'csv'})
+        deleted = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([(row['DatasetID'], row['Name'], row['deleted']) for row in deleted], [(str(kept), '', 'true')])
+        self.assertGreater(int(response.headers['X-Export-Watermark']), int(watermark))
+
+    def test_late_commit_with_an_early_timestamp_is_not_skipped(self):
+        # Writer A stamps UpdatedAt, then waits for the write lock while writer B commits
+        # and an export hands out B's watermark; A's row commits after that export
+        stamped_early = Dataset(Name='Slow writer', Type='Sample Type', UpdatedAt=datetime(2000, 1, 1))
+        self.client.post('/datasets/', json={'Name': 'Fast writer', 'Type': 'Sample Type'})
+        watermark = self.client.get('/export/datasets').headers['X-Export-Watermark']
+        db.session.add(stamped_early)
+        db.session.commit()
+        response = self.client.get('/export/datasets', query_string={'since': watermark})
+        self.assertEqual([row['Name'] for row in self.lines(response)], ['Slow writer'])
+
+    def test_csv_and_gzip(self):
+        response = self.client.get('/export/datasets', query_string={'format': 'csv'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        text = gzip.decompress(response.get_data()).decode()
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(rows[0]['Name'], 'Sample')
+        self.assertEqual(list(rows[0]), ['DatasetID', 'Name', 'Description', 'Type', 'CreationDate', 'UpdatedAt'])
+
+    def test_images_and_inferences_export_by_id(self):
+        get_inference_cache().memory.clear()
+        upload = self.client.post('/upload', data={'image': (io.BytesIO(make_png('teal')), 'teal.png')},
+                                  content_type='multipart/form-data')
+        images = self.client.get('/export/images')
+        self.assertEqual(self.lines(images)[0]['ImageID'], upload.json['ImageID'])
+        self.assertEqual(images.headers['X-Export-Watermark'], str(upload.json['ImageID']))
+        inferences = self.lines(self.client.get('/export/inferences'))
+        self.assertEqual(inferences[0]['Result'], db.session.get(ImageRow, upload.json['ImageID']).Label)
+        self.assertEqual(self.lines(self.client.get('/export/images', query_string={'since': upload.json['ImageID']})), [])
+
+    def test_rejects_unknown_table_format_and_watermark(self):
+        self.assertEqual(self.client.get('/export/users').status_code, 404)
+        self.assertEqual(self.client.get('/export/datasets', query_string={'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/export/datasets', query_string={'since': 'yesterday'}).status_code, 400)
+
+    def test_delta_query_uses_an_index(self):
+        query = "SELECT * FROM datasets_table WHERE ChangeSeq > 10 AND ChangeSeq <= 20 ORDER BY ChangeSeq, DatasetID"
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + query)))
+        self.assertIn('ix_datasets_change_seq', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+class TestSearch(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, description in [('Cats of Boston', 'Tabby cats and kittens'), ('Dogs', 'Golden retrievers, no cats'), ('Birds', 'Parrots')]:
+            self.client.post('/datasets/', json={'Name': name, 'Description': description, 'Type': 'Sample Type'})
+
+    def search(self, q, **args):
+        return self.client.get('/datasets/search', query_string=dict(args, q=q))
+
+    def names(self, response):
+        return [dataset['Name'] for dataset in response.json['datasets']]
+
+    def test_ranks_name_matches_first(self):
+        response = self.search('cat')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(response), ['Cats of Boston', 'Dogs'])
+        self.assertEqual(self.names(self.search('golden retriever')), ['Dogs'])
+
+    def test_pages_with_a_cursor(self):
+        first = self.search('cat', limit=1)
+        self.assertEqual(self.names(first), ['Cats of Boston'])
+        second = self.search('cat', limit=1, cursor=first.json['next_cursor'])
+        self.assertEqual(self.names(second), ['Dogs'])
+        self.assertIsNone(second.json['next_cursor'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.client.put('/datasets/4', json={'Name': 'Bird cat', 'Type': 'Sample Type'})
+        self.client.delete('/datasets/2')
+        self.client.post('/datasets/bulk', json={'operations': [{'op': 'create', 'data': {'Name': 'Kitten', 'Type': 'Sample Type'}},
+                                                                {'op': 'update', 'DatasetID': 3, 'data': {'Description': 'Hounds'}}]})
+        self.assertEqual(self.names(self.search('cat')), ['Bird cat'])
+        self.assertEqual(self.names(self.search('kitten')), ['Kitten'])
+        self.assertEqual(self.names(self.search('hound')), ['Dogs'])
+
+    def test_query_syntax_is_taken_literally(self):
+        self.assertEqual(self.names(self.search('cats" OR (dogs')), [])
+        self.assertEqual(self.search('"(*').status_code, 400)
+        self.assertEqual(self.search('cat', cursor='bad').status_code, 400)
+
+    def test_upgrade_indexes_existing_rows(self):
+        db.session.execute(db.text('DROP TABLE datasets_fts'))
+        db.session.commit()
+        upgrade_schema()
+        self.assertEqual(self.names(self.search('parrot')), ['Birds'])
+
+class TestGroupCommit(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_inference_cache().memory.clear()
+
+    def tearDown(self):
+        if app_module.upload_writer is not None:
+            app_module.upload_writer.close()
+            app_module.upload_writer = None
+        super().tearDown()
+
+    def upload(self, color, name):
+        return self.client.post('/upload', data={'image': (io.BytesIO(make_png(color)), name)}, content_type='multipart/form-data')
+
+    def test_durable_mode_answers_after_the_group_commits(self):
+        with mock.patch.dict(app.config, {'UPLOAD_WRITE_MODE': 'durable'}):
+            response = self.upload('maroon', 'maroon.png')
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        image = db.session.get(ImageRow, response.json['ImageID'])
+        self.assertEqual(image.DatasetID, response.json['DatasetID'])
+        self.assertEqual(Inference.query.count(), 1)
+        self.assertEqual(app_module.upload_writer.stats()['commits'], 1)
+
+    def test_write_behind_rows_land_on_close(self):
+        with mock.patch.dict(app.config, {'UPLOAD_WRITE_MODE': 'write_behind', 'GROUP_COMMIT_ROWS': 10, 'GROUP_COMMIT_MS': 10000}):
+            responses = [self.upload(color, f'{color}.png') for color in ('silver', 'gold', 'silver')]
+            self.assertTrue(all(response.json['ImageID'] is None for response in responses))
+            app_module.upload_writer.close()
+        db.session.expire_all()
+        self.assertEqual(ImageRow.query.count(), 3)
+        self.assertEqual(Dataset.query.filter_by(Type='Image').count(), 3)
+        stats = app_module.upload_writer.stats()
+        self.assertEqual((stats['rows'], stats['commits']), (3, 1))
+
+class TestUploadStore(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_inference_cache().memory.clear()
+
+    def upload(self, data, name):
+        response = self.client.post('/upload', data={'image': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        image = db.session.get(ImageRow, response.json['ImageID'])
+        self.assertEqual(image.FilePath, app_module.upload_store.path(response.json['sha256']))
+        return image, response.json['sha256']
+
+    def test_same_name_keeps_both_contents(self):
+        first, first_digest = self.upload(make_png('lime'), 'same.png')
+        second, _ = self.upload(make_png('plum'), 'same.png')
+        self.assertNotEqual(first.FilePath, second.FilePath)
+        for image, color in ((first, 'lime'), (second, 'plum')):
+            with open(image.FilePath, 'rb') as f:
+                self.assertEqual(f.read(), make_png(color))
+        # The name serves the newest upload; each client's digest keeps serving its own content
+        self.assertEqual(self.client.get('/uploads/same.png').get_data(), make_png('plum'))
+        self.assertEqual(self.client.get(f'/uploads/{first_digest}').get_data(), make_png('lime'))
+
+    def test_failed_save_is_not_committed(self):
+        with mock.patch.object(app_module.upload_store, 'put_bytes', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                self.client.post('/upload', data={'image': (io.BytesIO(make_png('teal')), 'full.png')},
+                                 content_type='multipart/form-data')
+        self.assertEqual(ImageRow.query.count(), 0)
+
+    def test_identical_content_is_stored_once(self):
+        first, _ = self.upload(make_png('coral'), 'a.png')
+        second, _ = self.upload(make_png('coral'), 'b.png')
+        self.assertEqual(first.FilePath, second.FilePath)
+
+    def test_preview_supports_ranges(self):
+        data = make_png('khaki')
+        save_upload('range.png', data).result(timeout=5)
+        response = self.client.get('/uploads/range.png', headers={'Range': 'bytes=0-7'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), data[:8])
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertEqual(self.client.get('/uploads/missing.png').status_code, 404)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import torch
+from backends import BACKENDS, build_backend
+
+def small_net():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=2),
+        torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8, 10),
+    ).eval()
+
+class TestBackends(unittest.TestCase):
+
+    def test_every_backend_matches_eager(self):
+        batch = torch.randn(4, 3, 32, 32)
+        with torch.no_grad():
+            expected = small_net()(batch)
+        for mode in BACKENDS:
+            with self.subTest(mode=mode):
+                net = build_backend(small_net(), mode, input_size=32)
+                with torch.no_grad():
+                    output = net(batch)
+                self.assertEqual(output.shape, expected.shape)
+                self.assertTrue(torch.allclose(output, expected, atol=0.05))
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            build_backend(small_net(), 'tensorrt')
+
+if __name__ == '__main__':
+    unittest.main()
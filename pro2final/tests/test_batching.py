@@ -0,0 +1,84 @@
+import unittest
+import threading
+from batching import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_share_a_batch(self):
+        batches = []
+        gate = threading.Event()
+
+        def run_batch(items):
+            gate.wait()
+            batches.append(list(items))
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(4)]
+        gate.set()
+
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 10, 20, 30])
+        self.assertEqual(batches, [[0, 1, 2, 3]])
+        stats = batcher.stats()
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['avg_batch_size'], 4)
+
+    def test_batch_size_is_bounded(self):
+        sizes = []
+
+        def run_batch(items):
+            sizes.append(len(items))
+            return items
+
+        batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=50)
+        futures = [batcher.submit(i) for i in range(5)]
+
+        self.assertEqual([f.result(timeout=5) for f in futures], list(range(5)))
+        self.assertTrue(all(size <= 2 for size in sizes))
+        self.assertEqual(batcher.stats()['max_batch_size_seen'], 2)
+
+    def test_errors_reach_every_request(self):
+        def run_batch(items):
+            raise RuntimeError('forward pass failed')
+
+        batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=1)
+        future = batcher.submit('image')
+
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+
+    def test_short_results_fail_the_whole_batch(self):
+        gate = threading.Event()
+
+        def run_batch(items):
+            gate.wait()
+            return items[:1]
+
+        batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(3)]
+        gate.set()
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+    def test_close_runs_queued_items(self):
+        gate = threading.Event()
+
+        def run_batch(items):
+            gate.wait()
+            return items
+
+        batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=1)
+        futures = [batcher.submit(i) for i in range(5)]
+        gate.set()
+        batcher.close()
+
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual([future.result() for future in futures], list(range(5)))
+        with self.assertRaises(RuntimeError):
+            batcher.submit(5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import io
+import os
+import tempfile
+from blobstore import BlobStore
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = BlobStore(self.directory.name, chunk_size=4)
+
+    def test_stream_is_stored_under_its_hash(self):
+        blob = self.store.put_stream('notes.txt', io.BytesIO(b'hello world'))
+        self.assertEqual(blob.digest, 'b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9')
+        self.assertEqual(blob.size, 11)
+        self.assertEqual(blob.path, os.path.join(self.directory.name, 'blobs', 'b9', '4d', blob.digest))
+        with open(blob.path, 'rb') as f:
+            self.assertEqual(f.read(), b'hello world')
+        self.assertEqual(os.listdir(os.path.join(self.directory.name, 'tmp')), [])
+
+    def test_identical_content_is_deduplicated(self):
+        first = self.store.put_stream('a.txt', io.BytesIO(b'same'))
+        second = self.store.put_bytes('b.txt', b'same')
+        self.assertEqual(first.path, second.path)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.path))), 1)
+        self.assertEqual(self.store.names(), ['a.txt', 'b.txt'])
+
+    def test_name_resolves_to_latest_content(self):
+        old = self.store.put_bytes('image.png', b'first')
+        new = self.store.put_bytes('image.png', b'second')
+        self.assertEqual(self.store.lookup('image.png'), new)
+        self.assertTrue(os.path.exists(old.path))
+        self.assertEqual(self.store.names(), ['image.png'])
+        self.assertIsNone(self.store.lookup('missing.png'))
+
+    def test_digest_finds_each_content(self):
+        old = self.store.put_bytes('image.png', b'first')
+        self.store.put_bytes('image.png', b'second')
+        self.assertEqual(self.store.get(old.digest), old)
+        self.assertIsNone(self.store.get('0' * 64))
+
+    def test_index_survives_reopening(self):
+        blob = self.store.put_bytes('kept.txt', b'kept')
+        self.assertEqual(BlobStore(self.directory.name).lookup('kept.txt'), blob)
+
+if __name__ == '__main__':
+    unittest.main()
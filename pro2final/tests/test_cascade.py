@@ -0,0 +1,42 @@
+import unittest
+import torch
+from cascade import Cascade, classify_batch
+
+class FixedLogits(torch.nn.Module):
+    """Returns preset logits, one row per input row, and records what it saw."""
+
+    def __init__(self, logits):
+        super().__init__()
+        self.logits = logits
+        self.seen = 0
+
+    def forward(self, x):
+        self.seen += len(x)
+        return self.logits[x[:, 0, 0, 0].long()]
+
+class TestCascade(unittest.TestCase):
+
+    def setUp(self):
+        # Row 0 is confidently class 1, row 1 is a near tie between classes 0 and 2
+        self.small = FixedLogits(torch.tensor([[0.0, 10.0, 0.0], [1.0, 0.0, 1.1]]))
+        self.large = FixedLogits(torch.tensor([[0.0, 0.0, 5.0], [5.0, 0.0, 0.0]]))
+        self.batch = torch.zeros(2, 3, 4, 4)
+        self.batch[1] = 1
+
+    def test_only_uncertain_images_reach_the_large_model(self):
+        cascade = Cascade(self.small, self.large, threshold=0.8, small_stage='small')
+        predictions, stages = cascade.classify(self.batch)
+        self.assertEqual(predictions, [1, 0])
+        self.assertEqual(stages, ['small', 'resnet50'])
+        self.assertEqual(self.large.seen, 1)
+
+    def test_zero_threshold_never_escalates(self):
+        cascade = Cascade(self.small, self.large, threshold=0.0, small_stage='small')
+        self.assertEqual(classify_batch(cascade, self.batch), [(1, 'small'), (2, 'small')])
+        self.assertEqual(self.large.seen, 0)
+
+    def test_plain_network_reports_resnet50_stage(self):
+        self.assertEqual(classify_batch(self.large, self.batch), [(2, 'resnet50'), (0, 'resnet50')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import csv
+import gzip
+import io
+import zlib
+from datetime import date
+from types import SimpleNamespace
+from flask_restful import fields
+from export import csv_chunks, gzip_chunks, ndjson_chunks
+from serializer import Serializer
+
+class TestExportChunks(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = [
+            [SimpleNamespace(ID=1, Name='a, "quoted"', Day=date(2024, 1, 2)), SimpleNamespace(ID=2, Name=None, Day=None)],
+            [SimpleNamespace(ID=3, Name='line\nbreak', Day=date(2024, 3, 4))],
+        ]
+
+    def test_ndjson_is_one_chunk_per_batch(self):
+        chunks = list(ndjson_chunks(self.batches, Serializer({'ID': fields.Integer, 'Name': fields.String})))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[1], '{"ID": 3, "Name": "line\\nbreak"}\n')
+
+    def test_csv_round_trips(self):
+        text = ''.join(csv_chunks(self.batches, ['ID', 'Name', 'Day']))
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual([row['Name'] for row in rows], ['a, "quoted"', '', 'line\nbreak'])
+        self.assertEqual(rows[0]['Day'], '2024-01-02')
+        self.assertEqual(''.join(csv_chunks([], ['ID'])), 'ID\n')
+
+    def test_gzip_chunks_decode_as_they_arrive(self):
+        chunks = ['first\n', 'second\n']
+        compressed = list(gzip_chunks(iter(chunks)))
+        # Each sync-flushed chunk is decodable before the stream ends
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(compressed[0]), b'first\n')
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b'first\nsecond\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import threading
+from jobs import JobQueue, QueueFull
+
+class TestJobQueue(unittest.TestCase):
+
+    def test_job_result_is_available_after_wait(self):
+        queue = JobQueue(lambda payload: payload * 2, workers=1, max_pending=4)
+        job = queue.submit(21)
+        finished = queue.wait(job.id, timeout=5)
+        self.assertEqual(finished.status, 'done')
+        self.assertEqual(finished.to_dict(), {'job_id': job.id, 'status': 'done', 'result': 42})
+
+    def test_full_queue_rejects_with_retry_after(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(payload):
+            started.set()
+            release.wait(5)
+            return payload
+
+        queue = JobQueue(handler, workers=1, max_pending=1)
+        queue.submit('running')
+        started.wait(5)
+        queue.submit('waiting')
+        with self.assertRaises(QueueFull) as raised:
+            queue.submit('rejected')
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(queue.stats()['rejected'], 1)
+        release.set()
+
+    def test_failed_job_reports_error(self):
+        def handler(payload):
+            raise ValueError('bad image')
+
+        queue = JobQueue(handler, workers=1)
+        job = queue.wait(queue.submit(None).id, timeout=5)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'bad image')
+
+    def test_unknown_job(self):
+        queue = JobQueue(lambda payload: payload, workers=1)
+        self.assertIsNone(queue.get('missing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import threading
+import time
+from pipeline import Pipeline
+
+class TestPipeline(unittest.TestCase):
+
+    def test_results_follow_their_inputs(self):
+        pipeline = Pipeline(lambda data: data.upper(), lambda items: [item + '!' for item in items],
+                            decode_workers=3, inference_workers=2, buffer_size=2, max_batch_size=4, max_wait_ms=5)
+        words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta']
+        futures = [pipeline.submit(word) for word in words]
+        self.assertEqual([f.result(timeout=5) for f in futures], [word.upper() + '!' for word in words])
+
+        stats = pipeline.stats()
+        self.assertEqual(stats['decode']['items'], 6)
+        self.assertEqual(stats['inference']['requests'], 6)
+        self.assertEqual(stats['decode']['workers'], 3)
+        self.assertEqual(stats['inference']['workers'], 2)
+        self.assertIn(stats['bottleneck'], ('decode', 'inference'))
+
+    def test_decode_errors_fail_only_their_item(self):
+        def preprocess(data):
+            if data == 'bad':
+                raise OSError('cannot identify image file')
+            return data
+
+        pipeline = Pipeline(preprocess, lambda items: items, decode_workers=2)
+        bad, good = pipeline.submit('bad'), pipeline.submit('good')
+        with self.assertRaises(OSError):
+            bad.result(timeout=5)
+        self.assertEqual(good.result(timeout=5), 'good')
+        self.assertEqual(pipeline.stats()['decode']['failed'], 1)
+
+    def test_closed_batcher_fails_fast_and_frees_the_slot(self):
+        pipeline = Pipeline(lambda data: data, lambda items: items, decode_workers=1, buffer_size=1)
+        pipeline.batcher.close()
+        # More submissions than admission slots, so a leaked slot would block here
+        for _ in range(4):
+            with self.assertRaises(RuntimeError):
+                pipeline.submit('image').result(timeout=5)
+        self.assertEqual(pipeline.stats()['decode']['failed'], 4)
+
+    def test_full_buffer_holds_back_decoding(self):
+        release = threading.Event()
+        started = []
+
+        def preprocess(data):
+            started.append(data)
+            return data
+
+        def run_batch(items):
+            release.wait(5)
+            return items
+
+        pipeline = Pipeline(preprocess, run_batch, decode_workers=4, buffer_size=1, max_batch_size=1, max_wait_ms=0)
+        futures = []
+        submitter = threading.Thread(target=lambda: futures.extend(pipeline.submit(i) for i in range(8)))
+        submitter.start()
+        # One image in run_batch, one in the buffer, three decoded and waiting for room; the rest are not admitted
+        deadline = time.monotonic() + 5
+        while len(started) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        self.assertEqual(len(started), 5)
+        self.assertTrue(submitter.is_alive())
+        release.set()
+        submitter.join(5)
+        self.assertEqual([f.result(timeout=5) for f in futures], list(range(8)))
+        self.assertEqual(pipeline.stats()['inference']['max_batch_size_seen'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
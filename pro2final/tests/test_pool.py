@@ -0,0 +1,97 @@
+import unittest
+import io
+import os
+import signal
+import time
+import torch
+from PIL import Image
+from pool import InferencePool, core_slices
+
+def small_net():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=4),
+        torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8, 10),
+    ).eval()
+
+class SlowNet(torch.nn.Module):
+    """Holds each batch for a while, so a test can kill the worker running it."""
+
+    def forward(self, x):
+        time.sleep(2)
+        return torch.zeros(len(x), 10)
+
+class BrokenNet(torch.nn.Module):
+
+    def forward(self, x):
+        raise RuntimeError('shape mismatch')
+
+def make_png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class TestInferencePool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = InferencePool(small_net(), workers=2, threads_per_worker=1, max_batch_size=4)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_results_match_each_request(self):
+        images = [make_png(color) for color in ('red', 'green', 'blue', 'white', 'black')]
+        futures = [self.pool.submit(data) for data in images]
+        results = [future.result(timeout=30) for future in futures]
+        again = [self.pool.submit(data).result(timeout=30) for data in images]
+        self.assertEqual(results, again)
+        self.assertTrue(all(0 <= prediction < 10 for prediction, _ in results))
+        stats = self.pool.stats()
+        self.assertEqual(stats['completed'], 10)
+        self.assertEqual(sum(stats['per_worker']), 10)
+        self.assertEqual(stats['alive'], 2)
+
+    def test_unreadable_image_fails_only_its_request(self):
+        bad = self.pool.submit(b'not an image')
+        good = self.pool.submit(make_png('red'))
+        with self.assertRaises(OSError):
+            bad.result(timeout=30)
+        prediction, stage = good.result(timeout=30)
+        self.assertIsInstance(prediction, int)
+        self.assertEqual(stage, 'resnet50')
+
+    def test_model_error_fails_the_batch_not_the_worker(self):
+        pool = InferencePool(BrokenNet(), workers=1, max_batch_size=4)
+        try:
+            with self.assertRaises(OSError):
+                pool.submit(make_png('red')).result(timeout=30)
+            self.assertEqual(pool.stats()['alive'], 1)
+        finally:
+            pool.close()
+
+    def test_dead_worker_fails_its_requests_and_is_restarted(self):
+        pool = InferencePool(SlowNet(), workers=1, max_batch_size=4)
+        try:
+            future = pool.submit(make_png('red'))
+            deadline = time.monotonic() + 10
+            while not pool._claimed[0] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            os.kill(pool._processes[0].pid, signal.SIGKILL)
+            with self.assertRaisesRegex(OSError, 'exited'):
+                future.result(timeout=10)
+            while pool.stats()['alive'] < 1 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            stats = pool.stats()
+            self.assertEqual((stats['alive'], stats['restarts']), (1, 1))
+            self.assertEqual(pool.submit(make_png('blue')).result(timeout=30), (0, 'resnet50'))
+        finally:
+            pool.close()
+
+    def test_core_slices(self):
+        self.assertEqual(len(core_slices(3, 1)), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import json
+from datetime import date, datetime
+from types import SimpleNamespace
+from flask_restful import fields, marshal
+from serializer import Serializer
+
+DATASET_FIELDS = {
+    'DatasetID': fields.Integer,
+    'Name': fields.String,
+    'Description': fields.String,
+    'Type': fields.String,
+    'CreationDate': fields.String
+}
+
+class TestSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            SimpleNamespace(DatasetID=1, Name='Sample', Description='Quotes " and \\ and\nnewlines', Type='Image', CreationDate=date(2024, 1, 2)),
+            SimpleNamespace(DatasetID=None, Name='Café 日本 \U0001f600', Description=None, Type=None, CreationDate=datetime(2024, 1, 2, 3, 4)),
+        ]
+
+    def test_output_is_byte_identical_to_marshal(self):
+        serializer = Serializer(DATASET_FIELDS)
+        for row in self.rows:
+            self.assertEqual(serializer.dumps(row), json.dumps(marshal(row, DATASET_FIELDS)))
+        self.assertEqual(serializer.dumps_many(self.rows), json.dumps(marshal(self.rows, DATASET_FIELDS)))
+        self.assertEqual(serializer.dumps_many([]), json.dumps([]))
+
+    def test_other_fields_attributes_and_nesting_fall_back(self):
+        spec = {
+            'id': fields.Integer(attribute='DatasetID'),
+            'score': fields.Float(attribute='DatasetID'),
+            'kind': fields.String(attribute='Type', default='unknown'),
+            'meta': {'name': fields.String(attribute='Name'), 'raw': fields.Raw(attribute='Description')},
+        }
+        serializer = Serializer(spec)
+        for row in self.rows:
+            self.assertEqual(serializer.dumps(row), json.dumps(marshal(row, spec)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import threading
+from writer import GroupCommitWriter
+
+class TestGroupCommitWriter(unittest.TestCase):
+
+    def test_rows_commit_in_groups(self):
+        groups = []
+        gate = threading.Event()
+
+        def write_batch(items):
+            gate.wait()
+            groups.append(list(items))
+            return [item * 2 for item in items]
+
+        writer = GroupCommitWriter(write_batch, max_rows=3, max_wait_ms=200)
+        futures = [writer.write(i) for i in range(6)]
+        gate.set()
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [0, 2, 4, 6, 8, 10])
+        self.assertTrue(all(len(group) <= 3 for group in groups))
+        stats = writer.stats()
+        self.assertEqual(stats['rows'], 6)
+        self.assertEqual(stats['commits'], len(groups))
+        writer.close()
+
+    def test_close_commits_pending_rows(self):
+        committed = []
+
+        def write_batch(items):
+            committed.extend(items)
+            return items
+
+        writer = GroupCommitWriter(write_batch, max_rows=100, max_wait_ms=10000)
+        for i in range(10):
+            writer.write(i)
+        # Far below max_rows and max_wait_ms, so only close() flushes them
+        writer.close()
+        self.assertEqual(committed, list(range(10)))
+
+    def test_failed_groups_are_counted(self):
+        def write_batch(items):
+            raise RuntimeError('database is locked')
+
+        writer = GroupCommitWriter(write_batch, max_rows=2, max_wait_ms=1)
+        future = writer.write('row')
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+        writer.close()
+        self.assertEqual(writer.stats()['failed'], 1)
+        self.assertEqual(writer.stats()['last_error'], 'database is locked')
+
+    def test_failed_group_is_retried_row_by_row(self):
+        gate = threading.Event()
+        committed = []
+
+        def write_batch(items):
+            gate.wait()
+            if 'bad' in items:
+                raise ValueError('NOT NULL constraint failed')
+            committed.extend(items)
+            return items
+
+        writer = GroupCommitWriter(write_batch, max_rows=3, max_wait_ms=200)
+        futures = [writer.write(item) for item in ('a', 'bad', 'c')]
+        with self.assertLogs('writer', 'ERROR') as logs:
+            gate.set()
+            with self.assertRaises(ValueError):
+                futures[1].result(timeout=5)
+        self.assertEqual([futures[0].result(timeout=5), futures[2].result(timeout=5)], ['a', 'c'])
+        self.assertEqual(committed, ['a', 'c'])
+        self.assertIn("'bad'", logs.output[0])
+        writer.close()
+        stats = writer.stats()
+        self.assertEqual((stats['split_groups'], stats['failed']), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
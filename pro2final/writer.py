@@ -0,0 +1,77 @@
+import logging
+import threading
+from concurrent.futures import Future
+from batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    """Write-behind queue whose rows a single writer thread stores in group commits.
+
+    write(item) queues one item and returns a Future. The writer passes
+    write_batch up to max_rows queued items at once, or as many as arrived
+    within max_wait_ms of the first, and write_batch stores them all in one
+    transaction, so a group of uploads costs one commit (one fsync) instead
+    of one each. write_batch returns one result per item; a Future resolves
+    with its item's result once the group has committed. When a group fails,
+    its items are written again one at a time, so one bad row does not take
+    the rest of the group with it; an item that fails on its own is logged
+    and its Future gets the error. close() commits whatever is still queued.
+    """
+
+    def __init__(self, write_batch, max_rows=64, max_wait_ms=20, max_pending=10000):
+        self.write_batch = write_batch
+        self.batcher = MicroBatcher(self._write_group, max_batch_size=max_rows, max_wait_ms=max_wait_ms,
+                                    workers=1, max_queue=max_pending)
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._split = 0
+        self._last_error = None
+
+    def write(self, item):
+        future = Future()
+        self.batcher.submit(item).add_done_callback(lambda done: _resolve(done, future))
+        return future
+
+    def close(self):
+        self.batcher.close()
+
+    def stats(self):
+        batching = self.batcher.stats()
+        with self._lock:
+            failed, split, last_error = self._failed, self._split, self._last_error
+        return {'rows': batching['requests'], 'commits': batching['batches'], 'avg_group_size': batching['avg_batch_size'],
+                'max_group_size': batching['max_batch_size_seen'], 'avg_wait_ms': batching['avg_queue_delay_ms'],
+                'avg_commit_ms': batching['avg_run_ms'], 'pending': batching['pending'],
+                'split_groups': split, 'failed': failed, 'last_error': last_error}
+
+    def _write_group(self, items):
+        """write_batch(items), falling back to one item at a time; a failed item's result is its exception."""
+        if len(items) > 1:
+            try:
+                return self.write_batch(items)
+            except Exception as e:
+                logger.warning('Group of %d rows failed (%s); writing them one at a time', len(items), e)
+                with self._lock:
+                    self._split += 1
+        results = []
+        for item in items:
+            try:
+                results.extend(self.write_batch([item]))
+            except Exception as e:
+                # Nobody waits on a write-behind Future, so the dropped row is logged and counted here
+                logger.error('Dropped row %r: %s', item, e)
+                with self._lock:
+                    self._failed += 1
+                    self._last_error = str(e)
+                results.append(e)
+        return results
+
+
+def _resolve(done, future):
+    result = done.exception() or done.result()
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
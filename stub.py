@@ -1,5 +1,7 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file
+from blobstore import BlobStore
 import logging
+import mimetypes
 import os
 import cProfile
 import pstats
@@ -9,6 +11,8 @@ app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'json', 'xls', 'xlsx'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Files are stored by content hash in sharded directories, with a name index, instead of by filename
+upload_store = BlobStore(UPLOAD_FOLDER)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, filename='api.log', filemode='a',
@@ -45,9 +49,9 @@ def upload_file():
         return jsonify(error="No selected file"), 400
     if file and allowed_file(file.filename):
         filename = file.filename
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        logging.info(f"File {filename} uploaded successfully")
-        return jsonify(message=f"File {filename} uploaded successfully"), 200
+        blob = upload_store.put_stream(filename, file.stream)
+        logging.info(f"File {filename} uploaded successfully as {blob.digest}")
+        return jsonify(message=f"File {filename} uploaded successfully", sha256=blob.digest), 200
     else:
         logging.error("File type not allowed")
         return jsonify(error="File type not allowed"), 400
@@ -55,18 +59,20 @@ def upload_file():
 @app.route('/files', methods=['GET'])
 def list_files():
     logging.info("Listing uploaded files")
-    files = os.listdir(app.config['UPLOAD_FOLDER'])
+    files = upload_store.names()
     logging.info("Uploaded files listed successfully")
     return jsonify(files=files), 200
 
 @app.route('/files/<filename>', methods=['GET'])
 def preview_file(filename):
     logging.info(f"Previewing file {filename}")
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        logging.error(f"Error previewing file {filename}: {str(e)}")
+    blob = upload_store.lookup(filename)
+    if blob is None:
+        logging.error(f"Error previewing file {filename}: not uploaded")
         return jsonify(error="File not found"), 404
+    # conditional=True answers Range and If-None-Match requests
+    return send_file(os.path.abspath(blob.path), mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                     conditional=True, etag=blob.digest)
 
 @app.route('/train', methods=['POST'])
 def train_model():
@@ -3,7 +3,7 @@ import unittest
 import os
 import io
 from flask import json
-from app import app
+from stub import app
 
 class FlaskAppTestCase(unittest.TestCase):
 
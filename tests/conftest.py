@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Test the application at the repository root, against an in-memory database
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')